@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file accountcache.py
+#  Contains the class AccountCache.
+
+## @package accountcache
+#  In-memory cache of the accounts.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import threading
+from time import time
+from collections import OrderedDict
+
+from constants import *
+
+class AccountCache(object):
+    """! @brief
+    Bounded LRU cache of the account documents, keyed by device UID.
+    An entry expires after a time to live. The writes made by the dispenser update or invalidate the entries.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, size=ACCOUNT_CACHE_SIZE, ttl=ACCOUNT_CACHE_TTL):
+        """! @brief Initialize an empty cache.
+        @param self the AccountCache instance
+        @param size maximum number of entries
+        @param ttl time to live of an entry, in seconds
+        """
+        ## maximum number of entries
+        self.size = size
+        ## time to live of an entry, in seconds
+        self.ttl = ttl
+        ## lock protecting the entries, the cache is used by several threads
+        self.lock = threading.Lock()
+        ## entries `deviceId -> (expiry, account)`, least recently used first
+        self.entries = OrderedDict()
+        ## number of lookups served by the cache
+        self.hits = 0
+        ## number of lookups not served by the cache
+        self.misses = 0
+        ## number of entries removed because the cache was full
+        self.evictions = 0
+        ## number of lookups on an expired entry
+        self.expirations = 0
+        ## number of entries removed by a write
+        self.invalidations = 0
+
+    def get(self, deviceId):
+        """! @brief Method to get the account linked to a device.
+        @param self the AccountCache instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @return the account, None if it is not in the cache or expired
+        """
+        with self.lock:
+            entry = self.entries.get(deviceId)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time():
+                # kept until replaced, it can still be used offline
+                self.expirations += 1
+                self.misses += 1
+                return None
+            del self.entries[deviceId]
+            self.entries[deviceId] = entry
+            self.hits += 1
+            return entry[1]
+
+    def getStale(self, deviceId):
+        """! @brief Method to get the account linked to a device, even if it is expired. Used when the database can't be reached.
+        @param self the AccountCache instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @return the account, None if it is not in the cache
+        """
+        with self.lock:
+            entry = self.entries.get(deviceId)
+            if entry is None:
+                return None
+            return entry[1]
+
+    def put(self, deviceId, account):
+        """! @brief Method to store the account linked to a device. The other devices of the account are invalidated.
+        @param self the AccountCache instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param account the account document
+        """
+        with self.lock:
+            self.entries.pop(deviceId, None)
+            self.removeUser(account['uid'])
+            self.entries[deviceId] = (time() + self.ttl, account)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, deviceId):
+        """! @brief Method to remove the entry of a device.
+        @param self the AccountCache instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        """
+        with self.lock:
+            if self.entries.pop(deviceId, None) is not None:
+                self.invalidations += 1
+
+    def invalidateUser(self, userId):
+        """! @brief Method to remove the entries of all the devices of an account.
+        @param self the AccountCache instance
+        @param userId identifier of the account
+        """
+        with self.lock:
+            self.invalidations += self.removeUser(userId)
+
+    def removeUser(self, userId):
+        """! @brief Method to remove the entries of an account. The lock must be held.
+        @param self the AccountCache instance
+        @param userId identifier of the account
+        @return the number of entries removed
+        """
+        deviceIds = [d for d, entry in self.entries.iteritems() if entry[1]['uid'] == userId]
+        for deviceId in deviceIds:
+            del self.entries[deviceId]
+        return len(deviceIds)
+
+    def counters(self):
+        """! @brief Method to get the counters of the cache.
+        @param self the AccountCache instance
+        """
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations, 'invalidations': self.invalidations}
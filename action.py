@@ -10,12 +10,18 @@
 #  @date 22.06.2014
 #  @version 1.0
 
-from uuid import uuid4
+from time import time
 from datetime import datetime
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 from PySide.QtCore import *
 
 from constants import *
 from database import DataBase
+from metrics import Metrics
+from accountcache import AccountCache
+from archive import Archive
+from usage import Usage
+from documents import recentTransactionUpdate, appliedKeyUpdate, userDocument, deviceDocument, historyQuery, historyCursor, HISTORY_SORT
 from pifacecontrol import PiFaceControl
 
 class Action(QObject):
@@ -27,145 +33,360 @@ class Action(QObject):
     """
     ## Signal used to display the action status on the UI
     status = Signal(str)
-    ## Signal used to display the last transactions on the UI
-    transactionsLoaded = Signal(list)
+    ## Signal used to display the last transactions on the UI (device, transactions, True if the history is complete)
+    transactionsLoaded = Signal(object, list, bool)
+    ## Signal used to display older transactions on the UI (device, transactions, True if the history is complete)
+    moreTransactionsLoaded = Signal(object, list, bool)
 
-    def __init__(self, pifacecontrol):
-        """! @brief Initialize the instance and get the two collections of the database.
+    def __init__(self, pifacecontrol, journal, database=None, cache=None):
+        """! @brief Initialize the instance and link the database and the journal.
         @param self the Action instance
+        @param pifacecontrol the PiFaceControl instance
+        @param journal the Journal instance where the transactions are written
+        @param database the database, DataBase() by default
+        @param cache the AccountCache instance, shared by the readers, a new one by default
         """
         QObject.__init__(self)
-        ## contains a link to the database collection *user*
-        self.users = DataBase().user
-        ## contains a link to the database collection *transaction*
-        self.transactions = DataBase().transaction
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+        ## link to the journal of the transactions
+        self.journal = journal
+        ## cache of the accounts, keyed by device UID
+        self.cache = cache if cache is not None else AccountCache()
+        ## date of the oldest transaction displayed for each device, where the next page of the history begins
+        self.historyCursors = {}
+        ## archived transactions, read when the history goes past the collection *transaction*
+        self.archive = Archive(self.database)
+        ## usage of the dispensers, displayed in the admin view
+        self.usage = Usage(self.database)
+        Metrics().register('accountCache', self.cache.counters)
 
         self.piFace = pifacecontrol
         self.piFace.activateButtonListener()
+        ## function telling if the operation running belongs to the current session, set by AsyncAction
+        self.current = lambda: True
+
+    @property
+    def users(self):
+        """! @brief The database collection *user*.
+        @param self the Action instance
+        """
+        return self.database.user
+
+    @property
+    def transactions(self):
+        """! @brief The database collection *transaction*.
+        @param self the Action instance
+        """
+        return self.database.transaction
 
     def transaction(self, deviceId, amount):
         """! @brief Method to make a transaction (withdraw an amount from an account).
+        The balance is checked and debited in a single atomic operation.
         @param self the Action instance
         @param deviceId identifier of the device (smartcard or smartphone)
         @param amount amount to withdraw
+        @return the account after the debit, None if the transaction is refused
         """
-        canWithdraw = False
-        user = self.users.find_one({"devices.uid": deviceId})
-        for device in user['devices']:
-            if device['uid'] == deviceId:
-                if device['status'] == STA_DEVICE_ACTIVE:
-                    if amount > 0:
-                        if user['balance'] >= amount:    
-                            canWithdraw = True
-                        else:
-                            self.status.emit('Please recharge your account, you don\'t have enough money in it.')
-                    else:
-                        self.status.emit('The amount must be greater than 0.')
-                elif device['status'] == STA_DEVICE_LOST:
-                    self.status.emit('Impossible transaction : Lost device.')
-                elif device['status'] == STA_DEVICE_STOLEN:
-                    self.status.emit('Impossible transaction : Stolen device.')
-                elif device['status'] == STA_DEVICE_DELETED:
-                    self.status.emit('Impossible transaction : Deleted device.')
-                else:
-                    self.status.emit('Impossible transaction : Device status unknown.')
+        return self.makeTransaction(deviceId, amount, WITHDRAWAL)
 
-                if canWithdraw:
-                    # create transaction
-                    userId = user['uid']
-                    dispenserId = DISPENSER_ID
-                    transactionDate = datetime.now()
+    def recharge(self, deviceId, amount):
+        """! @brief Method to make a recharge (put an amount in an account).
+        The device is checked and the account credited in a single atomic operation.
+        @param self the Action instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount to recharge
+        @return the account after the recharge, None if the recharge is refused
+        """
+        return self.makeTransaction(deviceId, amount, RECHARGE)
 
-                    transaction = {"userId":userId, "deviceId":deviceId, "dispenserId":dispenserId, "transactionType":WITHDRAWAL, "amount":amount, "transactionDate":transactionDate}
-                    self.transactions.insert(transaction)
+    def makeTransaction(self, deviceId, amount, transactionType):
+        """! @brief Method to update the balance of an account and to write the transaction in the journal.
+        The transaction is written in the journal before the balance update and settled with its outcome, its key
+        is kept in the account with the update : a transaction whose outcome is unknown is applied at most once.
+        If the database can't be reached, the transaction is only written in the journal.
+        @param self the Action instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount of the transaction
+        @param transactionType WITHDRAWAL or RECHARGE
+        @return the account after the update, None if the transaction is refused
+        """
+        operation = 'transaction' if transactionType == WITHDRAWAL else 'recharge'
+        if amount <= 0:
+            self.notify('The amount must be greater than 0.')
+            self.denied()
+            return None
+        if not self.database.online:
+            return self.offlineTransaction(deviceId, amount, transactionType)
 
-                    # debit credit in account
-                    query = {"uid": user['uid'] }
-                    update = {"$inc": { "balance": -amount}}
-                    self.users.update(query, update)
+        start = time()
+        roundTrips = 1
+        transactionDate = datetime.now()
+        # identifier of the transaction, in the journal, in the account and in the collection *transaction*
+        key = self.journal.begin(transactionType, deviceId, amount, transactionDate)
+        # only if the device is active and, for a withdrawal, if the balance is sufficient
+        query = {"devices": {"$elemMatch": {"uid": deviceId, "status": STA_DEVICE_ACTIVE}}}
+        if transactionType == WITHDRAWAL:
+            query["balance"] = {"$gte": amount}
+            update = {"$inc": {"balance": -amount}}
+        else:
+            update = {"$inc": {"balance": amount}}
+        # keep the last transactions in the account, and the key of the transaction applied
+        update["$push"] = recentTransactionUpdate(transactionType, deviceId, amount, transactionDate, key)
+        update["$push"].update(appliedKeyUpdate(key))
 
-                    self.status.emit('You withdraw ' + `amount` + ' CHF. You have now ' + `user['balance'] - amount` + ' CHF on your account.')
-                    self.piFace.actionValidated()
-                else:
-                    self.piFace.actionDenied()
-                break
+        try:
+            user = self.users.find_and_modify(query, update, new=True)
+            if user is None:
+                # find out why the operation has been refused
+                message = self.refusalMessage(self.users.find_one({"devices.uid": deviceId}), deviceId, amount, operation)
+                roundTrips += 1
+        except ConnectionFailure, e:
+            # the balance may have been updated before the connection was lost, the key of the entry is kept
+            print "Could not reach MongoDB: %s" % e
+            self.database.unreachable()
+            return self.offlineTransaction(deviceId, amount, transactionType, key)
 
-    def recharge(self, deviceId, amount):
-        """! @brief Method to make a recharge (put an amount in an account).
+        if user is None:
+            self.journal.discard(key)
+            self.notify(message)
+            self.denied()
+        else:
+            # the transaction is written in the database by the journal syncer
+            self.journal.settle(key, user['uid'])
+            self.cache.put(deviceId, user)
+
+            if transactionType == WITHDRAWAL:
+                self.notify('You withdraw ' + `amount` + ' CHF. You have now ' + `user['balance']` + ' CHF on your account.')
+            else:
+                self.notify('Recharge of ' + `amount` + ' CHF. You have now ' + `user['balance']` + ' CHF on your account.')
+            self.validated()
+
+        Metrics().record(operation, time() - start, roundTrips)
+        return user
+
+    def offlineTransaction(self, deviceId, amount, transactionType, key=None):
+        """! @brief Method to make a transaction when the database can't be reached.
+        The transaction is written in the journal and the balance is updated when the database is back.
+        The withdrawals are limited by the offline spending limits.
         @param self the Action instance
         @param deviceId identifier of the device (smartcard or smartphone)
-        @param amount amount to recharge
+        @param amount amount of the transaction
+        @param transactionType WITHDRAWAL or RECHARGE
+        @param key the key of the entry started by a balance update whose outcome is unknown, None for a new entry
+        @return the offline account after the transaction, None if the transaction is refused
         """
-        canRecharge = False
-        user = self.users.find_one({"devices.uid": deviceId})
+        start = time()
+        operation = 'transaction' if transactionType == WITHDRAWAL else 'recharge'
+        account = self.offlineAccount(deviceId)
+        if transactionType == WITHDRAWAL:
+            message = None
+            if not self.journal.canSpendOffline(deviceId, amount):
+                message = 'Impossible ' + operation + ' : The offline limit is reached, please try again later.'
+            elif (account['balance'] is not None and account['balance'] < amount) or account['devices'][0]['status'] != STA_DEVICE_ACTIVE:
+                message = self.refusalMessage(account, deviceId, amount, operation)
+            if message is not None:
+                # a started entry stays started, the syncer settles it if its balance update has been done
+                self.notify(message)
+                self.denied()
+                Metrics().record(operation + 'Offline', time() - start)
+                return None
+
+        if key is None:
+            self.journal.append(transactionType, None, deviceId, amount, datetime.now(), False)
+        else:
+            # applied by the syncer unless its key is already in the account
+            self.journal.settle(key)
+        if transactionType == WITHDRAWAL:
+            self.notify('You withdraw ' + `amount` + ' CHF. Your account will be updated as soon as the dispenser is online.')
+        else:
+            self.notify('Recharge of ' + `amount` + ' CHF. Your account will be updated as soon as the dispenser is online.')
+        self.validated()
+        Metrics().record(operation + 'Offline', time() - start)
+        return self.offlineAccount(deviceId)
+
+    def offlineAccount(self, deviceId):
+        """! @brief Method to get the account used when the database can't be reached.
+        If the account is in the cache, its statement, the status of the device and its last known balance are kept,
+        less what has been spent offline. The allowance is what can still be withdrawn offline with the device.
+        @param self the Action instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @return the account, its balance is None if it is not known
+        """
+        spent = self.journal.offlineSpending(deviceId)
+        allowance = OFFLINE_MAX_PENDING - spent
+        balance = None
+        statement = STA_USER_ACTIVE
+        status = STA_DEVICE_ACTIVE
+        account = self.cache.getStale(deviceId)
+        if account is not None:
+            balance = account['balance'] - spent
+            allowance = min(allowance, balance)
+            statement = account['statement']
+            for device in account['devices']:
+                if device['uid'] == deviceId:
+                    status = device['status']
+        return {"uid":None, "statement":statement, "balance":balance, "allowance":max(allowance, 0),
+            "devices":[{"uid":deviceId, "status":status}], "offline":True}
+
+    def refusalMessage(self, user, deviceId, amount, operation):
+        """! @brief Method to explain why a transaction or a recharge has been refused.
+        @param self the Action instance
+        @param user the account linked to the device, None if there is no account
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount of the operation
+        @param operation name of the operation, 'transaction' or 'recharge'
+        """
+        if user is None:
+            return 'Impossible ' + operation + ' : This device is not linked to any account.'
         for device in user['devices']:
             if device['uid'] == deviceId:
                 if device['status'] == STA_DEVICE_ACTIVE:
-                    if amount > 0:  
-                        canRecharge = True
-                    else:
-                        self.status.emit('The amount must be greater than 0.')
+                    if user['balance'] < amount:
+                        return 'Please recharge your account, you don\'t have enough money in it.'
+                    # the account has been modified in the meantime
+                    return 'Impossible ' + operation + ' : Please try again.'
                 elif device['status'] == STA_DEVICE_LOST:
-                    self.status.emit('Impossible recharge : Lost device.')
+                    return 'Impossible ' + operation + ' : Lost device.'
                 elif device['status'] == STA_DEVICE_STOLEN:
-                    self.status.emit('Impossible recharge : Stolen device.')
+                    return 'Impossible ' + operation + ' : Stolen device.'
                 elif device['status'] == STA_DEVICE_DELETED:
-                    self.status.emit('Impossible recharge : Deleted device.')
-                else:
-                    self.status.emit('Impossible recharge : Device status unknown.')
+                    return 'Impossible ' + operation + ' : Deleted device.'
+                break
+        return 'Impossible ' + operation + ' : Device status unknown.'
+            
+    def notify(self, message):
+        """! @brief Method to display the status of an operation, unless its session has ended.
+        @param self the Action instance
+        @param message the status
+        """
+        if self.current():
+            self.status.emit(message)
 
-                if canRecharge:
-                    # create transaction
-                    userId = user['uid']
-                    dispenserId = DISPENSER_ID
-                    transactionDate = datetime.now()
+    def validated(self):
+        """! @brief Method to signal with the PiFace that an operation is validated, unless its session has ended.
+        @param self the Action instance
+        """
+        if self.current():
+            self.piFace.actionValidated()
 
-                    transaction = {"userId":userId, "deviceId":deviceId, "dispenserId":dispenserId, "transactionType":RECHARGE, "amount":amount, "transactionDate":transactionDate}
-                    self.transactions.insert(transaction)
+    def denied(self):
+        """! @brief Method to signal with the PiFace that an operation is denied, unless its session has ended.
+        @param self the Action instance
+        """
+        if self.current():
+            self.piFace.actionDenied()
 
-                    # recharge account
-                    query = {"uid": user['uid'] }
-                    update = {"$inc": { "balance": amount}}
-                    self.users.update(query, update)
+    def databaseUnreachable(self, error):
+        """! @brief Method called when the database can't be reached during an administration operation.
+        @param self the Action instance
+        @param error the error raised by the driver
+        """
+        print "Could not reach MongoDB: %s" % error
+        self.database.unreachable()
+        self.notify('The database is not available, please try again later.')
 
-                    self.status.emit('Recharge of ' + `amount` + ' CHF. You have now ' + `user['balance'] + amount` + ' CHF on your account.')
-                    self.piFace.actionValidated()
-                else:
-                    self.piFace.actionDenied()
-                break
-            
     def getAccount(self, deviceId):
         """! @brief Method to get an account in a JSON format.
         @param self the Action instance
         @param deviceId identifier of the device (smartcard or smartphone)
         """
-        user = self.users.find_one({"devices.uid": deviceId})
+        if not self.database.online:
+            return self.offlineAccount(deviceId)
+        start = time()
+        user = self.cache.get(deviceId)
+        if user is not None:
+            Metrics().record('getAccount', time() - start, 0)
+            return user
+        try:
+            user = self.users.find_one({"devices.uid": deviceId})
+        except ConnectionFailure, e:
+            print "Could not reach MongoDB: %s" % e
+            self.database.unreachable()
+            return self.offlineAccount(deviceId)
+        Metrics().record('getAccount', time() - start, 1)
         if user is None:
             return None
         else:
+            self.cache.put(deviceId, user)
             return user
 
     def getLastTransactions(self, deviceId):
-        """! @brief Method to get the last 10 transactions.
+        """! @brief Method to get the last transactions, as many as the recent transactions kept in the account.
+        They are read from the recent transactions kept in the account, without any query if the account is in the cache.
+        An account keeping fewer transactions, e.g. an account whose older transactions were made before they were kept,
+        is completed with its history.
+        @param self the Action instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        """
+        if not self.database.online:
+            self.notify('The transactions are not available offline.')
+            return
+        start = time()
+        roundTrips = 0
+        try:
+            user = self.cache.get(deviceId)
+            if user is None:
+                user = self.users.find_one({"devices.uid": deviceId})
+                roundTrips += 1
+            if user is None:
+                return
+            # the most recent transaction is at the end of the list
+            transactions = user.get('recentTransactions', [])[::-1][:RECENT_TRANSACTIONS]
+            before = historyCursor(transactions[-1]) if transactions else None
+            if len(transactions) < RECENT_TRANSACTIONS:
+                # the transactions older than those kept are read in the history
+                older, before = self.getTransactionHistory(user['uid'], before, RECENT_TRANSACTIONS - len(transactions))
+                transactions = transactions + older
+                roundTrips += 1
+        except ConnectionFailure, e:
+            self.databaseUnreachable(e)
+            return
+
+        self.historyCursors[deviceId] = before
+        Metrics().record('getLastTransactions', time() - start, roundTrips)
+        self.transactionsLoaded.emit(deviceId, transactions, before is None)
+
+    def getMoreTransactions(self, deviceId):
+        """! @brief Method to get the next page of the history, older than the transactions already displayed.
+        An empty list is emitted when the history is already complete.
         @param self the Action instance
         @param deviceId identifier of the device (smartcard or smartphone)
         """
-        user = self.users.find_one({"devices.uid": deviceId})
-        transactions = self.transactions.find(
-                {'userId': user['uid']}, 
-                {'_id': 0, 'amount': 1, 'transactionType': 1, 'transactionDate': 1, 'deviceId': 1, 'dispenserId': 1}
-            ).limit(10).sort("transactionDate", -1)
-        trs = []
-        for transaction in transactions:
-            tr = []
-            tr.append(transaction['transactionDate'].strftime("%a %e %b %Y, %H:%M:%S"))
-            if transaction['transactionType'] == RECHARGE:
-                tr.append('+' + `transaction['amount']`)
-            elif transaction['transactionType'] == WITHDRAWAL:
-                tr.append('-' + `transaction['amount']`)
-            tr.append('CHF')
-            trs.append(tr)
-        self.transactionsLoaded.emit(trs)
+        before = self.historyCursors.get(deviceId)
+        if before is None:
+            self.moreTransactionsLoaded.emit(deviceId, [], True)
+            return
+        start = time()
+        try:
+            user = self.getAccount(deviceId)
+            if user is None or user.get('offline'):
+                return
+            transactions, self.historyCursors[deviceId] = self.getTransactionHistory(user['uid'], before)
+        except ConnectionFailure, e:
+            self.databaseUnreachable(e)
+            return
+        Metrics().record('getMoreTransactions', time() - start, 1)
+        self.moreTransactionsLoaded.emit(deviceId, transactions, self.historyCursors[deviceId] is None)
+
+    def getTransactionHistory(self, userId, before=None, limit=HISTORY_PAGE_SIZE):
+        """! @brief Method to get a page of the transactions of an account, newest first.
+        The pages are delimited by a range on the transaction date and identifier, not by skipping documents,
+        so an old page costs the same as the first one.
+        @param self the Action instance
+        @param userId identifier of the account
+        @param before `(date, identifier)` of the last transaction of the previous page, None for the most recent ones
+        @param limit maximum number of transactions
+        @return the transactions and where the next page begins, None if there is no next page
+        """
+        fields = {'amount': 1, 'transactionType': 1, 'transactionDate': 1, 'deviceId': 1, 'dispenserId': 1}
+        transactions = list(self.transactions.find(historyQuery(userId, before), fields).sort(HISTORY_SORT).limit(limit))
+        if len(transactions) < limit:
+            # the older transactions are in the archive
+            transactions = self.archive.merge(userId, before, limit, transactions, fields)
+        if len(transactions) < limit:
+            return transactions, None
+        return transactions, historyCursor(transactions[-1])
 
     def addUser(self, username, name=None, surname=None):
         """! @brief Method to create a new user account.
@@ -173,72 +394,118 @@ class Action(QObject):
         @param username unique username
         @param name name of the user, optional
         @param surname surname of the user, optional
+        @return the new account, None if it has not been created
         """
         if not username:
-            self.status.emit('Please enter at least a username.')
+            self.notify('Please enter at least a username.')
         else:
-            userAlreadyRegistered = self.users.find_one({'username':username})
-            if userAlreadyRegistered is None:
-                uid = str(uuid4())
-                balance = 0
-                registrationDate = datetime.now()
-                statement = STA_USER_ACTIVE
-                devices = []
-
-                if name is None:
-                    if surname is None:
-                        user = {"uid":uid, "username":username, "balance":balance, "registrationDate":registrationDate, "statement":statement, "devices":devices}
-                    else:
-                        user = {"uid":uid, "username":username, "surname":surname, "balance":balance, "registrationDate":registrationDate, "statement":statement, "devices":devices}
+            if not self.database.online:
+                self.notify('The database is not available, please try again later.')
+                return
+            try:
+                start = time()
+                userAlreadyRegistered = self.users.find_one({'username':username})
+                if userAlreadyRegistered is None:
+                    user = userDocument(username, name, surname)
+                    self.users.insert(user)
+                    Metrics().record('addUser', time() - start, 2)
+                    self.notify('User successfully added to the database.')
+                    self.validated()
+                    return user
                 else:
-                    if surname is None:
-                        user = {"uid":uid, "username":username, "name":name, "balance":balance, "registrationDate":registrationDate, "statement":statement, "devices":devices}
-                    else:
-                        user = {"uid":uid, "username":username, "name":name, "surname":surname, "balance":balance, "registrationDate":registrationDate, "statement":statement, "devices":devices}
-
-                self.users.insert(user)
-                self.status.emit('User successfully added to the database.')
-                self.piFace.actionValidated()
-            else:
-                self.status.emit('User already registered.')
+                    Metrics().record('addUser', time() - start, 1)
+                    self.notify('User already registered.')
+            except ConnectionFailure, e:
+                self.databaseUnreachable(e)
+        return None
 
     def addDevice(self, username, deviceId, ATR):
         """! @brief Method to add a device to an account.
+        Only the new device is pushed, in a single write : the unique index on `devices.uid` rejects a device
+        owned by another account and the query rejects a device already in the account.
         @param self the Action instance
         @param username username of the account owner
         @param deviceId identifier of the device (smartcard or smartphone)
         @param ATR ATR of the card
+        @return True if the device has been added
         """
         if deviceId is None or ATR is None:
-            self.status.emit('Please place a card in front of the reader.')
+            self.notify('Please place a card in front of the reader.')
         else:
             if not username:
-                self.status.emit('Please enter a username.')
+                self.notify('Please enter a username.')
             else:
-                userWithDevice = self.users.find_one({"devices.uid": deviceId})
-                if userWithDevice is None:
-                    user = self.users.find_one({"username": username})
+                if not self.database.online:
+                    self.notify('The database is not available, please try again later.')
+                    return
+                try:
+                    start = time()
+                    try:
+                        user = self.users.find_and_modify({"username": username, "devices.uid": {"$ne": deviceId}},
+                            {"$push": {"devices": deviceDocument(deviceId, ATR)}},
+                            fields={"uid": 1, "username": 1, "name": 1, "surname": 1}, new=True)
+                    except DuplicateKeyError:
+                        Metrics().record('addDevice', time() - start, 1)
+                        self.notify('This device already belongs to someone.')
+                        return False
 
                     if user is None:
-                        self.status.emit('This username doesn\'t exist.')
+                        # find out why the device has not been added
+                        if self.users.find_one({"username": username}, {"_id": 1}) is None:
+                            self.notify('This username doesn\'t exist.')
+                        else:
+                            self.notify('This device already belongs to this user.')
+                        Metrics().record('addDevice', time() - start, 2)
                     else:
-                        status = STA_DEVICE_ACTIVE
-                        activationDate = datetime.now()
-                        category = 'smartcard'
-
-                        # create the new device
-                        newDevice = {"uid":deviceId, "status":status, "activationDate":activationDate, "ATR":ATR, "category":category}
-                        # add the new device to the list
-                        user['devices'].append(newDevice)
-                        # remove the _id from user (required to make a $set)
-                        del user['_id']
-                        
-                        # update user
-                        query = {"uid": user['uid'] }
-                        update = { "$set": user }
-                        self.users.update(query, update)
-
-                        self.status.emit('Device added to the user ' + user['name'] + ' ' + user['surname'] + '.')
-                        self.piFace.actionValidated()
-                else:
-                    self.status.emit('This device already belongs to someone.')
+                        self.cache.invalidateUser(user['uid'])
+                        Metrics().record('addDevice', time() - start, 1)
+                        owner = ' '.join(user[key] for key in ('name', 'surname') if user.get(key)) or user['username']
+                        self.notify('Device added to the user ' + owner + '.')
+                        self.validated()
+                        return True
+                except ConnectionFailure, e:
+                    self.databaseUnreachable(e)
+        return False
+
+    def setDeviceStatus(self, deviceId, status):
+        """! @brief Method to change the status of a device (e.g. lost or stolen), in place in the account.
+        @param self the Action instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param status STA_DEVICE_ACTIVE, STA_DEVICE_LOST, STA_DEVICE_STOLEN or STA_DEVICE_DELETED
+        @return True if the status has been changed
+        """
+        if not self.database.online:
+            self.notify('The database is not available, please try again later.')
+            return False
+        try:
+            start = time()
+            user = self.users.find_and_modify({"devices.uid": deviceId}, {"$set": {"devices.$.status": status}},
+                fields={"uid": 1}, new=True)
+            Metrics().record('setDeviceStatus', time() - start, 1)
+        except ConnectionFailure, e:
+            self.databaseUnreachable(e)
+            return False
+        if user is None:
+            self.notify('This device doesn\'t belong to anyone.')
+            return False
+        self.cache.invalidateUser(user['uid'])
+        self.notify('Status of the device changed.')
+        return True
+
+    def getUsage(self, date=None):
+        """! @brief Method to get the usage of the dispenser on a day, read from its summary without scanning the transactions.
+        @param self the Action instance
+        @param date a date of the day, today by default
+        @return the counters of the day and of its hours, None if the database can't be reached
+        """
+        if not self.database.online:
+            self.notify('The usage is not available offline.')
+            return None
+        start = time()
+        try:
+            usage = self.usage.day(date or datetime.now())
+        except ConnectionFailure, e:
+            self.databaseUnreachable(e)
+            return None
+        Metrics().record('getUsage', time() - start, 1)
+        return usage
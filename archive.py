@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file archive.py
+#  Contains the classes Archive and Archiver and the command archiving the old transactions.
+
+## @package archive
+#  Archive of the transactions. The transactions older than the horizon are moved from the collection *transaction*
+#  to a collection per month (*transaction_YYYYMM*), and summed per user and per month in the collection
+#  *transactionMonthly* (number of transactions, amount recharged, amount withdrawn). The collection *transaction*
+#  keeps only the recent transactions, the history reads the archives when it goes past them.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import argparse
+from time import time
+from datetime import datetime, timedelta
+import pymongo
+
+from constants import *
+from database import DataBase, aggregateRows
+from documents import historyQuery, historyKey, HISTORY_SORT
+
+## prefix of the name of the collections of the archive, followed by the year and the month
+ARCHIVE_PREFIX = 'transaction_'
+## name of the collection of the monthly rollups
+ROLLUP_COLLECTION = 'transactionMonthly'
+## name of the collection listing the months archived, and whether their rollups are computed
+ARCHIVE_LOG_COLLECTION = 'transactionArchive'
+
+def monthStart(date):
+    """! @brief Function getting the first day of the month of a date.
+    @param date the date
+    """
+    return datetime(date.year, date.month, 1)
+
+def nextMonth(month):
+    """! @brief Function getting the first day of the next month.
+    @param month the first day of a month
+    """
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def archiveName(month):
+    """! @brief Function getting the name of the collection archiving a month.
+    @param month the first day of the month
+    """
+    return '%s%04d%02d' % (ARCHIVE_PREFIX, month.year, month.month)
+
+class Archive(object):
+    """! @brief
+    Read access to the archived transactions, used by the history of the accounts.
+    The rollups tell in which months an account has transactions, only these archives are read.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database=None):
+        """! @brief Link the database.
+        @param self the Archive instance
+        @param database the database, DataBase() by default
+        """
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+
+    def collection(self, name):
+        """! @brief Method to get a collection of the database of the transactions.
+        @param self the Archive instance
+        @param name name of the collection
+        """
+        return self.database.transaction.database[name]
+
+    def history(self, userId, before, limit, fields=None):
+        """! @brief Method to get the archived transactions of an account, newest first.
+        @param self the Archive instance
+        @param userId identifier of the account
+        @param before `(date, identifier)` of the last transaction of the previous page, None for the most recent ones
+        @param limit maximum number of transactions
+        @param fields the projection of the transactions, optional
+        @return the transactions
+        """
+        query = {'userId': userId}
+        if before is not None:
+            query['month'] = {'$lte': monthStart(before[0])}
+        months = [rollup['month'] for rollup in self.collection(ROLLUP_COLLECTION).find(query, {'month': 1}).sort('month', -1)]
+        transactions = []
+        query = historyQuery(userId, before)
+        for month in months:
+            transactions.extend(self.collection(archiveName(month)).find(query, fields)
+                .sort(HISTORY_SORT).limit(limit - len(transactions)))
+            if len(transactions) >= limit:
+                break
+        return transactions
+
+    def merge(self, userId, before, limit, transactions, fields=None):
+        """! @brief Method to complete a page of recent transactions with the archived ones.
+        A transaction written late for an archived month stays in the collection *transaction* until the next archiving,
+        so the two lists are merged by date.
+        @param self the Archive instance
+        @param userId identifier of the account
+        @param before `(date, identifier)` of the last transaction of the previous page, None for the most recent ones
+        @param limit maximum number of transactions
+        @param transactions the page read in the collection *transaction*, newest first
+        @param fields the projection of the transactions, optional
+        @return the page, newest first
+        """
+        archived = self.history(userId, before, limit, fields)
+        if not archived:
+            return transactions
+        merged = sorted(transactions + archived, key=historyKey, reverse=True)
+        return merged[:limit]
+
+class Archiver(Archive):
+    """! @brief
+    Move of the transactions older than the horizon to the archive. A whole month is archived at once : it is recorded
+    in the collection *transactionArchive*, its transactions are copied by batches and removed from the collection
+    *transaction* once copied, then its rollups are computed from its archive. An interrupted move can be run again :
+    the copies already made are ignored, and a month recorded without rollups is archived again, even if none of its
+    transactions is left in the collection *transaction*.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database=None, horizon=ARCHIVE_HORIZON, batchSize=ARCHIVE_BATCH_SIZE):
+        """! @brief Link the database.
+        @param self the Archiver instance
+        @param database the database, DataBase() by default
+        @param horizon age of the transactions archived, in days
+        @param batchSize number of transactions copied at once
+        """
+        Archive.__init__(self, database)
+        ## age of the transactions archived, in days
+        self.horizon = horizon
+        ## number of transactions copied at once
+        self.batchSize = batchSize
+
+    def cutoff(self):
+        """! @brief Method to get the first day of the month of the horizon, the months before it are archived.
+        @param self the Archiver instance
+        """
+        return monthStart(datetime.now() - timedelta(days=self.horizon))
+
+    def pendingMonths(self):
+        """! @brief Method to get the months which have transactions to archive or whose rollups are missing, oldest first.
+        @param self the Archiver instance
+        """
+        hot = self.database.transaction
+        cutoff = self.cutoff()
+        # months whose move has been interrupted before their rollups
+        months = set(log['month'] for log in self.collection(ARCHIVE_LOG_COLLECTION).find({'rolledUp': False}, {'month': 1}))
+        query = {'transactionDate': {'$lt': cutoff}}
+        while True:
+            oldest = list(hot.find(query, {'transactionDate': 1}).sort('transactionDate', 1).limit(1))
+            if not oldest:
+                return sorted(months)
+            month = monthStart(oldest[0]['transactionDate'])
+            months.add(month)
+            query = {'transactionDate': {'$gte': nextMonth(month), '$lt': cutoff}}
+
+    def archiveMonth(self, month):
+        """! @brief Method to move the transactions of a month to its archive and to compute its rollups.
+        @param self the Archiver instance
+        @param month the first day of the month
+        @return the number of transactions moved
+        """
+        hot = self.database.transaction
+        log = self.collection(ARCHIVE_LOG_COLLECTION)
+        # recorded before any transaction is removed, the rollups are computed by the next run if this one is interrupted
+        log.update({'_id': archiveName(month)}, {'$set': {'month': month, 'rolledUp': False}}, upsert=True)
+        archive = self.collection(archiveName(month))
+        archive.ensure_index([('userId', pymongo.ASCENDING), ('transactionDate', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)])
+        period = {'transactionDate': {'$gte': month, '$lt': nextMonth(month)}}
+        moved = 0
+        while True:
+            batch = list(hot.find(period).sort('transactionDate', 1).limit(self.batchSize))
+            if not batch:
+                break
+            try:
+                archive.insert(batch, continue_on_error=True)
+            except pymongo.errors.DuplicateKeyError:
+                # already copied by an interrupted move
+                pass
+            # removed by identifier, a transaction written meanwhile is kept for the next batch
+            hot.remove({'_id': {'$in': [transaction['_id'] for transaction in batch]}})
+            moved += len(batch)
+        self.rollup(month, archive)
+        log.update({'_id': archiveName(month)}, {'$set': {'rolledUp': True, 'archiveDate': datetime.now()}})
+        return moved
+
+    def rollup(self, month, archive):
+        """! @brief Method to compute the rollups of a month from its archive.
+        @param self the Archiver instance
+        @param month the first day of the month
+        @param archive the collection archiving the month
+        """
+        pipeline = [{'$group': {
+            '_id': '$userId',
+            'count': {'$sum': 1},
+            'recharged': {'$sum': {'$cond': [{'$eq': ['$transactionType', RECHARGE]}, '$amount', 0]}},
+            'withdrawn': {'$sum': {'$cond': [{'$eq': ['$transactionType', WITHDRAWAL]}, '$amount', 0]}},
+        }}]
+        rollups = self.collection(ROLLUP_COLLECTION)
+        for row in aggregateRows(archive, pipeline):
+            rollups.update({'_id': '%s:%04d%02d' % (row['_id'], month.year, month.month)},
+                {'$set': {'userId': row['_id'], 'month': month, 'count': row['count'],
+                    'recharged': row['recharged'], 'withdrawn': row['withdrawn']}}, upsert=True)
+
+    def run(self, progress=None):
+        """! @brief Method to archive every month older than the horizon.
+        @param self the Archiver instance
+        @param progress function called after each month with the month and the number of transactions moved, optional
+        @return the number of transactions moved
+        """
+        moved = 0
+        for month in self.pendingMonths():
+            count = self.archiveMonth(month)
+            moved += count
+            if progress is not None:
+                progress(month, count)
+        return moved
+
+def main():
+    """! @brief Command line archiving the transactions older than the horizon."""
+    parser = argparse.ArgumentParser(description='Move the old transactions to monthly archives and compute their rollups.')
+    parser.add_argument('--horizon', type=int, default=ARCHIVE_HORIZON, help='age of the transactions archived, in days')
+    parser.add_argument('--dry-run', action='store_true', help='list the months to archive without moving them')
+    args = parser.parse_args()
+
+    database = DataBase()
+    if not database.online:
+        print 'The database can\'t be reached.'
+        sys.exit(2)
+
+    archiver = Archiver(database, args.horizon)
+    if args.dry_run:
+        for month in archiver.pendingMonths():
+            print '%s  %s' % (month.strftime('%Y-%m'), archiveName(month))
+        return
+
+    start = time()
+    moved = archiver.run(lambda month, count: sys.stdout.write('%s  %8d transactions moved to %s\n' % (month.strftime('%Y-%m'),
+        count, archiveName(month))))
+    duration = time() - start
+    print '%d transactions moved in %.2f s (%.0f transactions/s)' % (moved, duration, moved / max(duration, 1e-6))
+
+if __name__ == '__main__':
+    main()
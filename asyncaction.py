@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file asyncaction.py
+#  Contains the class AsyncAction.
+
+## @package asyncaction
+#  Asynchronous actions, executed by a pool of worker threads.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from PySide.QtCore import *
+
+from constants import *
+
+class AsyncAction(QObject):
+    """! @brief
+    Asynchronous facade of Action. Each operation is submitted to a bounded pool of worker threads
+    and returns a future immediately, so the UI thread never waits for the database.
+    The results are delivered with the signals of Action and with the completion signals below.
+    The operations of a session can be cancelled, their results are then ignored.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted when an operation is finished (name of the operation, result)
+    finished = Signal(str, object)
+    ## Signal emitted when an operation has failed or timed out (name of the operation, error)
+    failed = Signal(str, str)
+    ## Signal emitted with the account loaded by getAccount
+    accountLoaded = Signal(object)
+    ## Signal emitted with the account after a transaction, None if the transaction was refused
+    transactionDone = Signal(object)
+    ## Signal emitted with the account after a recharge, None if the recharge was refused
+    rechargeDone = Signal(object)
+    ## Signal emitted with the usage of the dispenser loaded by getUsage, None if it could not be read
+    usageLoaded = Signal(object)
+
+    def __init__(self, action, workers=ACTION_WORKERS):
+        """! @brief Create the pool of worker threads.
+        @param self the AsyncAction instance
+        @param action the Action instance executing the operations
+        @param workers number of worker threads
+        """
+        QObject.__init__(self)
+        ## link to the Action instance
+        self.action = action
+        ## Signal of Action used to display the action status on the UI
+        self.status = action.status
+        ## Signal of Action used to display the last transactions on the UI
+        self.transactionsLoaded = action.transactionsLoaded
+        ## pool of worker threads
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        ## lock protecting the pending futures
+        self.lock = threading.Lock()
+        ## futures submitted and not finished yet
+        self.pending = set()
+        ## identifier of the current session, incremented when a session ends
+        self.session = 0
+        ## session of the operation running in each worker thread
+        self.local = threading.local()
+        self.action.current = self.current
+
+    def submit(self, name, function, args, signal=None):
+        """! @brief Method to submit an operation to the pool.
+        @param self the AsyncAction instance
+        @param name name of the operation
+        @param function the method of Action to call
+        @param args arguments of the method
+        @param signal signal emitted with the result, optional
+        @return the future of the operation
+        """
+        with self.lock:
+            saturated = len(self.pending) >= ACTION_MAX_PENDING
+            if not saturated:
+                future = self.executor.submit(self.call, self.session, function, args)
+                future.name = name
+                future.session = self.session
+                future.signal = signal
+                future.timedOut = False
+                self.pending.add(future)
+        if saturated:
+            # the pool is saturated, don't let the queue grow. Emitted without the lock, the slots can end the session
+            future = Future()
+            future.set_exception(RuntimeError('too many pending operations'))
+            self.failed.emit(name, 'too many pending operations')
+            return future
+
+        future.add_done_callback(self.done)
+        QTimer.singleShot(int(ACTION_TIMEOUTS.get(name, ACTION_TIMEOUT) * 1000), lambda: self.expire(future))
+        return future
+
+    def call(self, session, function, args):
+        """! @brief Method executing an operation in a worker thread.
+        @param self the AsyncAction instance
+        @param session the session of the operation
+        @param function the method of Action to call
+        @param args arguments of the method
+        """
+        self.local.session = session
+        return function(*args)
+
+    def current(self):
+        """! @brief Method telling if the operation running in the calling thread belongs to the current session.
+        @param self the AsyncAction instance
+        """
+        return getattr(self.local, 'session', self.session) == self.session
+
+    def uninterruptible(self):
+        """! @brief Method telling if a transaction or a recharge of the current session is waiting or running, the session must not end.
+        @param self the AsyncAction instance
+        """
+        with self.lock:
+            return any(future.name in ACTION_UNINTERRUPTIBLE and future.session == self.session for future in self.pending)
+
+    def done(self, future):
+        """! @brief Method called by a worker thread when an operation is finished. Emit the completion signals.
+        @param self the AsyncAction instance
+        @param future the future of the operation
+        """
+        with self.lock:
+            self.pending.discard(future)
+        if future.cancelled() or future.timedOut or future.session != self.session:
+            # cancelled, timed out or belonging to a session which has ended
+            return
+        error = future.exception()
+        if error is not None:
+            print "Error in %s: %s" % (future.name, error)
+            self.failed.emit(future.name, str(error))
+            return
+        result = future.result()
+        if future.signal is not None:
+            future.signal.emit(result)
+        self.finished.emit(future.name, result)
+
+    def expire(self, future):
+        """! @brief Method called on the UI thread when the timeout of an operation is reached.
+        @param self the AsyncAction instance
+        @param future the future of the operation
+        """
+        if future.done():
+            return
+        if future.cancel():
+            # not started yet, it will never run
+            future.timedOut = True
+            self.failed.emit(future.name, 'timeout')
+        elif future.name in ACTION_UNINTERRUPTIBLE:
+            # the money may already have moved, its real result is reported when it is over
+            self.status.emit('The operation is taking longer than expected, please wait.')
+        else:
+            future.timedOut = True
+            self.failed.emit(future.name, 'timeout')
+
+    @Slot()
+    def cancelSession(self):
+        """! @brief Slot called when a session ends. The waiting operations are cancelled and the results of the running ones are ignored.
+        @param self the AsyncAction instance
+        """
+        with self.lock:
+            self.session += 1
+            pending = list(self.pending)
+        for future in pending:
+            future.cancel()
+
+    @Slot()
+    def stop(self):
+        """! @brief Slot to stop the worker threads, without waiting for the running operations.
+        @param self the AsyncAction instance
+        """
+        self.cancelSession()
+        self.executor.shutdown(wait=False)
+
+    def getAccount(self, deviceId):
+        """! @brief Asynchronous Action.getAccount, the result is emitted with accountLoaded.
+        @param self the AsyncAction instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        """
+        return self.submit('getAccount', self.action.getAccount, (deviceId,), self.accountLoaded)
+
+    def transaction(self, deviceId, amount):
+        """! @brief Asynchronous Action.transaction, the result is emitted with transactionDone.
+        @param self the AsyncAction instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount to withdraw
+        """
+        return self.submit('transaction', self.action.transaction, (deviceId, amount), self.transactionDone)
+
+    def recharge(self, deviceId, amount):
+        """! @brief Asynchronous Action.recharge, the result is emitted with rechargeDone.
+        @param self the AsyncAction instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount to recharge
+        """
+        return self.submit('recharge', self.action.recharge, (deviceId, amount), self.rechargeDone)
+
+    def getLastTransactions(self, deviceId):
+        """! @brief Asynchronous Action.getLastTransactions, the result is emitted with transactionsLoaded.
+        @param self the AsyncAction instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        """
+        return self.submit('getLastTransactions', self.action.getLastTransactions, (deviceId,))
+
+    def getMoreTransactions(self, deviceId):
+        """! @brief Asynchronous Action.getMoreTransactions, the result is emitted with moreTransactionsLoaded of Action.
+        @param self the AsyncAction instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        """
+        return self.submit('getMoreTransactions', self.action.getMoreTransactions, (deviceId,))
+
+    def addUser(self, username, name=None, surname=None):
+        """! @brief Asynchronous Action.addUser.
+        @param self the AsyncAction instance
+        @param username unique username
+        @param name name of the user, optional
+        @param surname surname of the user, optional
+        """
+        return self.submit('addUser', self.action.addUser, (username, name, surname))
+
+    def addDevice(self, username, deviceId, ATR):
+        """! @brief Asynchronous Action.addDevice.
+        @param self the AsyncAction instance
+        @param username username of the account owner
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param ATR ATR of the card
+        """
+        return self.submit('addDevice', self.action.addDevice, (username, deviceId, ATR))
+
+    def setDeviceStatus(self, deviceId, status):
+        """! @brief Asynchronous Action.setDeviceStatus.
+        @param self the AsyncAction instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param status the new status of the device
+        """
+        return self.submit('setDeviceStatus', self.action.setDeviceStatus, (deviceId, status))
+
+    def getUsage(self):
+        """! @brief Asynchronous Action.getUsage of today, the result is emitted with usageLoaded.
+        @param self the AsyncAction instance
+        """
+        return self.submit('getUsage', self.action.getUsage, (), self.usageLoaded)
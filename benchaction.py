@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file benchaction.py
+#  Throughput benchmark of the operations of Action.
+
+## @package benchaction
+#  Throughput benchmark of Action against the in-memory database, with synthetic populations of users.
+#  Reports the operations per second, the round trips and the allocations per operation,
+#  and compares them with a stored baseline.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import gc
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+from os import path, urandom
+from time import time
+from uuid import uuid4
+from datetime import datetime, timedelta
+
+from constants import *
+from memorydb import MemoryDataBase
+from journal import Journal
+from action import Action
+from benchtap import SilentPiFace
+
+## sizes of the populations of users
+POPULATIONS = [1000, 100000, 1000000]
+## distribution of the number of devices of a user : (number of devices, probability)
+DEVICES_PER_USER = [(1, 0.70), (2, 0.25), (3, 0.05)]
+## operations measured, in this order
+OPERATIONS = ['getAccount', 'getLastTransactions', 'transaction', 'recharge', 'addUser', 'addDevice']
+## default path of the baseline
+BASELINE_PATH = 'benchaction-baseline.json'
+## relative loss of throughput tolerated before a regression is flagged
+TOLERANCE = 0.2
+
+def randomUid(size):
+    """! @brief Function creating a random device identifier.
+    @param size number of bytes, 4 for a Mifare card and 7 for an Android smartphone
+    """
+    return ' '.join('%02X' % b for b in bytearray(urandom(size)))
+
+def deviceCount():
+    """! @brief Function drawing the number of devices of a user from DEVICES_PER_USER."""
+    draw = random.random()
+    for count, probability in DEVICES_PER_USER:
+        draw -= probability
+        if draw < 0:
+            return count
+    return DEVICES_PER_USER[-1][0]
+
+def populate(database, users, history):
+    """! @brief Function creating a synthetic population of users, with their devices and transactions.
+    @param database the MemoryDataBase instance
+    @param users number of users
+    @param history average number of transactions of a user
+    @return the identifiers of the devices and the usernames
+    """
+    deviceIds = []
+    seen = set()
+    usernames = []
+    now = datetime.now()
+    batch = []
+    transactions = []
+    for i in range(users):
+        uid = str(uuid4())
+        username = 'user%d' % i
+        devices = []
+        for j in range(deviceCount()):
+            deviceId = randomUid(4 if j == 0 else 7)
+            while deviceId in seen:
+                # the identifiers of 4 bytes collide in the large populations
+                deviceId = randomUid(4 if j == 0 else 7)
+            seen.add(deviceId)
+            devices.append({"uid": deviceId, "status": STA_DEVICE_ACTIVE, "activationDate": now, "ATR": '3B 8F 80 01', "category": 'smartcard'})
+            deviceIds.append(deviceId)
+        recent = []
+        for k in range(random.randint(0, 2 * history)):
+            transaction = {"userId": uid, "deviceId": devices[0]['uid'], "dispenserId": DISPENSER_ID,
+                "transactionType": random.choice([WITHDRAWAL, WITHDRAWAL, WITHDRAWAL, RECHARGE]), "amount": random.choice([2, 5, 20]),
+                "transactionDate": now - timedelta(minutes=random.randint(1, 500000))}
+            transactions.append(transaction)
+            recent.append(dict((key, transaction[key]) for key in ('transactionType', 'deviceId', 'amount', 'transactionDate')))
+        recent.sort(key=lambda transaction: transaction['transactionDate'])
+        batch.append({"uid": uid, "username": username, "name": 'Name', "surname": 'Surname', "balance": 10 ** 6,
+            "registrationDate": now, "statement": STA_USER_ACTIVE, "devices": devices, "recentTransactions": recent[-RECENT_TRANSACTIONS:]})
+        usernames.append(username)
+        if len(batch) == 10000:
+            database.user.insert(batch)
+            database.transaction.insert(transactions)
+            batch = []
+            transactions = []
+    if batch:
+        database.user.insert(batch)
+    if transactions:
+        database.transaction.insert(transactions)
+    return deviceIds, usernames
+
+def workload(operation, action, deviceIds, usernames):
+    """! @brief Function creating the calls of an operation.
+    @param operation name of the operation
+    @param action the Action instance
+    @param deviceIds identifiers of the existing devices
+    @param usernames usernames of the existing users
+    @return a function making one call
+    """
+    if operation == 'getAccount':
+        return lambda: action.getAccount(random.choice(deviceIds))
+    if operation == 'getLastTransactions':
+        return lambda: action.getLastTransactions(random.choice(deviceIds))
+    if operation == 'transaction':
+        return lambda: action.transaction(random.choice(deviceIds), 2)
+    if operation == 'recharge':
+        return lambda: action.recharge(random.choice(deviceIds), 20)
+    if operation == 'addUser':
+        return lambda: action.addUser('new' + uuid4().hex, 'Name', 'Surname')
+    if operation == 'addDevice':
+        return lambda: action.addDevice(random.choice(usernames), randomUid(7), '3B 80 80 01 01')
+    raise ValueError('unknown operation ' + operation)
+
+def measure(call, database, count):
+    """! @brief Function measuring the calls of an operation.
+    The allocations are the objects tracked by the garbage collector and still alive after each call,
+    the garbage collector is disabled during the measure.
+    @param call function making one call
+    @param database the MemoryDataBase instance
+    @param count number of calls
+    @return the operations per second, the round trips and the allocations per operation
+    """
+    for i in range(min(100, count)):
+        call()
+    gc.collect()
+    gc.disable()
+    try:
+        roundTrips = database.roundTrips
+        allocations = gc.get_count()[0]
+        start = time()
+        for i in range(count):
+            call()
+        elapsed = time() - start
+        allocations = gc.get_count()[0] - allocations
+        roundTrips = database.roundTrips - roundTrips
+    finally:
+        gc.enable()
+    return {'opsPerSec': round(count / elapsed, 1), 'roundTripsPerOp': round(float(roundTrips) / count, 3),
+        'allocationsPerOp': round(float(allocations) / count, 1)}
+
+def regressions(results, baseline, tolerance):
+    """! @brief Function comparing the results with a baseline.
+    @param results the results, by population and operation
+    @param baseline the baseline, in the same format
+    @param tolerance relative loss of throughput tolerated
+    @return a list of descriptions of the regressions
+    """
+    found = []
+    for population, operations in sorted(results.items()):
+        for operation, stats in sorted(operations.items()):
+            reference = baseline.get(population, {}).get(operation)
+            if reference is None:
+                continue
+            if stats['opsPerSec'] < reference['opsPerSec'] * (1 - tolerance):
+                found.append('%s users, %s : %.1f ops/s instead of %.1f' % (population, operation, stats['opsPerSec'], reference['opsPerSec']))
+            if stats['roundTripsPerOp'] > reference['roundTripsPerOp'] + 0.01:
+                found.append('%s users, %s : %.3f round trips/op instead of %.3f' % (population, operation, stats['roundTripsPerOp'], reference['roundTripsPerOp']))
+    return found
+
+def main():
+    """! @brief Run the benchmark, print the results and compare them with the baseline. Exit with 1 on a regression."""
+    parser = argparse.ArgumentParser(description='Measure the throughput of the operations of Action against an in-memory database.')
+    parser.add_argument('--users', default=','.join(str(size) for size in POPULATIONS), help='sizes of the populations, separated by commas')
+    parser.add_argument('--ops', type=int, default=2000, help='number of calls of each operation')
+    parser.add_argument('--history', type=int, default=2, help='average number of transactions of a user')
+    parser.add_argument('--operations', default=','.join(OPERATIONS), help='operations to measure, separated by commas')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path of the baseline')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='relative loss of throughput tolerated')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic populations')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = {}
+    print '%-10s %-20s %12s %16s %16s' % ('users', 'operation', 'ops/s', 'round trips/op', 'allocations/op')
+    for users in [int(size) for size in args.users.split(',')]:
+        directory = tempfile.mkdtemp()
+        try:
+            database = MemoryDataBase()
+            start = time()
+            deviceIds, usernames = populate(database, users, args.history)
+            print '%-10d populated in %.1f s (%d devices, %d transactions)' % (users, time() - start, len(deviceIds), len(database.transaction.documents))
+            action = Action(SilentPiFace(), Journal(path.join(directory, 'journal.sqlite')), database)
+            results[str(users)] = {}
+            for operation in args.operations.split(','):
+                stats = measure(workload(operation, action, deviceIds, usernames), database, args.ops)
+                results[str(users)][operation] = stats
+                print '%-10d %-20s %12.1f %16.3f %16.1f' % (users, operation, stats['opsPerSec'], stats['roundTripsPerOp'], stats['allocationsPerOp'])
+            del action, database, deviceIds, usernames
+            gc.collect()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.save:
+        with open(args.baseline, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        print 'Baseline written in ' + args.baseline
+        return
+
+    if not path.exists(args.baseline):
+        print 'No baseline in %s, run with --save to create it.' % args.baseline
+        return
+    with open(args.baseline) as baselineFile:
+        found = regressions(results, json.load(baselineFile), args.tolerance)
+    for regression in found:
+        print 'REGRESSION ' + regression
+    if found:
+        sys.exit(1)
+    print 'No regression compared with ' + args.baseline
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file benchpiface.py
+#  Benchmark of the PiFace buttons, from the button pressed to the slot called.
+
+## @package benchpiface
+#  Latency of the PiFace buttons and cost of the listener, with the simulated PiFace Digital module.
+#  While waiting for a card, the Frame disables the buttons every 0.5 seconds : the benchmark does the same
+#  and measures the threads and the CPU used by the listener.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import os
+import sys
+import random
+import argparse
+import threading
+from time import time
+from PySide.QtCore import *
+
+import fakepifacedigitalio
+from pifacecontrol import PiFaceControl
+from benchtap import percentile
+
+class ButtonProbe(QObject):
+    """! @brief
+    Press the buttons one by one and measure the time until the slot is called on the Qt thread.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted when all the presses are done
+    done = Signal()
+
+    def __init__(self, piface, presses):
+        """! @brief Connect the signals of the buttons.
+        @param self the ButtonProbe instance
+        @param piface the PiFaceControl instance, using the simulated module
+        @param presses number of presses
+        """
+        QObject.__init__(self)
+        ## link to the PiFaceControl instance
+        self.piface = piface
+        ## number of presses
+        self.presses = presses
+        ## latency of each press, in seconds
+        self.latencies = []
+        ## event of the pending press
+        self.event = None
+        for button in (piface.b1, piface.b2, piface.b3, piface.b4):
+            button.connect(self.buttonSlot)
+
+    @Slot()
+    def nextPress(self):
+        """! @brief Slot pressing a random button, or emitting done when all the presses are made.
+        @param self the ButtonProbe instance
+        """
+        if len(self.latencies) == self.presses:
+            self.done.emit()
+            return
+        pin = random.randint(0, 3)
+        self.piface.pfd.release(pin)
+        # after the settle time of the pin, the press would be ignored otherwise
+        QTimer.singleShot(25, lambda: self.press(pin))
+
+    def press(self, pin):
+        """! @brief Method pressing a button.
+        @param self the ButtonProbe instance
+        @param pin number of the input pin
+        """
+        self.event = self.piface.pfd.press(pin)
+
+    @Slot()
+    def buttonSlot(self):
+        """! @brief Slot connected to the buttons, as the slots of CardReader and Frame.
+        @param self the ButtonProbe instance
+        """
+        self.latencies.append(time() - self.event.timestamp)
+        QTimer.singleShot(0, self.nextPress)
+
+def cpuTime():
+    """! @brief Function getting the CPU time used by the process, in seconds."""
+    times = os.times()
+    return times[0] + times[1]
+
+def main():
+    """! @brief Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description='Measure the latency of the PiFace buttons and the cost of the listener.')
+    parser.add_argument('--presses', type=int, default=200, help='number of presses')
+    parser.add_argument('--idle', type=float, default=5, help='duration of the waiting phase, in seconds')
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    threadsBefore = threading.active_count()
+    piface = PiFaceControl(fakepifacedigitalio)
+    threads = threading.active_count() - threadsBefore
+
+    # waiting for a card : the buttons are disabled every 0.5 seconds, as Frame.update does
+    timer = QTimer()
+    timer.timeout.connect(piface.deactivateButtonListener)
+    timer.start(500)
+    QTimer.singleShot(int(args.idle * 1000), app.quit)
+    start = time()
+    cpu = cpuTime()
+    app.exec_()
+    idleCpu = (cpuTime() - cpu) / (time() - start)
+    timer.stop()
+
+    # presses while the buttons are disabled are dropped
+    leaked = []
+    piface.b1.connect(lambda: leaked.append(time()))
+    piface.pfd.press(0)
+    QTimer.singleShot(100, app.quit)
+    app.exec_()
+    leaked = len(leaked)
+
+    piface.activateButtonListener()
+    probe = ButtonProbe(piface, args.presses)
+    probe.done.connect(app.quit)
+    QTimer.singleShot(0, probe.nextPress)
+    app.exec_()
+    piface.stop()
+
+    print 'listener threads     %d' % threads
+    print 'idle CPU             %.2f %%' % (100 * idleCpu)
+    print 'presses dropped      %s' % ('yes' if leaked == 0 else 'NO')
+    print '%-20s %8s %10s %10s %10s' % ('latency', 'count', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)')
+    print '%-20s %8d %10.3f %10.3f %10.3f' % ('button to slot', len(probe.latencies), 1000 * percentile(probe.latencies, 50),
+        1000 * percentile(probe.latencies, 95), 1000 * percentile(probe.latencies, 99))
+
+if __name__ == '__main__':
+    main()
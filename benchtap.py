@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file benchtap.py
+#  Benchmark of the latency of a tap, from the card in front of the reader to the UI.
+
+## @package benchtap
+#  End-to-end tap latency benchmark. The cards are replayed by the simulated reader,
+#  the accounts are kept in memory and the signals go through CardReader, Action and Frame
+#  as in main.py. Run it headless with `xvfb-run -a python benchtap.py`.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import json
+import math
+import random
+import shutil
+import argparse
+import tempfile
+from os import path
+from time import time
+from uuid import uuid4
+from PySide import QtGui
+from PySide.QtCore import *
+
+from constants import *
+from memorydb import MemoryDataBase
+from documents import deviceDocument
+from simreader import SimulatedCard, SimulatedCardRequest, MIFARE, ANDROID, ERROR, REMOVED, APDU_DELAY
+from journal import Journal, JournalSyncer
+from action import Action
+from asyncaction import AsyncAction
+from cardreader import CardReader
+from cardstrategy import CardStrategies
+from ui import Frame
+from metrics import Metrics
+
+## maximum duration of a tap before it is counted as failed, in seconds
+TAP_TIMEOUT = 5
+
+def percentile(values, p):
+    """! @brief Function computing a percentile with the nearest rank method.
+    @param values list of values
+    @param p the percentile, between 0 and 100
+    """
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    rank = max(1, int(math.ceil(p / 100.0 * len(values))))
+    return values[rank - 1]
+
+class SilentPiFace(object):
+    """! @brief
+    PiFace without hardware, the buttons and the LEDs do nothing.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def activateButtonListener(self):
+        """! @brief Method called when the buttons have to be listened, does nothing.
+        @param self the SilentPiFace instance
+        """
+        pass
+
+    def deactivateButtonListener(self):
+        """! @brief Method called when the buttons have to be ignored, does nothing.
+        @param self the SilentPiFace instance
+        """
+        pass
+
+    def actionValidated(self):
+        """! @brief Method called when an action is validated, does nothing.
+        @param self the SilentPiFace instance
+        """
+        pass
+
+    def actionDenied(self):
+        """! @brief Method called when an action is denied, does nothing.
+        @param self the SilentPiFace instance
+        """
+        pass
+
+def seedAccounts(database, count):
+    """! @brief Function creating the accounts used by the benchmark, each with one device.
+    @param database the MemoryDataBase instance
+    @param count number of accounts
+    @return the SimulatedCard instances of the devices, half Mifare and half Android
+    """
+    cards = []
+    users = []
+    for i in range(count):
+        uid = ' '.join('%02X' % b for b in bytearray(uuid4().bytes[:4 if i % 2 == 0 else 7]))
+        cards.append(SimulatedCard(uid, MIFARE if i % 2 == 0 else ANDROID))
+        users.append({"uid": str(uuid4()), "username": 'bench%d' % i, "balance": 10 ** 6, "statement": STA_USER_ACTIVE,
+            "devices": [deviceDocument(uid, cards[-1].atr, 'smartcard' if i % 2 == 0 else 'smartphone')],
+            "recentTransactions": []})
+    database.user.insert(users)
+    return cards
+
+class TapProbe(QObject):
+    """! @brief
+    Present the cards one by one and measure the latency of each tap.
+    Tap-to-balance goes from the card in front of the reader to the balance displayed by the Frame,
+    tap-to-debit goes from the click on the button to the account updated by the transaction.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted when all the taps are done
+    done = Signal()
+
+    def __init__(self, request, cards, taps, frame, cardReader, asyncAction, faults=0.0):
+        """! @brief Link the components and connect their signals.
+        @param self the TapProbe instance
+        @param request the SimulatedCardRequest instance
+        @param cards the cards linked to an account
+        @param taps number of taps to measure
+        @param frame the Frame instance
+        @param cardReader the CardReader instance
+        @param asyncAction the AsyncAction instance
+        @param faults ratio of taps made with a faulty card (error status words or removed)
+        """
+        QObject.__init__(self)
+        ## link to the simulated reader
+        self.request = request
+        ## cards linked to an account
+        self.cards = cards
+        ## number of taps to measure
+        self.taps = taps
+        ## link to the Frame instance
+        self.frame = frame
+        ## link to the CardReader instance
+        self.cardReader = cardReader
+        ## ratio of faulty cards
+        self.faults = faults
+        ## card in front of the reader
+        self.card = None
+        ## time of the click on the button
+        self.clicked = None
+        ## tap-to-balance latencies, in seconds
+        self.balanceLatencies = []
+        ## tap-to-debit latencies, in seconds
+        self.debitLatencies = []
+        ## number of taps which ended with a warning
+        self.warnings = 0
+        ## number of taps which failed or timed out
+        self.failures = 0
+        ## number of taps made
+        self.count = 0
+        ## timer detecting a tap which never ends
+        self.watchdog = QTimer(self)
+        self.watchdog.setSingleShot(True)
+        self.watchdog.timeout.connect(self.tapTimedOut)
+
+        # connected after the Frame, which has already updated the UI when the probe is called
+        cardReader.cardDetected.connect(self.cardDetected)
+        cardReader.warning.connect(self.warning)
+        asyncAction.transactionDone.connect(self.transactionDone)
+        asyncAction.failed.connect(self.failed)
+
+    @Slot()
+    def nextTap(self):
+        """! @brief Slot presenting the next card, or emitting done when all the taps are made.
+        @param self the TapProbe instance
+        """
+        if self.count == self.taps:
+            self.watchdog.stop()
+            self.done.emit()
+            return
+        self.count += 1
+        previous = self.card
+        self.card = random.choice(self.cards)
+        # the same card twice in a row would be served by the session, and its purchase debounced
+        while self.card is previous and len(self.cards) > 1:
+            self.card = random.choice(self.cards)
+        if random.random() < self.faults:
+            fault = SimulatedCard(self.card.uid, random.choice([ERROR, REMOVED]))
+            if fault.kind == REMOVED:
+                # removed before it could be read, the watcher waits for the next card without telling the UI
+                self.request.present(fault)
+            else:
+                self.card = fault
+        self.watchdog.start(TAP_TIMEOUT * 1000)
+        self.request.present(self.card)
+
+    @Slot(object)
+    def cardDetected(self, account):
+        """! @brief Slot called when the Frame displays the balance. Click on the button to get some balls.
+        @param self the TapProbe instance
+        @param account the account linked to the card
+        """
+        self.balanceLatencies.append(time() - self.card.presented)
+        # the session ends with the transaction, not with the timer of the Frame
+        self.frame.releaseCardTimer.stop()
+        self.clicked = time()
+        self.frame.b1.click()
+
+    @Slot(object)
+    def transactionDone(self, account):
+        """! @brief Slot called when the transaction is finished. CardReader waits for the next card.
+        @param self the TapProbe instance
+        @param account the account after the transaction, None if refused
+        """
+        if account is None:
+            self.failures += 1
+        else:
+            self.debitLatencies.append(time() - self.clicked)
+        QTimer.singleShot(0, self.nextTap)
+
+    @Slot(int)
+    def warning(self, warning):
+        """! @brief Slot called when the Frame displays a warning. Skip the delay of the warning.
+        @param self the TapProbe instance
+        @param warning identifier of the warning
+        """
+        self.warnings += 1
+        self.frame.warningTimer.stop()
+        self.cardReader.start()
+        QTimer.singleShot(0, self.nextTap)
+
+    @Slot(str, str)
+    def failed(self, name, error):
+        """! @brief Slot called when an operation has failed. CardReader waits for the next card.
+        @param self the TapProbe instance
+        @param name name of the operation
+        @param error description of the error
+        """
+        self.failures += 1
+        if name == 'transaction':
+            QTimer.singleShot(0, self.nextTap)
+
+    @Slot()
+    def tapTimedOut(self):
+        """! @brief Slot called when a tap takes more than TAP_TIMEOUT. Start again with the next card.
+        @param self the TapProbe instance
+        """
+        self.failures += 1
+        self.frame.warningTimer.stop()
+        self.frame.releaseCardTimer.stop()
+        self.cardReader.start()
+        self.nextTap()
+
+    def results(self):
+        """! @brief Method to get the results, the latencies are in milliseconds.
+        @param self the TapProbe instance
+        """
+        results = {'taps': self.count, 'warnings': self.warnings, 'failures': self.failures}
+        for name, latencies in [('tapToBalance', self.balanceLatencies), ('tapToDebit', self.debitLatencies)]:
+            results[name] = dict(('p%d' % p, round(1000 * percentile(latencies, p), 3)) for p in (50, 95, 99))
+            results[name]['count'] = len(latencies)
+        return results
+
+def main():
+    """! @brief Run the benchmark and print the percentiles."""
+    parser = argparse.ArgumentParser(description='Measure the latency of a tap, from the reader to the UI.')
+    parser.add_argument('--taps', type=int, default=200, help='number of taps')
+    parser.add_argument('--accounts', type=int, default=100, help='number of accounts in the database')
+    parser.add_argument('--apdu-delay', type=float, default=APDU_DELAY, help='time taken to exchange an APDU, in seconds')
+    parser.add_argument('--faults', type=float, default=0.0, help='ratio of faulty cards (error status words or removed)')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the random choice of the cards')
+    parser.add_argument('--json', help='write the results in this file')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    app = QtGui.QApplication(sys.argv)
+    frame = Frame()
+    frame.show()
+
+    directory = tempfile.mkdtemp()
+    database = MemoryDataBase()
+    cards = seedAccounts(database, args.accounts)
+    journal = Journal(path.join(directory, 'journal.sqlite'))
+    syncer = JournalSyncer(journal, database)
+    syncer.start()
+    action = Action(SilentPiFace(), journal, database)
+    asyncAction = AsyncAction(action)
+    request = SimulatedCardRequest(delay=args.apdu_delay)
+    cardReader = CardReader(action, asyncAction, request, CardStrategies(path.join(directory, 'cardstrategies.json')))
+
+    # same connections as main.py
+    frame.b1.clicked.connect(cardReader.someBalls)
+    frame.b2.clicked.connect(cardReader.manyBalls)
+    action.status.connect(frame.displayStatus)
+    cardReader.updateWaiting.connect(frame.update)
+    cardReader.cardDetected.connect(frame.displayCard)
+    cardReader.warning.connect(frame.displayWarning)
+
+    probe = TapProbe(request, cards, args.taps, frame, cardReader, asyncAction, args.faults)
+    probe.done.connect(app.quit)
+    cardReader.start()
+    QTimer.singleShot(0, probe.nextTap)
+    app.exec_()
+
+    cardReader.stop()
+    syncer.stop()
+    asyncAction.stop()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    results = probe.results()
+    results['roundTrips'] = database.roundTrips
+    print '%-14s %8s %10s %10s %10s' % ('latency', 'count', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)')
+    for name in ('tapToBalance', 'tapToDebit'):
+        stats = results[name]
+        print '%-14s %8d %10.2f %10.2f %10.2f' % (name, stats['count'], stats['p50'], stats['p95'], stats['p99'])
+    print 'taps=%d warnings=%d failures=%d roundTrips=%d' % (results['taps'], results['warnings'], results['failures'], results['roundTrips'])
+    Metrics().printReport()
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    sys.exit(1 if results['failures'] else 0)
+
+if __name__ == '__main__':
+    main()
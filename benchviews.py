@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file benchviews.py
+#  Benchmark of the switches between the views of the Frame.
+
+## @package benchviews
+#  Time of the switches between the user, login and admin views, with the pages of the Frame
+#  and with all the widgets in one layout, shown and hidden one by one as the Frame did before.
+#  Each switch is measured until the layout and the repaint of the window are done.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import argparse
+from time import time
+from PySide import QtGui
+from PySide.QtCore import *
+
+from constants import *
+from metrics import Metrics
+from uistate import UiEventCounter
+from ui import Frame
+from benchtap import percentile
+
+## names of the switches, in the order of a cycle
+SWITCHES = ['main -> login', 'login -> admin', 'admin -> main']
+
+def label(text, style):
+    """! @brief Function creating a styled label.
+    @param text text of the label
+    @param style style sheet of the label
+    """
+    widget = QtGui.QLabel(text)
+    widget.setStyleSheet(style)
+    return widget
+
+def lineEdit(placeholder):
+    """! @brief Function creating a line edit.
+    @param placeholder placeholder text of the line edit
+    """
+    widget = QtGui.QLineEdit()
+    widget.setPlaceholderText(placeholder)
+    return widget
+
+def row(*widgets):
+    """! @brief Function creating a horizontal layout.
+    @param widgets the widgets of the layout
+    """
+    layout = QtGui.QHBoxLayout()
+    for widget in widgets:
+        layout.addWidget(widget)
+    return layout
+
+class LegacyFrame(QtGui.QWidget):
+    """! @brief
+    The widgets of the views of the Frame in one vertical layout. A view is displayed by showing and hiding
+    each widget, as the Frame did before its pages.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, parent=None):
+        """! @brief Build all the widgets, the user view is displayed.
+        @param self the LegacyFrame instance
+        @param parent the parent QWidget, optional
+        """
+        QtGui.QWidget.__init__(self, parent)
+        self.setFont(QtGui.QFont("Verdana"))
+        self.setGeometry(0, 0, 650, 550)
+        title = 'font-size:30pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;'
+        w = {}
+        w['l1'] = label("Welcome<br />on<br />NFC Golf Ball Dispenser", title)
+        w['l2'] = label('created by Jacky Casas', 'font-size:10pt; qproperty-alignment:AlignRight; qproperty-wordWrap:true;')
+        w['l3'] = label('Just approach your smartphone or smartcard in front of the reader',
+            'font-size:20pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
+        w['l4'] = label('waiting', 'font-size:12pt; qproperty-alignment:AlignCenter; background-color:#E0E0E0; padding:4px; margin:10px 30px;')
+        w['logl1'] = label("Welcome on the login of the administration", title)
+        w['adminl1'] = label("Welcome on the admin", title)
+        w['adminUsername'] = lineEdit('username')
+        w['adminPassword'] = lineEdit('password')
+        w['log'] = QtGui.QPushButton('Login')
+        w['lRecharge'] = QtGui.QLabel('Recharge the account :')
+        w['moneyBox'] = QtGui.QSpinBox()
+        w['bRecharge'] = QtGui.QPushButton('Recharge')
+        w['username'] = lineEdit('username')
+        w['name'] = lineEdit('name')
+        w['surname'] = lineEdit('surname')
+        w['bCreateAccount'] = QtGui.QPushButton('Create account')
+        w['lAddDevice'] = QtGui.QLabel('Add smartcard to account :')
+        w['username2'] = lineEdit('username')
+        w['bAddDevice'] = QtGui.QPushButton('Add smartcard')
+        w['lTransaction'] = label("The last 10<br />transactions", 'font-size:15pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
+        w['transactionTable'] = QtGui.QTableWidget()
+        w['transactionTable'].setColumnCount(3)
+        buttons = [QtGui.QPushButton(text) for text in ('2 CHF - 30 balls', '5 CHF - 80 balls', 'last transactions', 'admin')]
+        status = [label('Status : ', 'background-color:#E0E0E0; padding:4px;'), label('', 'background-color:#E0E0E0; padding:4px;')]
+        ## widgets by name
+        self.widgets = w
+
+        verticalLayout = QtGui.QVBoxLayout()
+        verticalLayout.addWidget(w['l1'])
+        verticalLayout.addWidget(w['logl1'])
+        verticalLayout.addWidget(w['adminl1'])
+        verticalLayout.addWidget(w['l2'])
+        verticalLayout.addLayout(row(w['adminUsername'], w['adminPassword'], w['log']))
+        verticalLayout.addWidget(w['l3'])
+        verticalLayout.addWidget(w['l4'])
+        verticalLayout.addLayout(row(w['lTransaction'], w['transactionTable']))
+        verticalLayout.addLayout(row(w['lRecharge'], w['moneyBox'], w['bRecharge']))
+        verticalLayout.addLayout(row(w['username'], w['name'], w['surname'], w['bCreateAccount']))
+        verticalLayout.addLayout(row(w['lAddDevice'], w['username2'], w['bAddDevice']))
+        verticalLayout.addLayout(row(*buttons))
+        verticalLayout.addLayout(row(*status))
+        self.setLayout(verticalLayout)
+
+        ## widgets displayed by each view
+        self.views = {
+            'main': set(['l1', 'l2', 'l3']),
+            'login': set(['logl1', 'adminUsername', 'adminPassword', 'log']),
+            'admin': set(['adminl1', 'lRecharge', 'moneyBox', 'bRecharge', 'username', 'name', 'surname', 'bCreateAccount',
+                'lAddDevice', 'username2', 'bAddDevice']),
+        }
+        w['lTransaction'].setVisible(False)
+        w['transactionTable'].setVisible(False)
+        self.display('main')
+
+    def display(self, view):
+        """! @brief Method displaying a view, every widget of the views is shown or hidden.
+        @param self the LegacyFrame instance
+        @param view 'main', 'login' or 'admin'
+        """
+        for widgets in self.views.itervalues():
+            for name in widgets:
+                self.widgets[name].setVisible(name in self.views[view])
+
+def settle(app):
+    """! @brief Function processing the pending layouts and repaints.
+    @param app the QApplication instance
+    """
+    app.sendPostedEvents()
+    app.processEvents()
+
+def measure(app, window, switches, cycles):
+    """! @brief Function measuring the switches between the views of a window.
+    The first cycle, where the lazy pages are built, is kept apart.
+    @param app the QApplication instance
+    @param window the window, shown
+    @param switches the functions making each switch of a cycle
+    @param cycles number of cycles
+    @return the durations of the first switches, the durations of each switch, the paints and layouts per switch
+    """
+    counter = UiEventCounter()
+    counter.watch(window)
+    first = []
+    durations = dict((name, []) for name in SWITCHES)
+    for cycle in range(cycles + 1):
+        for name, switch in zip(SWITCHES, switches):
+            start = time()
+            switch()
+            settle(app)
+            duration = time() - start
+            if cycle == 0:
+                first.append(duration)
+            else:
+                durations[name].append(duration)
+        if cycle == 0:
+            # the children built by the first cycle are watched too
+            counter.watch(window)
+            counter.paints = counter.layouts = 0
+    switchCount = float(cycles * len(SWITCHES))
+    return first, durations, counter.paints / switchCount, counter.layouts / switchCount
+
+def main():
+    """! @brief Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description='Measure the switches between the views of the Frame.')
+    parser.add_argument('--cycles', type=int, default=50, help='number of cycles main -> login -> admin -> main')
+    args = parser.parse_args()
+
+    app = QtGui.QApplication(sys.argv)
+    # the UI metrics of the Frame would only be measured by one of the two windows
+    Metrics().enabled = False
+
+    start = time()
+    legacy = LegacyFrame()
+    legacy.show()
+    settle(app)
+    legacyBuild = time() - start
+    legacyResults = measure(app, legacy, [lambda: legacy.display('login'), lambda: legacy.display('admin'),
+        lambda: legacy.display('main')], args.cycles)
+    legacy.close()
+
+    start = time()
+    frame = Frame()
+    frame.show()
+    settle(app)
+    frameBuild = time() - start
+    frameResults = measure(app, frame, [frame.toggleAdminView, lambda: frame.displayAdmin(ADMIN_USERNAME, ADMIN_PASSWORD),
+        frame.toggleAdminView], args.cycles)
+    frame.close()
+
+    print '%-10s %-16s %8s %10s %10s %10s' % ('layout', 'switch', 'count', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)')
+    for name, results in (('one', legacyResults), ('pages', frameResults)):
+        first, durations, paints, layouts = results
+        for switch in SWITCHES:
+            values = durations[switch]
+            print '%-10s %-16s %8d %10.3f %10.3f %10.3f' % (name, switch, len(values), 1000 * percentile(values, 50),
+                1000 * percentile(values, 95), 1000 * percentile(values, 99))
+    print
+    print '%-10s %12s %14s %16s %16s' % ('layout', 'build (ms)', 'first (ms)', 'paints/switch', 'layouts/switch')
+    for name, build, results in (('one', legacyBuild, legacyResults), ('pages', frameBuild, frameResults)):
+        first, durations, paints, layouts = results
+        print '%-10s %12.3f %14s %16.1f %16.1f' % (name, 1000 * build, '/'.join('%.1f' % (1000 * d) for d in first), paints, layouts)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file bootstrap.py
+#  Contains the classes StartupProfile and Bootstrap.
+
+## @package bootstrap
+#  Initialization of the dispenser in the background, once the window is displayed.
+#  The heavy modules (pymongo, pyscard, pifacedigitalio) are imported by the bootstrap thread only.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import threading
+from time import time
+from contextlib import contextmanager
+from PySide.QtCore import *
+
+from constants import *
+
+## thread of the UI
+UI_THREAD = 'ui'
+## bootstrap thread
+BACKGROUND_THREAD = 'background'
+
+class StartupProfile(object):
+    """! @brief
+    Duration of each phase of the startup, on the UI thread and on the bootstrap thread.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, start=None):
+        """! @brief Initialize the profile, without any phase.
+        @param self the StartupProfile instance
+        @param start time when the process has started, now by default
+        """
+        ## time when the process has started
+        self.start = start if start is not None else time()
+        ## lock protecting the phases, written by two threads
+        self.lock = threading.Lock()
+        ## phases `(name, thread, start, end)`, in seconds since the epoch
+        self.phases = []
+
+    def add(self, name, thread, start, end):
+        """! @brief Method to add a phase.
+        @param self the StartupProfile instance
+        @param name name of the phase
+        @param thread UI_THREAD or BACKGROUND_THREAD
+        @param start time when the phase has started
+        @param end time when the phase has ended
+        """
+        with self.lock:
+            self.phases.append((name, thread, start, end))
+
+    @contextmanager
+    def phase(self, name, thread=UI_THREAD):
+        """! @brief Context manager measuring a phase.
+        @param self the StartupProfile instance
+        @param name name of the phase
+        @param thread UI_THREAD or BACKGROUND_THREAD
+        """
+        start = time()
+        try:
+            yield
+        finally:
+            self.add(name, thread, start, time())
+
+    def mark(self, name, thread=UI_THREAD):
+        """! @brief Method to add a milestone, a phase without any duration.
+        @param self the StartupProfile instance
+        @param name name of the milestone
+        @param thread UI_THREAD or BACKGROUND_THREAD
+        """
+        now = time()
+        self.add(name, thread, now, now)
+
+    def report(self):
+        """! @brief Method to get the phases as a printable text, in the order they have started.
+        @param self the StartupProfile instance
+        """
+        lines = ['%-24s %-12s %12s %15s' % ('phase', 'thread', 'start (ms)', 'duration (ms)')]
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[2])
+        for name, thread, start, end in phases:
+            lines.append('%-24s %-12s %12.1f %15.1f' % (name, thread, 1000 * (start - self.start), 1000 * (end - start)))
+        return '\n'.join(lines)
+
+    def printReport(self):
+        """! @brief Method to print the phases on the standard output.
+        @param self the StartupProfile instance
+        """
+        print self.report()
+
+class Bootstrap(QThread):
+    """! @brief
+    Thread opening the database, the journal, the card readers and the PiFace, while the window is already displayed.
+    The objects are given to the UI thread with the signal ready.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted with the objects initialized, as a dictionary
+    ready = Signal(object)
+    ## Signal emitted when the initialization has failed (error)
+    failed = Signal(str)
+
+    def __init__(self, profile, parent=None):
+        """! @brief Initialize the thread, not started.
+        @param self the Bootstrap instance
+        @param profile the StartupProfile instance
+        @param parent the parent QObject, optional
+        """
+        QThread.__init__(self, parent)
+        ## link to the StartupProfile instance
+        self.profile = profile
+
+    def run(self):
+        """! @brief Method executed by the thread.
+        @param self the Bootstrap instance
+        """
+        try:
+            objects = self.initialize()
+        except Exception, e:
+            print "Error during the initialization: %s" % e
+            self.failed.emit(str(e))
+            return
+        self.ready.emit(objects)
+
+    def initialize(self):
+        """! @brief Method importing the heavy modules and opening the database, the journal, the readers and the PiFace.
+        @param self the Bootstrap instance
+        @return dictionary with the database, the journal, the names of the readers, the card strategies and the PiFaceControl instance
+        """
+        phase = lambda name: self.profile.phase(name, BACKGROUND_THREAD)
+        with phase('import database'):
+            from database import DataBase
+        with phase('connect database'):
+            database = DataBase()
+        with phase('open journal'):
+            from journal import Journal
+            journal = Journal()
+        with phase('import reader'):
+            from smartcard.System import readers
+            from cardstrategy import CardStrategies
+        with phase('list readers'):
+            names = [str(reader) for reader in readers()]
+            strategies = CardStrategies()
+        with phase('init piface'):
+            from pifacecontrol import PiFaceControl
+            piface = PiFaceControl()
+            # its slots are called by the UI, the thread of the bootstrap ends soon
+            piface.moveToThread(QCoreApplication.instance().thread())
+        return {'database': database, 'journal': journal, 'readers': names, 'strategies': strategies, 'piface': piface}
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file bulkimport.py
+#  Contains the class BulkImporter and the command importing users and devices from a file.
+
+## @package bulkimport
+#  Bulk import of the members of a club and of their cards, from a CSV or NDJSON file.
+#  The rows are read by chunks : the usernames and the devices of a chunk are checked with one query,
+#  then the accounts are written with one unordered bulk operation.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import csv
+import json
+import argparse
+from time import time
+from itertools import islice
+import pymongo
+
+from constants import *
+from database import DataBase
+from documents import userDocument, deviceDocument
+
+## separator of the devices in a CSV cell
+DEVICE_SEPARATOR = ';'
+## error code of MongoDB for a duplicate key
+DUPLICATE_KEY = 11000
+
+def readCsv(stream):
+    """! @brief Function reading the rows of a CSV file, with the columns username, name, surname, devices and ATR.
+    The devices of a row are separated by semicolons.
+    @param stream the file
+    @return generator of `(line, row)`
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        devices = [uid.strip() for uid in (row.get('devices') or '').split(DEVICE_SEPARATOR) if uid.strip()]
+        row['devices'] = [{'uid': uid, 'ATR': row.get('ATR') or None} for uid in devices]
+        yield reader.line_num, row
+
+def readNdjson(stream):
+    """! @brief Function reading the rows of a NDJSON file, one JSON object per line with the keys username, name, surname and devices.
+    A device is a UID or an object with the keys uid, ATR and category.
+    @param stream the file
+    @return generator of `(line, row)`, the row is None if the line is not valid JSON
+    """
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, None
+            continue
+        if isinstance(row, dict):
+            row['devices'] = [device if isinstance(device, dict) else {'uid': device} for device in row.get('devices') or []]
+        yield line, row
+
+def chunks(iterable, size):
+    """! @brief Function splitting an iterable in lists.
+    @param iterable the iterable
+    @param size maximum size of a list
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class BulkImporter(object):
+    """! @brief
+    Import of users and devices. A row creates an account with its devices ; a row whose username is already
+    registered is rejected, or with attach adds its devices to the account if the name and the surname match.
+    The rows are rejected one by one, with the reason : invalid row, username or device already seen in the file,
+    username already registered, device already owned by an account, or duplicate key reported by the unique indexes
+    when another admin has registered the same username or device meanwhile.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database=None, chunkSize=BULK_IMPORT_CHUNK, dryRun=False, attach=False):
+        """! @brief Link the database.
+        @param self the BulkImporter instance
+        @param database the database, DataBase() by default
+        @param chunkSize number of rows checked and written at once
+        @param dryRun check the rows without writing them
+        @param attach add the devices of a row to the registered account of the same username, name and surname
+        """
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+        ## number of rows checked and written at once
+        self.chunkSize = chunkSize
+        ## check the rows without writing them
+        self.dryRun = dryRun
+        ## add the devices of a row to the registered account of the same username, name and surname
+        self.attach = attach
+        ## usernames seen in the file
+        self.usernames = set()
+        ## devices seen in the file
+        self.devices = set()
+        ## rejected rows, `(line, username, reason)`
+        self.errors = []
+        ## number of rows read
+        self.rows = 0
+        ## number of accounts created
+        self.usersCreated = 0
+        ## number of devices added to the accounts, new or already registered
+        self.devicesAdded = 0
+
+    def reject(self, line, row, reason):
+        """! @brief Method to reject a row.
+        @param self the BulkImporter instance
+        @param line number of the line in the file
+        @param row the row, None if it could not be read
+        @param reason why the row is rejected
+        """
+        username = row.get('username') if isinstance(row, dict) else None
+        self.errors.append((line, username, reason))
+
+    def validate(self, line, row):
+        """! @brief Method to check a row, alone and against the rows already seen in the file.
+        @param self the BulkImporter instance
+        @param line number of the line in the file
+        @param row the row
+        @return True if the row is valid
+        """
+        if not isinstance(row, dict):
+            self.reject(line, None, 'not a valid row')
+            return False
+        username = (row.get('username') or '').strip()
+        if not username:
+            self.reject(line, row, 'no username')
+            return False
+        row['username'] = username
+        uids = [device.get('uid') for device in row['devices']]
+        if not all(uids):
+            self.reject(line, row, 'device without UID')
+            return False
+        if len(set(uids)) != len(uids) or self.devices.intersection(uids):
+            self.reject(line, row, 'device already in the file')
+            return False
+        if username in self.usernames:
+            self.reject(line, row, 'username already in the file')
+            return False
+        self.usernames.add(username)
+        self.devices.update(uids)
+        return True
+
+    def importChunk(self, chunk):
+        """! @brief Method to check and write a chunk of rows.
+        The usernames and the devices registered are found with one query, the accounts are written with one unordered bulk operation.
+        @param self the BulkImporter instance
+        @param chunk list of `(line, row)`
+        """
+        rows = [(line, row) for line, row in chunk if self.validate(line, row)]
+        if not rows:
+            return
+        usernames = [row['username'] for line, row in rows]
+        uids = [device['uid'] for line, row in rows for device in row['devices']]
+        # name and surname of the registered usernames
+        registered = {}
+        owned = set()
+        for user in self.database.user.find({"$or": [{"username": {"$in": usernames}}, {"devices.uid": {"$in": uids}}]},
+                {"username": 1, "name": 1, "surname": 1, "devices": 1}):
+            registered[user['username']] = (user.get('name'), user.get('surname'))
+            owned.update(device['uid'] for device in user.get('devices', []))
+
+        bulk = self.database.user.initialize_unordered_bulk_op()
+        # line, row, accounts and devices written by each operation of the bulk, in order
+        operations = []
+        for line, row in rows:
+            if owned.intersection(device['uid'] for device in row['devices']):
+                self.reject(line, row, 'device already owned by an account')
+                continue
+            devices = [deviceDocument(device['uid'], device.get('ATR'), device.get('category') or 'smartcard') for device in row['devices']]
+            if row['username'] in registered:
+                if not self.attach:
+                    self.reject(line, row, 'username already registered')
+                    continue
+                if registered[row['username']] != (row.get('name') or None, row.get('surname') or None):
+                    self.reject(line, row, 'username registered with another name')
+                    continue
+                if not devices:
+                    self.reject(line, row, 'username already registered')
+                    continue
+                bulk.find({"username": row['username']}).update_one({"$push": {"devices": {"$each": devices}}})
+                operations.append((line, row, 0, len(devices)))
+            else:
+                bulk.insert(userDocument(row['username'], row.get('name') or None, row.get('surname') or None, devices))
+                operations.append((line, row, 1, len(devices)))
+        if not operations or self.dryRun:
+            self.count(operations, set())
+            return
+
+        failed = set()
+        try:
+            bulk.execute()
+        except pymongo.errors.BulkWriteError, e:
+            for error in e.details['writeErrors']:
+                line, row = operations[error['index']][:2]
+                failed.add(error['index'])
+                if error['code'] == DUPLICATE_KEY:
+                    self.reject(line, row, 'username or device registered meanwhile')
+                else:
+                    self.reject(line, row, error['errmsg'])
+        self.count(operations, failed)
+
+    def count(self, operations, failed):
+        """! @brief Method to count the accounts and the devices written.
+        @param self the BulkImporter instance
+        @param operations the operations of the bulk, `(line, row, accounts, devices)`
+        @param failed indexes of the operations which have failed
+        """
+        for index, (line, row, users, devices) in enumerate(operations):
+            if index not in failed:
+                self.usersCreated += users
+                self.devicesAdded += devices
+
+    def run(self, rows, progress=None):
+        """! @brief Method to import rows.
+        @param self the BulkImporter instance
+        @param rows iterable of `(line, row)`
+        @param progress function called after each chunk with the number of rows read, optional
+        """
+        for chunk in chunks(rows, self.chunkSize):
+            self.rows += len(chunk)
+            self.importChunk(chunk)
+            if progress is not None:
+                progress(self.rows)
+
+def main():
+    """! @brief Command line importing users and devices. Exit with 1 if rows are rejected."""
+    parser = argparse.ArgumentParser(description='Import users and their devices from a CSV or NDJSON file.')
+    parser.add_argument('path', help='file to import, CSV (username,name,surname,devices,ATR) or NDJSON')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='format of the file, guessed from its extension by default')
+    parser.add_argument('--chunk', type=int, default=BULK_IMPORT_CHUNK, help='number of rows checked and written at once')
+    parser.add_argument('--dry-run', action='store_true', help='check the rows without writing them')
+    parser.add_argument('--attach', action='store_true',
+        help='add the devices of a row to the registered account of the same username, name and surname')
+    args = parser.parse_args()
+
+    database = DataBase()
+    if not database.online:
+        print 'The database can\'t be reached.'
+        sys.exit(2)
+
+    fileFormat = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+    importer = BulkImporter(database, args.chunk, args.dry_run, args.attach)
+    start = time()
+    with open(args.path, 'rb') as stream:
+        rows = readCsv(stream) if fileFormat == 'csv' else readNdjson(stream)
+        importer.run(rows, lambda count: sys.stdout.write('\r%d rows, %.0f rows/s' % (count, count / max(time() - start, 1e-6))))
+    duration = time() - start
+    print
+
+    for line, username, reason in importer.errors:
+        print 'line %-6s %-20s %s' % (line, username or '', reason)
+    print '%d rows in %.2f s (%.0f rows/s) : %d accounts created, %d devices added, %d rows rejected%s' % (importer.rows, duration,
+        importer.rows / max(duration, 1e-6), importer.usersCreated, importer.devicesAdded, len(importer.errors),
+        ' (dry run, nothing written)' if args.dry_run else '')
+    sys.exit(1 if importer.errors else 0)
+
+if __name__ == '__main__':
+    main()
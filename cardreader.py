@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 ## @file cardreader.py
-#  Contains the classes DCCardType and CardReader.
+#  Contains the classes DCCardType, CardWatcher and CardReader.
 
 ## @package cardreader
 #  Communication with a NFC Card Reader.
@@ -10,29 +10,27 @@
 #  @date 22.06.2014
 #  @version 1.0
 
-from smartcard.CardType import ATRCardType, CardType
-from smartcard.CardRequest import CardRequest
-from smartcard.util import toHexString, toBytes
-from smartcard.CardConnection import CardConnection
-from smartcard.CardConnectionObserver import ConsoleCardConnectionObserver, CardConnectionObserver
-from smartcard.Exceptions import CardRequestTimeoutException
-from smartcard.sw.ISO7816_4ErrorChecker import ISO7816_4ErrorChecker
-from smartcard.sw.ISO7816_8ErrorChecker import ISO7816_8ErrorChecker
-from smartcard.sw.ISO7816_9ErrorChecker import ISO7816_9ErrorChecker
-from smartcard.sw.ErrorCheckingChain import ErrorCheckingChain
-from smartcard.sw.SWExceptions import SWException
-from smartcard.Card import Card
-
 import sys
+import threading
+from time import time
 from string import replace
 from PySide.QtCore import *
 from constants import *
 from action import Action
 from ui import Frame
+from metrics import Metrics
+from cardstrategy import CardStrategies, toHexString
+from session import SessionManager
+
+try:
+    from smartcard.Exceptions import CardRequestTimeoutException, CardRequestException, CardConnectionException, NoCardException
+except ImportError:
+    # without pyscard, only a simulated reader can be given to CardReader
+    from simreader import CardRequestTimeoutException, CardRequestException, CardConnectionException, NoCardException
 
-class DCCardType(CardType):
+class DCCardType(object):
     """! @brief
-    Direct Convention Card class. 
+    Direct Convention Card class, the card type of pyscard.
     @author CASAS Jacky
     @date 22.06.14
     @version 1.0
@@ -46,6 +44,101 @@ class DCCardType(CardType):
         """
         return atr[0] == 0x3B
 
+class CardWatcher(QThread):
+    """! @brief
+    Thread blocking on the card insertion events of the reader, in the style of the observer API of pyscard.
+    The card and its account are read on this thread and sent to the UI thread with a queued signal.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted when a card has been read (UID, ATR and account)
+    cardRead = Signal(str, str, object)
+
+    def __init__(self, reader):
+        """! @brief Link the CardReader instance.
+        @param self the CardWatcher instance
+        @param reader the CardReader instance which owns the card request
+        """
+        QThread.__init__(self)
+        ## link to a CardReader instance
+        self.reader = reader
+        ## event set when a new card has to be read
+        self.armed = threading.Event()
+        ## tell if the thread has to keep running
+        self.running = True
+
+    def arm(self):
+        """! @brief Method to wait for the next card. Can be called from any thread.
+        @param self the CardWatcher instance
+        """
+        self.armed.set()
+
+    def stop(self):
+        """! @brief Method to stop the thread and wait until it is finished.
+        @param self the CardWatcher instance
+        """
+        self.running = False
+        self.armed.set()
+        self.wait()
+
+    def run(self):
+        """! @brief Loop of the thread. Block until a card is inserted, as long as the watcher is armed.
+        @param self the CardWatcher instance
+        """
+        while self.running:
+            self.armed.wait()
+            if not self.running:
+                break
+            try:
+                # returns as soon as a card is in front of the reader
+                cardService = self.reader.cardrequest.waitforcard()
+            except CardRequestTimeoutException:
+                continue
+            except CardRequestException, e:
+                # e.g. the reader is being unplugged, the reader pool stops the watcher
+                print "Error: could not wait for a card on %s: %s" % (self.reader.name, e)
+                self.msleep(500)
+                continue
+            self.armed.clear()
+            self.update(cardService)
+
+    def update(self, cardService):
+        """! @brief Method called when a card is inserted. Read the card and the account linked to it.
+        @param self the CardWatcher instance
+        @param cardService the service of the inserted card
+        """
+        start = time()
+        metrics = Metrics()
+        reader = self.reader.name
+        try:
+            cardService.connection.connect()
+            cardUid = self.reader.getUID(cardService)
+            ATR = self.reader.getATR(cardService)
+        except (CardConnectionException, NoCardException):
+            # card removed before it could be read, wait for the next one
+            metrics.increment('cards_total', labels={'result': 'removed', 'reader': reader})
+            self.armed.set()
+            return
+
+        # the card kept on the reader is served from memory
+        account = self.reader.session.cachedAccount(cardUid)
+        if account is None:
+            try:
+                account = self.reader.action.getAccount(cardUid)
+            except Exception, e:
+                print "Error: could not load the account: %s" % e
+                metrics.increment('cards_total', labels={'result': 'error', 'reader': reader})
+                # don't spin on an unreachable database while the card stays on the reader
+                self.msleep(500)
+                self.armed.set()
+                return
+            self.reader.session.begin(cardUid, account)
+
+        metrics.observe('card_detect_seconds', time() - start, {'reader': reader})
+        metrics.increment('cards_total', labels={'result': 'read', 'reader': reader})
+        self.cardRead.emit(cardUid, ATR, account)
+
 class CardReader(QObject):
     """! @brief
     All actions from and to the NFC card reader are handled here.
@@ -57,98 +150,171 @@ class CardReader(QObject):
     updateWaiting = Signal()
     ## Signal used to display different warnings on the UI
     warning = Signal(int)
-    ## Signal used to update UI when a card is detected
-    cardDetected = Signal(int)
+    ## Signal used to update UI when a card is detected (account)
+    cardDetected = Signal(object)
 
-    def __init__(self, action):
-        """! @brief Link an Action instance, create a cardrequest and a timer.
+    def __init__(self, action, asyncAction, cardrequest=None, strategies=None, session=None, name=DEFAULT_READER):
+        """! @brief Link an Action instance, create a cardrequest, a timer and the watcher thread.
         @param self the CardReader instance
-        @param action an instance of Action
+        @param action an instance of Action, used by the watcher thread
+        @param asyncAction an instance of AsyncAction, used for the operations requested on the UI thread
+        @param cardrequest card request to use instead of the reader, e.g. a SimulatedCardRequest, optional
+        @param strategies the CardStrategies instance identifying the cards, optional
+        @param session the SessionManager instance, optional
+        @param name name of the reader, used as label of the metrics
         """
         QObject.__init__(self)
+        ## name of the reader
+        self.name = name
         ## DCCardType instance
         self.cardtype = DCCardType()
         ## card request to make a connection with a smartcard
-        self.cardrequest = CardRequest(timeout=0.5, cardType=self.cardtype)
+        self.cardrequest = cardrequest
+        if self.cardrequest is None:
+            from smartcard.CardRequest import CardRequest
+            self.cardrequest = CardRequest(timeout=CARD_REQUEST_TIMEOUT, cardType=self.cardtype)
+        ## identification strategy of each card family
+        self.strategies = strategies if strategies is not None else CardStrategies()
+        ## session of the card in front of the reader
+        self.session = session if session is not None else SessionManager()
         
         ## link to an Action instance
         self.action = action
-        ## timer used to update the waiting state
+        ## link to an AsyncAction instance
+        self.asyncAction = asyncAction
+        # wait for a new card when a transaction or a recharge is over
+        self.asyncAction.finished.connect(self.operationFinished)
+        self.asyncAction.failed.connect(self.operationFailed)
+        ## timer used to update the waiting animation
         self.timer = QTimer(self)
+        self.timer.timeout.connect(self.updateWaiting)
         ## identifier of the card when detected
         self.cardUid = None
         ## ATR of the card when dtected
         self.ATR = None
+        ## time when the card has been read, None while waiting for a card
+        self.cardTime = None
+
+        ## thread waiting for the cards
+        self.watcher = CardWatcher(self)
+        self.watcher.cardRead.connect(self.cardRead)
+        self.watcher.start()
         
     @Slot()
     def start(self):
-        """! @brief Slot used to start the update timer with 0.5 seconds.
+        """! @brief Slot used to wait for a new card. The waiting animation is updated every 0.5 seconds.
         @param self the CardReader instance
         """
+        if self.asyncAction.uninterruptible():
+            # the session is kept until its transaction or recharge is over, operationOver waits for a new card then
+            return
+        # init variables
+        self.cardUid = None
+        self.ATR = None
+        self.cardTime = None
+        # the session is over, its operations are not needed anymore
+        self.asyncAction.cancelSession()
         self.timer.start(500)
+        self.watcher.arm()
 
-    @Slot()
-    def waitForCard(self):
-        """! @brief Slot called every 0.5 seconds. If a card is detected, the card is read.
+    @Slot(str, object)
+    def operationFinished(self, name, result):
+        """! @brief Slot called when an asynchronous operation is finished. Wait for a new card after a transaction or a recharge.
         @param self the CardReader instance
+        @param name name of the operation
+        @param result result of the operation
         """
-        try:
-            cardService = self.cardrequest.waitforcard()
-            self.timer.stop()
+        self.operationOver(name, result, 'refused' if result is None else 'done')
 
-            cardService.connection.connect()
+    @Slot(str, str)
+    def operationFailed(self, name, error):
+        """! @brief Slot called when an asynchronous operation has failed or timed out.
+        @param self the CardReader instance
+        @param name name of the operation
+        @param error description of the error
+        """
+        self.operationOver(name, None, 'failed')
+
+    def operationOver(self, name, result, outcome):
+        """! @brief Method counting a transaction or a recharge of the reader, then waiting for a new card.
+        @param self the CardReader instance
+        @param name name of the operation
+        @param result the account after the operation, None if refused or failed
+        @param outcome 'done', 'refused' or 'failed'
+        """
+        if name not in ('transaction', 'recharge'):
+            return
+        metrics = Metrics()
+        labels = {'reader': self.name, 'operation': name}
+        if self.cardTime is not None:
+            metrics.observe('reader_service_seconds', time() - self.cardTime, labels)
+        labels['result'] = outcome
+        metrics.increment('reader_operations_total', labels=labels)
+        self.session.update(result)
+        self.start()
+
+    @Slot()
+    def stop(self):
+        """! @brief Slot used to stop waiting for cards and to terminate the watcher thread.
+        @param self the CardReader instance
+        """
+        self.timer.stop()
+        self.watcher.stop()
 
-            self.cardUid = self.getUID(cardService)
-            self.ATR = self.getATR(cardService)
+    @Slot(str, str, object)
+    def cardRead(self, cardUid, ATR, account):
+        """! @brief Slot called on the UI thread when the watcher has read a card. Check the account and update the UI.
+        @param self the CardReader instance
+        @param cardUid identifier of the card
+        @param ATR ATR of the card
+        @param account the account linked to the card, None if there is no account
+        """
+        self.timer.stop()
 
-            account = self.action.getAccount(self.cardUid)
-            
-            if account is None:
-                self.warning.emit(WARN_NO_ACCOUNT)
+        self.cardUid = cardUid
+        self.ATR = ATR
+        self.cardTime = time()
+        
+        if account is None:
+            self.warning.emit(WARN_NO_ACCOUNT)
+        else:
+            if account['statement'] == STA_USER_ACTIVE:
+                for device in account['devices']:
+                    if device['uid'] == self.cardUid:
+                        if device['status'] == STA_DEVICE_ACTIVE:
+                            # all is ok
+                            self.cardDetected.emit(account)
+                        elif device['status'] == STA_DEVICE_LOST:
+                            self.warning.emit(WARN_DEVICE_LOST)
+                        elif device['status'] == STA_DEVICE_STOLEN:
+                            self.warning.emit(WARN_DEVICE_STOLEN)
+                        elif device['status'] == STA_DEVICE_DELETED:
+                            self.warning.emit(WARN_DEVICE_DELETED)
+                        else:
+                            self.warning.emit(WARN_DEVICE_DELETED)
+                        break
+            elif account['statement'] == STA_USER_INACTIVE:
+                self.warning.emit(WARN_ACCOUNT_INACTIVE)
+            elif account['statement'] == STA_USER_DELETED:
+                self.warning.emit(WARN_ACCOUNT_DELETED)
             else:
-                if account['statement'] == STA_USER_ACTIVE:
-                    for device in account['devices']:
-                        if device['uid'] == self.cardUid:
-                            if device['status'] == STA_DEVICE_ACTIVE:
-                                # all is ok
-                                self.cardDetected.emit(account['balance'])
-                            elif device['status'] == STA_DEVICE_LOST:
-                                self.warning.emit(WARN_DEVICE_LOST)
-                            elif device['status'] == STA_DEVICE_STOLEN:
-                                self.warning.emit(WARN_DEVICE_STOLEN)
-                            elif device['status'] == STA_DEVICE_DELETED:
-                                self.warning.emit(WARN_DEVICE_DELETED)
-                            else:
-                                self.warning.emit(WARN_DEVICE_DELETED)
-                            break
-                elif account['statement'] == STA_USER_INACTIVE:
-                    self.warning.emit(WARN_ACCOUNT_INACTIVE)
-                elif account['statement'] == STA_USER_DELETED:
-                    self.warning.emit(WARN_ACCOUNT_DELETED)
-                else:
-                    self.warning.emit(WARN_ACCOUNT_DELETED)
-
-        except CardRequestTimeoutException:
-            self.updateWaiting.emit()
-            # init variables
-            self.cardUid = None
-            self.ATR = None
+                self.warning.emit(WARN_ACCOUNT_DELETED)
 
     @Slot()
     def someBalls(self):
-        """! @brief Slot called when we click on the button to get some balls. Make a transaction.
+        """! @brief Slot called when we click on the button to get some balls. Make a transaction, unless it is a duplicate.
         @param self the CardReader instance
         """
-        self.action.transaction(self.cardUid, 2)
-        self.start()
+        if self.cardUid is not None:
+            self.session.requestPurchase(self.cardUid, 2, self.asyncAction.transaction)
 
     @Slot()
     def manyBalls(self):
-        """! @brief Slot called when we click on the button go get many balls. Make a transaction.
+        """! @brief Slot called when we click on the button go get many balls. Make a transaction, unless it is a duplicate.
         @param self the CardReader instance
         """
-        self.action.transaction(self.cardUid, 5)
-        self.start()
+        if self.cardUid is not None:
+            self.session.requestPurchase(self.cardUid, 5, self.asyncAction.transaction)
 
     @Slot(int)
     def recharge(self, amount):
@@ -156,46 +322,34 @@ class CardReader(QObject):
         @param self the CardReader instance
         @param amount the amount paid to the account
         """
-        self.action.recharge(self.cardUid, amount)
-        self.start()
+        self.asyncAction.recharge(self.cardUid, amount)
 
     def myTransmit(self, connection, apdu):
-        """! @brief Method that overrides the standard transmit method. It let us trace the command and response.
+        """! @brief Method that overrides the standard transmit method. It measures the duration of the exchange and counts the errors.
         @param self the CardReader instance
         @param connection the current connection with the card
         @param apdu the APDU we want to transmit
         """
-        # trace request :
-        #print 'sending : \t', toHexString(apdu)
-        response, sw1, sw2 = connection.transmit( apdu )
-        # trace response :
-        #if None == response: response=[]
-        #print 'response : \t', toHexString(response), '\nstatus words : \t', "%x %x" % (sw1, sw2)
+        metrics = Metrics()
+        labels = {'ins': '%02X' % apdu[1], 'reader': self.name}
+        start = time()
+        try:
+            response, sw1, sw2 = connection.transmit( apdu )
+        finally:
+            metrics.observe('apdu_seconds', time() - start, labels)
         if sw1 in range(0x61, 0x6f):
             print "Error: sw1: %x sw2: %x" % (sw1, sw2)
+            metrics.increment('apdu_errors_total', labels=labels)
         return response, sw1, sw2
 
     def getUID(self, cardService):
         """! @brief Method to get the UID of the smartcard or smartphone.
+        The APDU sent first depends on the strategy learned for the ATR of the card :
+        the SELECT of the Android AID for a smartphone, GET_UID for a smartcard.
         @param self the CardReader instance
         @param cardService the current connection with the smartcard
         """
-        try:
-            # try to get ID from smartphone
-            aidSize = [0x07]
-            ending = [0x00]
-            apdu = CLA_INS_P1_P2 + aidSize + AID_ANDROID + ending
-            response, sw1, sw2 = self.myTransmit(cardService.connection, apdu)
-            UID = toHexString(response)
-            #apdu = [0x00]
-            #response, sw1, sw2 = self.myTransmit(cardService.connection, apdu)
-            #print 'esasdf : ', toHexString(response)
-        except IndexError:
-            # otherwise get ID from smartcard
-            apdu = GET_UID
-            response, sw1, sw2 = self.myTransmit(cardService.connection, apdu)
-            UID = toHexString(response)
-        return UID
+        return self.strategies.identify(self.myTransmit, cardService.connection)
 
     def getATR(self, cardService):
         """! @brief Method to get the ATR of the smartcard or smartphone.
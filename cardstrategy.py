@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file cardstrategy.py
+#  Contains the class CardStrategies.
+
+## @package cardstrategy
+#  Identification strategies of the cards, learned for each ATR.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import os
+import json
+import threading
+from time import time
+
+from constants import *
+from metrics import Metrics
+
+## the UID is the answer to the SELECT of the Android AID (smartphone with host card emulation)
+STRATEGY_ANDROID = 'android'
+## the UID is read with the GET_UID command of the reader (Mifare smartcard)
+STRATEGY_GET_UID = 'getuid'
+## order of the strategies when nothing is known about the card
+DEFAULT_ORDER = [STRATEGY_ANDROID, STRATEGY_GET_UID]
+## result of a strategy when the card does not understand the APDU at all
+NO_ANSWER = object()
+
+def toHexString(data):
+    """! @brief Function converting a list of bytes to a hexadecimal string, as smartcard.util.toHexString.
+    @param data the list of bytes
+    """
+    return ' '.join('%02X' % byte for byte in data)
+
+def toBytes(text):
+    """! @brief Function converting a hexadecimal string to a list of bytes, as smartcard.util.toBytes.
+    @param text the hexadecimal string, e.g. `3B 8F 80 01`
+    """
+    text = ''.join(text.split())
+    return [int(text[i:i + 2], 16) for i in range(0, len(text), 2)]
+
+def selectAndroid(transmit, connection):
+    """! @brief Strategy sending the SELECT of the Android AID.
+    @param transmit function sending an APDU, `transmit(connection, apdu)`
+    @param connection the connection with the card
+    @return the UID, None if the card is not an Android smartphone running the application,
+    NO_ANSWER if the card does not understand the APDU at all
+    """
+    try:
+        response, sw1, sw2 = transmit(connection, CLA_INS_P1_P2 + [len(AID_ANDROID)] + AID_ANDROID + [0x00])
+    except IndexError:
+        # the ACR122U gives an empty response to a Mifare smartcard
+        return NO_ANSWER
+    if (sw1, sw2) != (0x90, 0x00) or not response:
+        return None
+    return toHexString(response)
+
+def getUid(transmit, connection):
+    """! @brief Strategy sending the GET_UID command of the reader.
+    @param transmit function sending an APDU, `transmit(connection, apdu)`
+    @param connection the connection with the card
+    @return the UID, None if the command failed
+    """
+    response, sw1, sw2 = transmit(connection, GET_UID)
+    if (sw1, sw2) != (0x90, 0x00) or not response:
+        return None
+    return toHexString(response)
+
+## functions of the strategies, by name
+STRATEGIES = {STRATEGY_ANDROID: selectAndroid, STRATEGY_GET_UID: getUid}
+
+def historicalBytes(atr):
+    """! @brief Function extracting the historical bytes of an ATR (ISO 7816-3).
+    The historical bytes describe the card (e.g. Mifare 1K), the other bytes describe the protocols.
+    @param atr the ATR, list of bytes
+    @return the historical bytes, list of bytes
+    """
+    if len(atr) < 2:
+        return []
+    count = atr[1] & 0x0F
+    indicator = atr[1]
+    i = 2
+    while True:
+        # TA, TB and TC are present according to the bits 5 to 7 of the indicator, TD according to the bit 8
+        i += bin(indicator & 0x70).count('1')
+        if not indicator & 0x80 or i >= len(atr):
+            break
+        indicator = atr[i]
+        i += 1
+    return atr[i:i + count]
+
+class CardStrategies(object):
+    """! @brief
+    Registry of the identification strategies which worked for each card family.
+    A family is identified by the ATR and, for the ATR never seen, by its historical bytes.
+    The known families go straight to the right APDU, the others try the strategies in the default order.
+    The registry is saved in a JSON file when a family is learned.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, path=CARD_STRATEGY_PATH):
+        """! @brief Load the registry.
+        @param self the CardStrategies instance
+        @param path path of the JSON file, None to keep the registry in memory only
+        """
+        ## path of the JSON file
+        self.path = path
+        ## lock protecting the registry, used by the card watcher threads
+        self.lock = threading.Lock()
+        ## strategy by ATR
+        self.atrs = {}
+        ## strategy by historical bytes
+        self.families = {}
+        ## number of cards identified by the first strategy tried
+        self.hits = 0
+        ## number of cards identified after a failed strategy
+        self.misses = 0
+        ## number of cards not identified by any strategy
+        self.failures = 0
+        self.load()
+        Metrics().register('cardStrategies', self.counters)
+
+    def load(self):
+        """! @brief Method to load the registry from the JSON file, if it exists.
+        @param self the CardStrategies instance
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as registry:
+                content = json.load(registry)
+            self.atrs = dict((atr, name) for atr, name in content.get('atr', {}).iteritems() if name in STRATEGIES)
+            self.families = dict((family, name) for family, name in content.get('historical', {}).iteritems() if name in STRATEGIES)
+        except (IOError, ValueError), e:
+            print "Could not load the card strategies: %s" % e
+
+    def save(self):
+        """! @brief Method to write the registry in the JSON file. The file is replaced atomically.
+        @param self the CardStrategies instance
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            content = {'atr': dict(self.atrs), 'historical': dict(self.families)}
+        try:
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w') as registry:
+                json.dump(content, registry, indent=2, sort_keys=True)
+            os.rename(temporary, self.path)
+        except (IOError, OSError), e:
+            print "Could not save the card strategies: %s" % e
+
+    def order(self, atr):
+        """! @brief Method to get the order in which the strategies are tried for a card.
+        @param self the CardStrategies instance
+        @param atr the ATR of the card, as an hexadecimal string
+        """
+        family = toHexString(historicalBytes(toBytes(atr)))
+        with self.lock:
+            known = self.atrs.get(atr) or (self.families.get(family) if family else None)
+        if known is None:
+            return DEFAULT_ORDER
+        return [known] + [name for name in DEFAULT_ORDER if name != known]
+
+    def learn(self, atr, name):
+        """! @brief Method to remember the strategy which identified a card. The registry is saved if it has changed.
+        @param self the CardStrategies instance
+        @param atr the ATR of the card, as an hexadecimal string
+        @param name name of the strategy
+        """
+        family = toHexString(historicalBytes(toBytes(atr)))
+        with self.lock:
+            if self.atrs.get(atr) == name and (not family or self.families.get(family) == name):
+                return
+            self.atrs[atr] = name
+            if family:
+                # the ATR without historical bytes don't tell anything about the card
+                self.families[family] = name
+        self.save()
+
+    def identify(self, transmit, connection):
+        """! @brief Method to get the UID of a card, with the strategies in the order learned for its ATR.
+        @param self the CardStrategies instance
+        @param transmit function sending an APDU, `transmit(connection, apdu)`
+        @param connection the connection with the card
+        @return the UID, an empty string if no strategy identified the card
+        """
+        atr = toHexString(connection.getATR())
+        metrics = Metrics()
+        # a card is only known when the strategies tried before did not get any answer, e.g. an
+        # Android smartphone without the application answers the SELECT and must not be learned as a smartcard
+        conclusive = True
+        for i, name in enumerate(self.order(atr)):
+            start = time()
+            uid = STRATEGIES[name](transmit, connection)
+            identified = uid is not None and uid is not NO_ANSWER
+            metrics.observe('card_strategy_seconds', time() - start, {'strategy': name, 'result': 'ok' if identified else 'failed'})
+            if identified:
+                with self.lock:
+                    if i == 0:
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                if conclusive:
+                    self.learn(atr, name)
+                return uid
+            conclusive = conclusive and uid is NO_ANSWER
+        with self.lock:
+            self.failures += 1
+        return ''
+
+    def counters(self):
+        """! @brief Method to get the counters of the registry.
+        @param self the CardStrategies instance
+        """
+        with self.lock:
+            return {'atrs': len(self.atrs), 'families': len(self.families), 'hits': self.hits,
+                'misses': self.misses, 'failures': self.failures}
@@ -55,6 +55,124 @@ WARN_DEVICE_STOLEN = 4
 ## warning device deleted
 WARN_DEVICE_DELETED = 5
 
+## timeout of a card request on the watcher thread, in seconds. A card is detected as soon as it is inserted,
+#  this timeout only bounds the time needed to stop the thread.
+CARD_REQUEST_TIMEOUT = 1
+## name of the reader when a single reader is used, label of its metrics
+DEFAULT_READER = 'default'
+## serve a bay with each PC/SC reader plugged, readers plugged or unplugged while running included.
+#  False serves the first reader found only.
+MULTI_READER = True
+
+## URI of the MongoDB server, e.g. 'mongodb://localhost:28082/' through the SSH tunnel of a remote database
+MONGO_URI = 'mongodb://localhost:27017/'
+## name of the database
+MONGO_DATABASE = 'golfBallDispenserDatas'
+## maximum number of connections to the server kept by the driver
+MONGO_MAX_POOL_SIZE = 10
+## timeout to open a connection to the server, in seconds
+MONGO_CONNECT_TIMEOUT = 2
+## timeout of a request on an open connection, in seconds. It bounds a tap when the server stops answering.
+MONGO_SOCKET_TIMEOUT = 3
+## time to wait for a free connection when all the connections of the pool are used, in seconds
+MONGO_WAIT_QUEUE_TIMEOUT = 1
+## time to find a server able to serve a request, in seconds. Used from pymongo 3, bounded by the connect timeout before.
+MONGO_SERVER_SELECTION_TIMEOUT = 3
+## read preference and write concern of each profile
+MONGO_PROFILES = {
+    # acknowledged by the primary, the default of the driver
+    'primary': {'readPreference': 'primary', 'w': 1},
+    # written in the journal of a majority of the replica set, the balances survive a failover
+    'durable': {'readPreference': 'primary', 'w': 'majority', 'j': True, 'wtimeout': 5000},
+    # the reads go to a secondary when the primary can't be reached
+    'available': {'readPreference': 'primaryPreferred', 'w': 1},
+}
+## profile of the connection, a key of MONGO_PROFILES
+MONGO_PROFILE = 'primary'
+## interval between two health probes of the database, in seconds
+MONGO_PROBE_INTERVAL = 10
+## delay before the first reconnection, doubled after each failure, in seconds
+MONGO_RETRY_INTERVAL = 1
+## maximum delay between two reconnections, in seconds
+MONGO_MAX_BACKOFF = 60
+
+## path of the local journal of the transactions (SQLite)
+JOURNAL_PATH = 'journal.sqlite'
+## maximum number of journal entries written in the database at once
+JOURNAL_BATCH_SIZE = 100
+## interval between two synchronisations of the journal, in seconds
+JOURNAL_SYNC_INTERVAL = 2
+
+## number of keys of the transactions applied kept in the account, a retried entry is recognised by its key
+APPLIED_KEYS = 100
+## age of a transaction whose balance update is not settled after which the syncer settles it, in seconds.
+## Longer than any balance update.
+JOURNAL_SETTLE_DELAY = 60
+
+## maximum amount of a single withdrawal when the database is unreachable
+OFFLINE_MAX_AMOUNT = 5
+## maximum amount withdrawn offline with a device until the journal is synchronised
+OFFLINE_MAX_PENDING = 10
+
+## maximum number of accounts kept in memory
+ACCOUNT_CACHE_SIZE = 512
+## time during which an account in memory is used without reading the database, in seconds
+ACCOUNT_CACHE_TTL = 30
+
+## number of transactions kept in the account document
+RECENT_TRANSACTIONS = 10
+## number of transactions in a page of the history
+HISTORY_PAGE_SIZE = 20
+
+## settle window of the reconciliation, in seconds. The transactions are added to the ledger once they are older,
+#  the accounts used within it may have transactions still waiting in the journal of a dispenser and are never fixed.
+RECONCILE_SETTLE_WINDOW = 24 * 3600
+
+## age of the transactions moved to the monthly archives, in days. Longer than the settle window of the reconciliation.
+ARCHIVE_HORIZON = 365
+## number of transactions moved to an archive at once
+ARCHIVE_BATCH_SIZE = 1000
+
+## number of rows of the bulk import checked and written at once
+BULK_IMPORT_CHUNK = 500
+
+## CONFIGURATION of the dispenser, to check on each machine : number of balls dispensed for the amount of a withdrawal,
+## in CHF. The labels of the buttons and the balls counted in the usage are derived from it, a withdrawal of an amount
+## missing here is counted without balls. The default is the doses displayed on the buttons since the first version.
+BALLS_BY_AMOUNT = {2: 30, 5: 80}
+
+## number of worker threads executing the actions
+ACTION_WORKERS = 2
+## maximum number of actions waiting or running in the worker threads
+ACTION_MAX_PENDING = 8
+## default timeout of an action, in seconds
+ACTION_TIMEOUT = 10
+## timeout of each action, in seconds
+ACTION_TIMEOUTS = {'getAccount': 5, 'transaction': 10, 'recharge': 10, 'getLastTransactions': 5, 'getMoreTransactions': 5}
+## actions moving money : once started, they are never timed out and their session is kept until they are over
+ACTION_UNINTERRUPTIBLE = ('transaction', 'recharge')
+
+## path of the file where the identification strategy of each card family is kept
+CARD_STRATEGY_PATH = 'cardstrategies.json'
+
+## time during which a card read again is served from memory, in seconds
+SESSION_WINDOW = 20
+## time after a purchase during which the same purchase is a duplicate, in seconds
+PURCHASE_DEBOUNCE = 1
+
+## collect the metrics of the stages of a session, the instrumentation costs almost nothing when disabled
+METRICS_ENABLED = True
+## port of the local endpoint serving the metrics in the Prometheus text format, None to disable it
+METRICS_HTTP_PORT = None
+## file where the metrics are written periodically in the Prometheus text format, None to disable it
+METRICS_FILE = None
+## interval between two writings of the metrics file, in seconds
+METRICS_FILE_INTERVAL = 15
+## upper bounds of the buckets of the latency histograms, in seconds
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+## count the repaints and the relayouts of the window, an event filter then sees every event of its widgets
+METRICS_UI_EVENTS = True
+
 ## APDU to read reader firmware version
 READER_FIRMWARE_VERSION = [0xFF, 0x00, 0x48, 0x00, 0x00] 
 ## APDU to get device UID
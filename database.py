@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 ## @file database.py
-#  Contains the classes SingletonType and DataBase.
+#  Contains the classes DataBase and HealthProbe.
  
 ## @package database
 #  Communication with databases.
@@ -10,49 +10,243 @@
 #  @date 22.06.2014
 #  @version 1.0
 
+import random
+import threading
+from time import time
 import pymongo
 
-class SingletonType(type):
-    """! @brief
-    Singleton type. 
-    @author CASAS Jacky
-    @date 22.06.14
-    @version 1.0
+from constants import *
+from metrics import Metrics
+from singleton import SingletonType
+
+## indexes used by the queries of the dispenser : (collection, keys, options)
+INDEXES = [
+    ('user', [('uid', pymongo.ASCENDING)], {'unique': True}),
+    ('user', [('username', pymongo.ASCENDING)], {'unique': True}),
+    # sparse, the accounts without device must not collide
+    ('user', [('devices.uid', pymongo.ASCENDING)], {'unique': True, 'sparse': True}),
+    # pages of the history, sorted by date and identifier
+    ('transaction', [('userId', pymongo.ASCENDING), ('transactionDate', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)], {}),
+    # the reconciliation aggregates the transactions written since its checkpoint, and those written before syncedAt existed
+    ('transaction', [('syncedAt', pymongo.ASCENDING)], {}),
+    ('transaction', [('transactionDate', pymongo.ASCENDING)], {}),
+    # months of the archive where an account has transactions
+    ('transactionMonthly', [('userId', pymongo.ASCENDING), ('month', pymongo.DESCENDING)], {}),
+    # usage of every dispenser on a day, the usage of one dispenser is read by identifier
+    ('dispenserUsage', [('day', pymongo.ASCENDING)], {}),
+]
+
+def clientOptions(profile):
+    """! @brief Function building the options of the MongoDB client. The names of the options depend on the version of pymongo.
+    @param profile name of the read preference and write concern profile, a key of MONGO_PROFILES
     """
-    def __call__(cls, *args, **kwargs):
-        """! @brief Override of the `__call__` method."""
-        try:
-            return cls.__instance
-        except AttributeError:
-            cls.__instance = super(SingletonType, cls).__call__(*args, **kwargs)
-            return cls.__instance
+    options = {
+        'connectTimeoutMS': int(MONGO_CONNECT_TIMEOUT * 1000),
+        'socketTimeoutMS': int(MONGO_SOCKET_TIMEOUT * 1000),
+        'waitQueueTimeoutMS': int(MONGO_WAIT_QUEUE_TIMEOUT * 1000),
+    }
+    if pymongo.version_tuple[0] >= 3:
+        options['maxPoolSize'] = MONGO_MAX_POOL_SIZE
+        options['serverSelectionTimeoutMS'] = int(MONGO_SERVER_SELECTION_TIMEOUT * 1000)
+    else:
+        options['max_pool_size'] = MONGO_MAX_POOL_SIZE
+    options.update(MONGO_PROFILES[profile])
+    return options
+
+def aggregateRows(collection, pipeline):
+    """! @brief Function running an aggregation. pymongo 2.x returns the rows in a document, pymongo 3 a cursor.
+    @param collection the collection
+    @param pipeline the stages of the aggregation
+    @return the list of the rows
+    """
+    result = collection.aggregate(pipeline)
+    if isinstance(result, dict):
+        return result['result']
+    return list(result)
 
 class DataBase(object):
     """! @brief
     Modelisation of the database. This class is a singleton.
+    The URI, the pool, the timeouts and the read preference and write concern profile are defined in constants.py.
+    When the database can't be reached, the reconnections are spaced by a jittered exponential backoff :
+    until the next attempt, ping answers at once that the database is offline.
     @author CASAS Jacky
     @date 22.06.14
     @version 1.0
     """
     __metaclass__ = SingletonType
 
-    def __init__(self):
+    def __init__(self, uri=MONGO_URI, profile=MONGO_PROFILE):
         """! @brief
-        The connection to the MongoDB database is made here. 
+        The connection to the MongoDB database is made here.
+        @param self the DataBase instance
+        @param uri URI of the MongoDB server
+        @param profile name of the read preference and write concern profile, a key of MONGO_PROFILES
         """
-        try:
-            # local database
-            client = pymongo.MongoClient('mongodb://localhost:27017/')
-            
-            # remote database (through SSH tunnel)
-            #client = pymongo.MongoClient('mongodb://localhost:28082/') 
+        ## URI of the MongoDB server
+        self.uri = uri
+        ## name of the read preference and write concern profile
+        self.profile = profile
+        ## lock serialising the connections, made by the probe, the journal and the actions
+        self.lock = threading.Lock()
+        ## MongoDB client, None until connected
+        self.client = None
+        ## variable containing the collection *user*, None until connected
+        self.user = None
+        ## variable containing the collection *transaction*, None until connected
+        self.transaction = None
+        ## tell if the database can be reached
+        self.online = False
+        ## number of consecutive failures, used for the backoff
+        self.failures = 0
+        ## time before which no reconnection is attempted
+        self.retryAt = 0
+        ## number of connections made
+        self.connects = 0
+        ## number of connections which have failed
+        self.connectFailures = 0
+        ## number of times the database has been reached again after being offline
+        self.reconnects = 0
+        ## number of pings made
+        self.pings = 0
+        ## number of pings which have failed
+        self.pingFailures = 0
+        ## duration of the last ping, in seconds
+        self.pingSeconds = 0
+        Metrics().register('database', self.counters)
+        self.connect()
+
+    def connect(self):
+        """! @brief Method to (re)connect to the MongoDB database.
+        @param self the DataBase instance
+        @return True if the database is connected
+        """
+        with self.lock:
+            self.connects += 1
+            if self.client is not None:
+                self.client.close()
+            try:
+                client = pymongo.MongoClient(self.uri, **clientOptions(self.profile))
+                db = client[MONGO_DATABASE]
 
-            db = client['golfBallDispenserDatas']
+                self.client = client
+                self.user = db['user']
+                self.transaction = db['transaction']
+                self.ensureIndexes()
+                self.reachable()
 
-            ## variable containing the collection *user*
-            self.user = db['user']
-            ## variable containing the collection *transaction*
-            self.transaction = db['transaction']
+            except pymongo.errors.ConnectionFailure, e:
+                print "Could not connect to MongoDB: %s" % e
+                self.connectFailures += 1
+                self.unreachable()
+        return self.online
 
+    def ping(self):
+        """! @brief Method to check if the database can be reached. Connect if needed.
+        While offline, the database is checked again only when the backoff has expired.
+        @param self the DataBase instance
+        @return True if the database is online
+        """
+        if not self.online and time() < self.retryAt:
+            return False
+        if self.user is None:
+            return self.connect()
+        start = time()
+        self.pings += 1
+        try:
+            self.user.database.command('ping')
+            self.pingSeconds = time() - start
+            Metrics().observe('database_ping_seconds', self.pingSeconds)
+            self.reachable()
         except pymongo.errors.ConnectionFailure, e:
-           print "Could not connect to MongoDB: %s" % e 
+            print "MongoDB unreachable: %s" % e
+            self.pingFailures += 1
+            self.unreachable()
+        return self.online
+
+    def reachable(self):
+        """! @brief Method called when the database has answered.
+        @param self the DataBase instance
+        """
+        if not self.online and self.failures > 0:
+            self.reconnects += 1
+        self.online = True
+        self.failures = 0
+        self.retryAt = 0
+
+    def unreachable(self):
+        """! @brief Method called when the database can't be reached. The next attempt is delayed by the backoff,
+        jittered so that the dispensers don't reconnect all at once.
+        A failure reported while the backoff is running belongs to the same outage, it doesn't extend the backoff.
+        @param self the DataBase instance
+        """
+        if not self.online and time() < self.retryAt:
+            return
+        self.online = False
+        self.failures += 1
+        delay = min(MONGO_MAX_BACKOFF, MONGO_RETRY_INTERVAL * 2 ** (self.failures - 1)) * random.uniform(0.5, 1)
+        self.retryAt = time() + delay
+
+    def counters(self):
+        """! @brief Method to get the counters of the connection.
+        @param self the DataBase instance
+        """
+        return {'online': int(self.online), 'connects': self.connects, 'connectFailures': self.connectFailures,
+            'reconnects': self.reconnects, 'failures': self.failures, 'pings': self.pings, 'pingFailures': self.pingFailures,
+            'pingSeconds': self.pingSeconds, 'poolSize': MONGO_MAX_POOL_SIZE}
+
+    def ensureIndexes(self):
+        """! @brief Method to create the indexes used by the queries of the dispenser, if they don't exist.
+        @param self the DataBase instance
+        """
+        db = self.user.database
+        for name, keys, options in INDEXES:
+            collection = db[name]
+            try:
+                collection.ensure_index(keys, **options)
+            except pymongo.errors.OperationFailure, e:
+                # e.g. duplicated values prevent the creation of a unique index
+                print "Could not create the index %s on %s: %s" % (keys, collection.name, e)
+
+class HealthProbe(threading.Thread):
+    """! @brief
+    Thread pinging the database periodically. An unreachable database is reconnected as soon as its backoff has expired,
+    so the taps don't have to wait for the server to find out that it is back.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database=None, interval=MONGO_PROBE_INTERVAL):
+        """! @brief Link the database.
+        @param self the HealthProbe instance
+        @param database the database to probe, DataBase() by default
+        @param interval interval between two probes while the database is online, in seconds
+        """
+        threading.Thread.__init__(self, name='HealthProbe')
+        self.daemon = True
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+        ## interval between two probes while the database is online, in seconds
+        self.interval = interval
+        ## event set to stop the thread
+        self.stopped = threading.Event()
+
+    def stop(self):
+        """! @brief Method to stop the thread and wait until it is finished.
+        @param self the HealthProbe instance
+        """
+        self.stopped.set()
+        self.join()
+
+    def run(self):
+        """! @brief Loop of the thread.
+        @param self the HealthProbe instance
+        """
+        while not self.stopped.is_set():
+            database = self.database
+            database.ping()
+            delay = self.interval
+            if not database.online:
+                delay = min(delay, max(0.1, database.retryAt - time()))
+            self.stopped.wait(delay)
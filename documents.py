@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file documents.py
+#  Functions building the documents and updates of the database.
+
+## @package documents
+#  Documents of the database.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+from uuid import uuid4
+from datetime import datetime
+from bson.objectid import ObjectId
+
+from constants import *
+
+## sort of the pages of the history, newest first. The identifier orders the transactions of the same date.
+HISTORY_SORT = [("transactionDate", -1), ("_id", -1)]
+
+def userDocument(username, name=None, surname=None, devices=None):
+    """! @brief Function building a new account, active and without any money.
+    @param username unique username
+    @param name name of the user, optional
+    @param surname surname of the user, optional
+    @param devices the devices of the account, built with deviceDocument, optional
+    """
+    user = {"uid":str(uuid4()), "username":username, "balance":0, "registrationDate":datetime.now(), "statement":STA_USER_ACTIVE,
+        "devices":devices or []}
+    if name is not None:
+        user["name"] = name
+    if surname is not None:
+        user["surname"] = surname
+    return user
+
+def deviceDocument(deviceId, ATR=None, category='smartcard'):
+    """! @brief Function building a new device of an account, active.
+    @param deviceId identifier of the device (smartcard or smartphone)
+    @param ATR ATR of the card, optional
+    @param category 'smartcard' or 'smartphone'
+    """
+    return {"uid":deviceId, "status":STA_DEVICE_ACTIVE, "activationDate":datetime.now(), "ATR":ATR, "category":category}
+
+def recentTransactionUpdate(transactionType, deviceId, amount, transactionDate, transactionId=None):
+    """! @brief Function building the `$push` which keeps the last transactions in an account, oldest first.
+    The transactions are sorted by date : an offline transaction synchronised late takes its place among the newer ones.
+    @param transactionType RECHARGE or WITHDRAWAL
+    @param deviceId identifier of the device (smartcard or smartphone)
+    @param amount amount of the transaction
+    @param transactionDate date of the transaction
+    @param transactionId identifier of the transaction in the collection *transaction*, optional
+    """
+    transaction = {"deviceId":deviceId, "dispenserId":DISPENSER_ID, "transactionType":transactionType, "amount":amount, "transactionDate":transactionDate}
+    if transactionId is not None:
+        transaction["_id"] = transactionId
+    return {"recentTransactions": {"$each": [transaction], "$sort": {"transactionDate": 1}, "$slice": -RECENT_TRANSACTIONS}}
+
+def appliedKeyUpdate(key):
+    """! @brief Function building the `$push` which keeps the key of a transaction applied to the balance of an account.
+    A balance update guarded by `appliedKeys: {$ne: key}` is done once, even if it is retried.
+    @param key the key of the transaction in the journal
+    """
+    return {"appliedKeys": {"$each": [key], "$slice": -APPLIED_KEYS}}
+
+def historyQuery(userId, before=None):
+    """! @brief Function building the query of a page of the history of an account, sorted with HISTORY_SORT.
+    The pages are delimited by the date and the identifier of the last transaction of the previous page : the
+    transactions of the same date, e.g. offline transactions, are not skipped.
+    @param userId identifier of the account
+    @param before `(date, identifier)` of the last transaction of the previous page, None for the first page.
+    Without identifier (transaction kept in an account before they had one), the page begins before the date.
+    """
+    query = {"userId":userId}
+    if before is not None:
+        date, transactionId = before
+        if transactionId is None:
+            query["transactionDate"] = {"$lt": date}
+        else:
+            query["$or"] = [{"transactionDate": {"$lt": date}}, {"transactionDate": date, "_id": {"$lt": transactionId}}]
+            if isinstance(transactionId, ObjectId):
+                # MongoDB orders the ObjectId of the transactions written before they had a key above the keys (strings) :
+                # after an ObjectId, the keys of the same date are still to come
+                query["$or"].append({"transactionDate": date, "_id": {"$type": 2}})
+    return query
+
+def historyCursor(transaction):
+    """! @brief Function getting where the next page of the history begins, after a transaction.
+    @param transaction the last transaction of a page
+    @return `(date, identifier)`, the identifier is None if the transaction has none
+    """
+    return (transaction["transactionDate"], transaction.get("_id"))
+
+def historyKey(transaction):
+    """! @brief Function getting the key sorting transactions as HISTORY_SORT does in MongoDB.
+    The ObjectId of the transactions written before they had a key are greater than the keys, as in the BSON order.
+    @param transaction a transaction
+    """
+    transactionId = transaction.get("_id")
+    return (transaction["transactionDate"], isinstance(transactionId, ObjectId), transactionId)
+
+def usageIncrement(transactionType, amount, transactionDate):
+    """! @brief Function building the counters of a transaction in the usage of a dispenser, for the day and for its hour.
+    @param transactionType RECHARGE or WITHDRAWAL
+    @param amount amount of the transaction
+    @param transactionDate date of the transaction
+    @return dictionary `{field: increment}`, the fields of the hour are prefixed by `hours.HH.`
+    """
+    if transactionType == WITHDRAWAL:
+        counters = {"withdrawals":1, "withdrawn":amount, "balls":BALLS_BY_AMOUNT.get(amount, 0)}
+    else:
+        counters = {"recharges":1, "recharged":amount}
+    increment = dict(counters)
+    for name, value in counters.iteritems():
+        increment["hours.%02d.%s" % (transactionDate.hour, name)] = value
+    return increment
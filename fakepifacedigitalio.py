@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file fakepifacedigitalio.py
+#  Contains the classes Led, InputPin, InterruptEvent, PiFaceDigital and InputEventListener.
+
+## @package fakepifacedigitalio
+#  Simulator of the PiFace Digital module, with the part of the pifacedigitalio API used by PiFaceControl.
+#  The buttons are pressed by calling PiFaceDigital.press. As in pifacedigitalio, an InputEventListener
+#  runs a thread watching the interrupts of the chip and a thread calling the registered functions.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import Queue
+import threading
+from time import time
+
+## direction of an input when the button is pressed
+IODIR_ON = 0
+## direction of an input when the button is released
+IODIR_OFF = 1
+## falling edge of an input, the button is pressed
+IODIR_FALLING_EDGE = IODIR_ON
+## rising edge of an input, the button is released
+IODIR_RISING_EDGE = IODIR_OFF
+## both edges of an input
+IODIR_BOTH = None
+
+## default time during which the events of a pin are ignored after an event, in seconds
+DEFAULT_SETTLE_TIME = 0.020
+
+class Led(object):
+    """! @brief
+    Simulated LED.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self):
+        """! @brief Initialize the LED, turned off.
+        @param self the Led instance
+        """
+        ## 1 if the LED is on, 0 otherwise
+        self.value = 0
+
+    def turn_on(self):
+        """! @brief Method to turn on the LED.
+        @param self the Led instance
+        """
+        self.value = 1
+
+    def turn_off(self):
+        """! @brief Method to turn off the LED.
+        @param self the Led instance
+        """
+        self.value = 0
+
+    def toggle(self):
+        """! @brief Method to toggle the LED.
+        @param self the Led instance
+        """
+        self.value = 1 - self.value
+
+class InputPin(object):
+    """! @brief
+    Simulated input pin.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self):
+        """! @brief Initialize the pin, button released.
+        @param self the InputPin instance
+        """
+        ## 1 if the button is pressed, 0 otherwise
+        self.value = 0
+
+class InterruptEvent(object):
+    """! @brief
+    Event given to the functions registered in an InputEventListener.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, pin_num, direction, chip, timestamp):
+        """! @brief Describe the event.
+        @param self the InterruptEvent instance
+        @param pin_num number of the input pin
+        @param direction IODIR_ON when pressed, IODIR_OFF when released
+        @param chip the PiFaceDigital instance
+        @param timestamp time of the event
+        """
+        ## number of the input pin
+        self.pin_num = pin_num
+        ## IODIR_ON when pressed, IODIR_OFF when released
+        self.direction = direction
+        ## the PiFaceDigital instance
+        self.chip = chip
+        ## time of the event
+        self.timestamp = timestamp
+
+class PiFaceDigital(object):
+    """! @brief
+    Simulated PiFace Digital module, with 8 LEDs and 8 input pins.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, hardware_addr=0, bus=0, chip_select=0, init_board=True):
+        """! @brief Initialize the module.
+        @param self the PiFaceDigital instance
+        """
+        ## LEDs of the module
+        self.leds = [Led() for i in range(8)]
+        ## input pins of the module
+        self.input_pins = [InputPin() for i in range(8)]
+        ## lock protecting the listeners
+        self.lock = threading.Lock()
+        ## active listeners, receiving the interrupts
+        self.listeners = []
+
+    def interrupt(self, pin, direction):
+        """! @brief Method raising an interrupt, received by all the active listeners.
+        @param self the PiFaceDigital instance
+        @param pin number of the input pin
+        @param direction IODIR_ON or IODIR_OFF
+        """
+        event = InterruptEvent(pin, direction, self, time())
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener.interrupts.put(event)
+        return event
+
+    def press(self, pin):
+        """! @brief Method to press a button.
+        @param self the PiFaceDigital instance
+        @param pin number of the input pin
+        @return the event of the interrupt
+        """
+        self.input_pins[pin].value = 1
+        return self.interrupt(pin, IODIR_ON)
+
+    def release(self, pin):
+        """! @brief Method to release a button.
+        @param self the PiFaceDigital instance
+        @param pin number of the input pin
+        @return the event of the interrupt
+        """
+        self.input_pins[pin].value = 0
+        return self.interrupt(pin, IODIR_OFF)
+
+class InputEventListener(object):
+    """! @brief
+    Listener calling the registered functions when an input changes.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, chip=None):
+        """! @brief Initialize the listener, not active.
+        @param self the InputEventListener instance
+        @param chip the PiFaceDigital instance
+        """
+        ## the PiFaceDigital instance
+        self.chip = chip if chip is not None else PiFaceDigital()
+        ## registered functions : (pin, direction, callback, settle time)
+        self.registrations = []
+        ## interrupts received from the chip
+        self.interrupts = Queue.Queue()
+        ## events waiting to be dispatched
+        self.events = Queue.Queue()
+        ## thread watching the interrupts
+        self.watcher = None
+        ## thread calling the registered functions
+        self.dispatcher = None
+
+    def register(self, pin_num, direction, callback, settle_time=DEFAULT_SETTLE_TIME):
+        """! @brief Method to register a function called when an input changes.
+        @param self the InputEventListener instance
+        @param pin_num number of the input pin
+        @param direction IODIR_ON, IODIR_OFF or IODIR_BOTH
+        @param callback function called with the InterruptEvent
+        @param settle_time time during which the next events of the pin are ignored, in seconds
+        """
+        self.registrations.append((pin_num, direction, callback, settle_time))
+
+    def deregister(self, pin_num, direction):
+        """! @brief Method to remove the functions registered for an input.
+        @param self the InputEventListener instance
+        @param pin_num number of the input pin
+        @param direction IODIR_ON, IODIR_OFF or IODIR_BOTH
+        """
+        self.registrations = [r for r in self.registrations if (r[0], r[1]) != (pin_num, direction)]
+
+    def activate(self):
+        """! @brief Method to start the threads of the listener.
+        @param self the InputEventListener instance
+        """
+        self.watcher = threading.Thread(target=self.watch, name='InputEventWatcher')
+        self.dispatcher = threading.Thread(target=self.dispatch, name='InputEventDispatcher')
+        self.watcher.daemon = True
+        self.dispatcher.daemon = True
+        self.watcher.start()
+        self.dispatcher.start()
+        with self.chip.lock:
+            self.chip.listeners.append(self)
+
+    def deactivate(self):
+        """! @brief Method to stop the threads of the listener.
+        @param self the InputEventListener instance
+        """
+        with self.chip.lock:
+            if self in self.chip.listeners:
+                self.chip.listeners.remove(self)
+        self.interrupts.put(None)
+        self.watcher.join()
+        self.dispatcher.join()
+
+    def watch(self):
+        """! @brief Loop of the watcher thread.
+        @param self the InputEventListener instance
+        """
+        while True:
+            event = self.interrupts.get()
+            self.events.put(event)
+            if event is None:
+                return
+
+    def dispatch(self):
+        """! @brief Loop of the dispatcher thread. The events of a pin during its settle time are ignored.
+        @param self the InputEventListener instance
+        """
+        last = {}
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            for pin, direction, callback, settle in self.registrations:
+                if pin != event.pin_num or direction not in (IODIR_BOTH, event.direction):
+                    continue
+                if event.timestamp - last.get((pin, direction), -settle) < settle:
+                    continue
+                last[(pin, direction)] = event.timestamp
+                callback(event)
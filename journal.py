@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file journal.py
+#  Contains the classes Journal and JournalSyncer. Can be launched to inspect and drain the journal.
+
+## @package journal
+#  Local write-ahead journal of the transactions, synchronised with the MongoDB database.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import sqlite3
+import argparse
+import threading
+from time import time
+from uuid import uuid4
+from datetime import datetime, timedelta
+import pymongo
+
+from constants import *
+from database import DataBase
+from documents import recentTransactionUpdate, appliedKeyUpdate
+from usage import Usage
+
+## entry waiting to be written in the database
+JOURNAL_PENDING = 0
+## entry written in the database
+JOURNAL_SYNCED = 1
+## entry refused by the database (no account linked to the device)
+JOURNAL_REJECTED = 2
+## entry written before the balance update in the database, until its outcome is known
+JOURNAL_STARTED = 3
+## entry set aside after an error of the database other than a connection failure, until it is retried
+JOURNAL_FAILED = 4
+
+## format of the dates stored in the journal
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    transactionType INTEGER NOT NULL,
+    userId TEXT,
+    deviceId TEXT NOT NULL,
+    dispenserId TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    transactionDate TEXT NOT NULL,
+    applied INTEGER NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lastError TEXT
+)'''
+
+INDEX = 'CREATE INDEX IF NOT EXISTS journal_state ON journal (state, id)'
+
+class Journal(object):
+    """! @brief
+    Append-only journal of the transactions in a SQLite database (WAL mode).
+    A transaction is committed locally in a few microseconds, the JournalSyncer writes it later in MongoDB.
+    An entry is *applied* when the balance of the account has already been updated in MongoDB,
+    otherwise it has been made offline and the syncer has to update the balance too.
+    An online transaction is written *started* before its balance update, and settled with its outcome : an entry
+    still started after a crash or a lost answer is settled by the syncer, from the keys applied kept in the account.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        """! @brief Open the journal and create the table if needed.
+        @param self the Journal instance
+        @param path path of the SQLite file
+        """
+        ## path of the SQLite file
+        self.path = path
+        ## connections of each thread, a SQLite connection can't be shared between threads
+        self.local = threading.local()
+        ## event set each time an entry is appended, wakes up the syncer
+        self.appended = threading.Event()
+
+        connection = self.connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(SCHEMA)
+        connection.execute(INDEX)
+        connection.commit()
+
+    def connection(self):
+        """! @brief Method to get the connection of the current thread.
+        @param self the Journal instance
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.row_factory = sqlite3.Row
+            # with WAL, NORMAL is durable against application crashes and much faster than FULL
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def append(self, transactionType, userId, deviceId, amount, transactionDate, applied, key=None, state=JOURNAL_PENDING):
+        """! @brief Method to append a transaction to the journal.
+        @param self the Journal instance
+        @param transactionType RECHARGE or WITHDRAWAL
+        @param userId identifier of the account, None if unknown (offline)
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount of the transaction
+        @param transactionDate date of the transaction
+        @param applied True if the balance has already been updated in the database
+        @param key the key of the entry, a new one by default
+        @param state JOURNAL_PENDING, or JOURNAL_STARTED before the balance update
+        @return the key of the entry, used as identifier of the transaction in the database
+        """
+        key = key or str(uuid4())
+        connection = self.connection()
+        connection.execute('INSERT INTO journal (key, transactionType, userId, deviceId, dispenserId, amount, transactionDate, applied, state) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, transactionType, userId, deviceId, DISPENSER_ID, amount, transactionDate.strftime(DATE_FORMAT), int(applied), state))
+        connection.commit()
+        if state == JOURNAL_PENDING:
+            self.appended.set()
+        return key
+
+    def begin(self, transactionType, deviceId, amount, transactionDate):
+        """! @brief Method to append a transaction before its balance update, the syncer ignores it until it is settled.
+        @param self the Journal instance
+        @param transactionType RECHARGE or WITHDRAWAL
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount of the transaction
+        @param transactionDate date of the transaction
+        @return the key of the entry
+        """
+        return self.append(transactionType, None, deviceId, amount, transactionDate, False, state=JOURNAL_STARTED)
+
+    def settle(self, key, userId=None):
+        """! @brief Method to hand a started entry to the syncer.
+        @param self the Journal instance
+        @param key the key of the entry
+        @param userId identifier of the account whose balance has been updated, None if the syncer has to update it
+        """
+        connection = self.connection()
+        connection.execute('UPDATE journal SET state = ?, applied = ?, userId = ? WHERE key = ? AND state = ?',
+            (JOURNAL_PENDING, int(userId is not None), userId, key, JOURNAL_STARTED))
+        connection.commit()
+        self.appended.set()
+
+    def discard(self, key):
+        """! @brief Method to delete a started entry whose transaction has been refused.
+        @param self the Journal instance
+        @param key the key of the entry
+        """
+        connection = self.connection()
+        connection.execute('DELETE FROM journal WHERE key = ? AND state = ?', (key, JOURNAL_STARTED))
+        connection.commit()
+
+    def started(self, before, limit=JOURNAL_BATCH_SIZE):
+        """! @brief Method to get the oldest entries still started.
+        @param self the Journal instance
+        @param before only the entries of a transaction older than this date
+        @param limit maximum number of entries
+        """
+        return self.connection().execute('SELECT * FROM journal WHERE state = ? AND transactionDate < ? ORDER BY id LIMIT ?',
+            (JOURNAL_STARTED, before.strftime(DATE_FORMAT), limit)).fetchall()
+
+    def pending(self, limit=JOURNAL_BATCH_SIZE):
+        """! @brief Method to get the oldest entries waiting to be written in the database.
+        @param self the Journal instance
+        @param limit maximum number of entries
+        """
+        return self.connection().execute('SELECT * FROM journal WHERE state = ? ORDER BY id LIMIT ?', (JOURNAL_PENDING, limit)).fetchall()
+
+    def entries(self, state=None, limit=50):
+        """! @brief Method to get the last entries of the journal, newest first.
+        @param self the Journal instance
+        @param state only the entries in this state, all the entries if None
+        @param limit maximum number of entries
+        """
+        if state is None:
+            return self.connection().execute('SELECT * FROM journal ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return self.connection().execute('SELECT * FROM journal WHERE state = ? ORDER BY id DESC LIMIT ?', (state, limit)).fetchall()
+
+    def markApplied(self, entryId, userId):
+        """! @brief Method to record that the balance of an offline entry has been updated in the database.
+        @param self the Journal instance
+        @param entryId identifier of the entry
+        @param userId identifier of the account
+        """
+        connection = self.connection()
+        connection.execute('UPDATE journal SET applied = 1, userId = ? WHERE id = ?', (userId, entryId))
+        connection.commit()
+
+    def markState(self, entryIds, state, error=None):
+        """! @brief Method to change the state of entries.
+        @param self the Journal instance
+        @param entryIds identifiers of the entries
+        @param state JOURNAL_PENDING, JOURNAL_SYNCED, JOURNAL_REJECTED, JOURNAL_STARTED or JOURNAL_FAILED
+        @param error the error explaining the state, optional
+        """
+        connection = self.connection()
+        connection.executemany('UPDATE journal SET state = ?, attempts = attempts + 1, lastError = ? WHERE id = ?',
+            [(state, error, entryId) for entryId in entryIds])
+        connection.commit()
+
+    def offlineSpending(self, deviceId):
+        """! @brief Method to get the amount withdrawn offline with a device and not yet written in the database.
+        @param self the Journal instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        """
+        row = self.connection().execute('SELECT SUM(amount) FROM journal WHERE deviceId = ? AND transactionType = ? AND applied = 0 AND state = ?',
+            (deviceId, WITHDRAWAL, JOURNAL_PENDING)).fetchone()
+        return row[0] or 0
+
+    def canSpendOffline(self, deviceId, amount):
+        """! @brief Method to check the offline spending limits.
+        @param self the Journal instance
+        @param deviceId identifier of the device (smartcard or smartphone)
+        @param amount amount to withdraw
+        """
+        return amount <= OFFLINE_MAX_AMOUNT and self.offlineSpending(deviceId) + amount <= OFFLINE_MAX_PENDING
+
+    def counts(self):
+        """! @brief Method to count the entries of each state.
+        @param self the Journal instance
+        """
+        counts = {JOURNAL_PENDING: 0, JOURNAL_SYNCED: 0, JOURNAL_REJECTED: 0, JOURNAL_STARTED: 0, JOURNAL_FAILED: 0}
+        for state, count in self.connection().execute('SELECT state, COUNT(*) FROM journal GROUP BY state'):
+            counts[state] = count
+        return counts
+
+    def retry(self):
+        """! @brief Method to hand the entries set aside after an error back to the syncer.
+        @param self the Journal instance
+        @return the number of entries
+        """
+        connection = self.connection()
+        cursor = connection.execute('UPDATE journal SET state = ? WHERE state = ?', (JOURNAL_PENDING, JOURNAL_FAILED))
+        connection.commit()
+        self.appended.set()
+        return cursor.rowcount
+
+    def purge(self, days):
+        """! @brief Method to delete the synchronised entries older than a number of days.
+        @param self the Journal instance
+        @param days age of the entries to delete
+        @return the number of deleted entries
+        """
+        limit = (datetime.now() - timedelta(days=days)).strftime(DATE_FORMAT)
+        connection = self.connection()
+        cursor = connection.execute('DELETE FROM journal WHERE state = ? AND transactionDate < ?', (JOURNAL_SYNCED, limit))
+        connection.commit()
+        return cursor.rowcount
+
+class JournalSyncer(threading.Thread):
+    """! @brief
+    Thread writing the entries of the journal in the database, by batches.
+    When the database can't be reached, it retries when the backoff of the database has expired.
+    An entry refused with another error of the database is set aside, the others are written.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, journal, database=None):
+        """! @brief Link the journal and the database.
+        @param self the JournalSyncer instance
+        @param journal the Journal instance to synchronise
+        @param database the database where the entries are written, DataBase() by default
+        """
+        threading.Thread.__init__(self, name='JournalSyncer')
+        self.daemon = True
+        ## link to the Journal instance
+        self.journal = journal
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+        ## tell if the thread has to keep running
+        self.running = True
+        ## usage of the dispensers, incremented with the transactions written
+        self.usage = Usage(self.database)
+
+    def stop(self):
+        """! @brief Method to stop the thread after the current batch.
+        @param self the JournalSyncer instance
+        """
+        self.running = False
+        self.journal.appended.set()
+        self.join()
+
+    def run(self):
+        """! @brief Loop of the thread.
+        @param self the JournalSyncer instance
+        """
+        while self.running:
+            try:
+                count = self.syncBatch()
+                if count == JOURNAL_BATCH_SIZE:
+                    # there are probably other entries waiting
+                    continue
+                delay = JOURNAL_SYNC_INTERVAL
+            except pymongo.errors.ConnectionFailure, e:
+                # same backoff as the other users of the database
+                self.database.unreachable()
+                delay = max(self.database.retryAt - time(), JOURNAL_SYNC_INTERVAL)
+                print "Journal synchronisation failed (retry in %.1f s): %s" % (delay, e)
+            except pymongo.errors.PyMongoError, e:
+                # the database is reachable, the dispenser stays online
+                delay = JOURNAL_SYNC_INTERVAL
+                print "Journal synchronisation failed (retry in %.1f s): %s" % (delay, e)
+
+            self.journal.appended.wait(delay)
+            self.journal.appended.clear()
+
+    def syncBatch(self):
+        """! @brief Method to write a batch of entries in the database.
+        @param self the JournalSyncer instance
+        @return the number of entries of the batch
+        """
+        database = self.database
+        if not database.online and not database.ping():
+            raise pymongo.errors.ConnectionFailure('database unreachable')
+
+        # balance updates interrupted by a crash or whose answer was lost : the keys applied kept in the account tell
+        # if they were done, the balance is never updated by the syncer
+        for entry in self.journal.started(datetime.now() - timedelta(seconds=JOURNAL_SETTLE_DELAY)):
+            user = database.user.find_one({"devices.uid": entry['deviceId'], "appliedKeys": entry['key']}, {'uid': 1})
+            if user is None:
+                self.journal.markState([entry['id']], JOURNAL_REJECTED, 'balance not updated')
+            else:
+                self.journal.settle(entry['key'], user['uid'])
+
+        entries = self.journal.pending()
+        if not entries:
+            return 0
+
+        written = []
+        # date of the write, the reconciliation aggregates the transactions by write and not by tap
+        syncedAt = datetime.now()
+        for entry in entries:
+            userId = entry['userId']
+            if not entry['applied']:
+                # transaction made offline, the balance has to be updated once : the key of the entry is kept in the
+                # account with the same update, an attempt interrupted before markApplied doesn't update it again
+                amount = entry['amount'] if entry['transactionType'] == RECHARGE else -entry['amount']
+                push = recentTransactionUpdate(entry['transactionType'], entry['deviceId'], entry['amount'],
+                    datetime.strptime(entry['transactionDate'], DATE_FORMAT), entry['key'])
+                push.update(appliedKeyUpdate(entry['key']))
+                try:
+                    user = database.user.find_and_modify({"devices.uid": entry['deviceId'], "appliedKeys": {"$ne": entry['key']}},
+                        {"$inc": {"balance": amount}, "$push": push}, fields={'uid': 1}, new=True)
+                    if user is None:
+                        user = database.user.find_one({"devices.uid": entry['deviceId'], "appliedKeys": entry['key']}, {'uid': 1})
+                except pymongo.errors.OperationFailure, e:
+                    self.setAside(entry, e)
+                    continue
+                if user is None:
+                    self.journal.markState([entry['id']], JOURNAL_REJECTED, 'no account linked to the device')
+                    continue
+                userId = user['uid']
+                self.journal.markApplied(entry['id'], userId)
+
+            written.append((entry, {"_id":entry['key'], "userId":userId, "deviceId":entry['deviceId'], "dispenserId":entry['dispenserId'],
+                "transactionType":entry['transactionType'], "amount":entry['amount'],
+                "transactionDate":datetime.strptime(entry['transactionDate'], DATE_FORMAT), "syncedAt":syncedAt}))
+
+        if written:
+            try:
+                database.transaction.insert([document for entry, document in written], continue_on_error=True)
+            except pymongo.errors.DuplicateKeyError:
+                # already written by a previous attempt
+                pass
+            except pymongo.errors.OperationFailure:
+                # a document is refused, they are written one by one to set it aside
+                written = [(entry, document) for entry, document in written if self.attempt(entry, database.transaction.insert, document)]
+            # counted once, even if a previous attempt has counted some of them
+            try:
+                self.usage.record([document for entry, document in written])
+            except pymongo.errors.OperationFailure:
+                written = [(entry, document) for entry, document in written if self.attempt(entry, self.usage.record, [document])]
+            self.journal.markState([entry['id'] for entry, document in written], JOURNAL_SYNCED)
+
+        return len(entries)
+
+    def attempt(self, entry, function, *args):
+        """! @brief Method to write an entry alone, and to set it aside if the database refuses it.
+        @param self the JournalSyncer instance
+        @param entry the entry of the journal
+        @param function the write
+        @param args the arguments of the write
+        @return True if the entry has been written
+        """
+        try:
+            function(*args)
+        except pymongo.errors.DuplicateKeyError:
+            # already written by a previous attempt
+            pass
+        except pymongo.errors.OperationFailure, e:
+            self.setAside(entry, e)
+            return False
+        return True
+
+    def setAside(self, entry, error):
+        """! @brief Method to set aside an entry refused by the database, `journal.py retry` hands it back to the syncer.
+        @param self the JournalSyncer instance
+        @param entry the entry of the journal
+        @param error the error raised by the driver
+        """
+        print "Journal entry %d set aside: %s" % (entry['id'], error)
+        self.journal.markState([entry['id']], JOURNAL_FAILED, str(error))
+
+def main():
+    """! @brief Command line to inspect and drain the journal."""
+    parser = argparse.ArgumentParser(description='Inspect and drain the transaction journal of the dispenser.')
+    parser.add_argument('--path', default=JOURNAL_PATH, help='path of the journal')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('status', help='number of entries in each state')
+    listParser = subparsers.add_parser('list', help='last entries of the journal')
+    listParser.add_argument('--state', choices=['pending', 'synced', 'rejected', 'started', 'failed'], help='only the entries in this state')
+    listParser.add_argument('--limit', type=int, default=50, help='maximum number of entries')
+    subparsers.add_parser('drain', help='write all the pending entries in the database now')
+    subparsers.add_parser('retry', help='hand the entries set aside after an error back to the syncer')
+    purgeParser = subparsers.add_parser('purge', help='delete the synchronised entries')
+    purgeParser.add_argument('--days', type=int, default=30, help='age of the entries to delete')
+    args = parser.parse_args()
+
+    journal = Journal(args.path)
+    states = {'pending': JOURNAL_PENDING, 'synced': JOURNAL_SYNCED, 'rejected': JOURNAL_REJECTED, 'started': JOURNAL_STARTED,
+        'failed': JOURNAL_FAILED}
+
+    if args.command == 'status':
+        counts = journal.counts()
+        for name in ['pending', 'synced', 'rejected', 'started', 'failed']:
+            print '%-10s %d' % (name, counts[states[name]])
+    elif args.command == 'list':
+        names = dict((state, name) for name, state in states.items())
+        for entry in journal.entries(states.get(args.state), args.limit):
+            print '%6d  %s  %-8s  %-10s  %4d CHF  %-8s  %s  %s' % (entry['id'], entry['transactionDate'],
+                'recharge' if entry['transactionType'] == RECHARGE else 'withdraw', entry['deviceId'], entry['amount'],
+                names[entry['state']], 'applied' if entry['applied'] else 'offline', entry['lastError'] or '')
+    elif args.command == 'drain':
+        syncer = JournalSyncer(journal)
+        try:
+            while syncer.syncBatch() == JOURNAL_BATCH_SIZE:
+                pass
+        except pymongo.errors.PyMongoError, e:
+            print "Could not drain the journal: %s" % e
+        pending = journal.counts()[JOURNAL_PENDING]
+        print '%d entries still pending' % pending
+        sys.exit(1 if pending else 0)
+    elif args.command == 'retry':
+        print '%d entries handed back to the syncer' % journal.retry()
+    elif args.command == 'purge':
+        print '%d entries deleted' % journal.purge(args.days)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file ledanimator.py
+#  Contains the class LedAnimator.
+
+## @package ledanimator
+#  Non blocking animations of LEDs.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+from collections import deque
+from PySide.QtCore import *
+
+## the running sequence is stopped and the new one is played immediately
+INTERRUPT = 0
+## the new sequence is played when the running one is finished
+QUEUE = 1
+
+## maximum number of sequences waiting behind the running one
+MAX_PENDING = 4
+
+class LedAnimator(QObject):
+    """! @brief
+    Scheduler playing sequences of LED keyframes with a timer, without blocking the caller.
+    A sequence is a list of keyframes `(delay, on, off)` : after `delay` seconds,
+    the LEDs listed in `on` are turned on and the LEDs listed in `off` are turned off.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal used to bring the requests of any thread to the thread of the animator
+    requested = Signal(object, int)
+
+    def __init__(self, leds, ledRange, parent=None):
+        """! @brief Initialize the animator.
+        @param self the LedAnimator instance
+        @param leds the LEDs to animate, each one has the methods `turn_on` and `turn_off`
+        @param ledRange indexes of the LEDs used by the animations
+        @param parent the parent QObject, optional
+        """
+        QObject.__init__(self, parent)
+        ## LEDs to animate
+        self.leds = leds
+        ## indexes of the LEDs used by the animations
+        self.ledRange = ledRange
+        ## sequence currently played, None when idle
+        self.sequence = None
+        ## index of the next keyframe of the sequence
+        self.index = 0
+        ## sequences waiting behind the running one
+        self.pending = deque(maxlen=MAX_PENDING)
+        ## timer triggering the next keyframe
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.nextKeyframe)
+        self.requested.connect(self.enqueue)
+
+    def play(self, sequence, policy=INTERRUPT):
+        """! @brief Method to play a sequence. It returns immediately and can be called from any thread.
+        @param self the LedAnimator instance
+        @param sequence list of keyframes `(delay, on, off)`
+        @param policy INTERRUPT to cancel the running sequence, QUEUE to play after it
+        """
+        self.requested.emit(sequence, policy)
+
+    @Slot(object, int)
+    def enqueue(self, sequence, policy):
+        """! @brief Slot called in the thread of the animator to schedule a sequence.
+        @param self the LedAnimator instance
+        @param sequence list of keyframes `(delay, on, off)`
+        @param policy INTERRUPT to cancel the running sequence, QUEUE to play after it
+        """
+        if policy == INTERRUPT:
+            self.stop()
+            self.start(sequence)
+        elif self.sequence is None:
+            self.start(sequence)
+        else:
+            self.pending.append(sequence)
+
+    def start(self, sequence):
+        """! @brief Method to start a sequence.
+        @param self the LedAnimator instance
+        @param sequence list of keyframes `(delay, on, off)`
+        """
+        if not sequence:
+            return
+        self.sequence = sequence
+        self.index = 0
+        self.timer.start(int(sequence[0][0] * 1000))
+
+    @Slot()
+    def stop(self):
+        """! @brief Slot to cancel the running sequence and the pending ones. All the LEDs are turned off.
+        @param self the LedAnimator instance
+        """
+        self.timer.stop()
+        self.pending.clear()
+        if self.sequence is not None:
+            self.sequence = None
+            for i in self.ledRange:
+                self.leds[i].turn_off()
+
+    @Slot()
+    def nextKeyframe(self):
+        """! @brief Slot called by the timer to apply the next keyframe.
+        @param self the LedAnimator instance
+        """
+        if self.sequence is None:
+            return
+        delay, on, off = self.sequence[self.index]
+        for i in on:
+            self.leds[i].turn_on()
+        for i in off:
+            self.leds[i].turn_off()
+
+        self.index += 1
+        if self.index < len(self.sequence):
+            self.timer.start(int(self.sequence[self.index][0] * 1000))
+        else:
+            self.sequence = None
+            if self.pending:
+                self.start(self.pending.popleft())
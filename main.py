@@ -31,64 +31,257 @@
 #
 #  This project was developped at HES-SO//Valais during the bachelor thesis of Jacky Casas in 2014.
 
-from cardreader import CardReader
-from ui import Frame
-from action import Action
-from pifacecontrol import PiFaceControl
+from time import time
+## time when the process has started
+STARTED = time()
+
 import sys
+import argparse
 from PySide import QtGui
 from PySide.QtCore import *
-from functools import partial
+
+from constants import *
+from bootstrap import Bootstrap, StartupProfile, UI_THREAD
+## time when the modules needed by the window have been imported
+IMPORTED = time()
+
+class Dispenser(QObject):
+    """! @brief
+    Objects of the dispenser using the database, the reader and the PiFace. They are created on the UI thread
+    when the bootstrap thread has initialized the database, the reader and the PiFace.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, app, frame, profile, printProfile=False):
+        """! @brief Start the bootstrap thread, the *connecting* label is animated until it is done.
+        @param self the Dispenser instance
+        @param app the Qt application, parent of the instance
+        @param frame the Frame instance, displayed
+        @param profile the StartupProfile instance
+        @param printProfile print the startup profile when the dispenser is ready
+        """
+        QObject.__init__(self, app)
+        ## Qt Application
+        self.app = app
+        ## Frame instance
+        self.frame = frame
+        ## duration of each phase of the startup
+        self.profile = profile
+        ## print the startup profile when the dispenser is ready
+        self.printProfile = printProfile
+        ## timer animating the *connecting* label
+        self.connecting = QTimer(self)
+        self.connecting.timeout.connect(frame.displayConnecting)
+        self.connecting.start(500)
+        ## thread initializing the database, the reader and the PiFace
+        self.bootstrap = Bootstrap(profile)
+        self.bootstrap.ready.connect(self.ready)
+        self.bootstrap.failed.connect(frame.displayStatus)
+        # a Qt thread can't be destroyed while running
+        app.aboutToQuit.connect(self.bootstrap.wait)
+        self.bootstrap.start()
+
+    @Slot(object)
+    def ready(self, objects):
+        """! @brief Slot called when the bootstrap is done.
+        @param self the Dispenser instance
+        @param objects dictionary of the objects initialized by the bootstrap thread
+        """
+        self.connecting.stop()
+        with self.profile.phase('wire'):
+            self.wire(objects)
+        self.profile.mark('ready')
+        if self.printProfile:
+            self.profile.printReport()
+
+    def wire(self, objects):
+        """! @brief Method creating the objects using the database and the PiFace, and serving each reader plugged.
+        @param self the Dispenser instance
+        @param objects dictionary of the objects initialized by the bootstrap thread
+        """
+        from accountcache import AccountCache
+        from database import HealthProbe
+        from journal import JournalSyncer
+        from readerpool import ReaderPool
+        app = self.app
+        frame = self.frame
+
+        ## PiFaceControl instance
+        self.piface = piface = objects['piface']
+        ## Journal of the transactions
+        self.journal = journal = objects['journal']
+        ## database, shared by the readers
+        self.database = objects['database']
+        ## identification strategy of each card family, shared by the readers
+        self.strategies = objects['strategies']
+        ## cache of the accounts, shared by the readers : a card can be read by any bay
+        self.cache = AccountCache()
+        ## Thread writing the journal in the database
+        self.syncer = syncer = JournalSyncer(journal, self.database)
+        syncer.start()
+        ## Thread probing the database and reconnecting it
+        self.probe = probe = HealthProbe(self.database)
+        probe.start()
+        ## names of the readers served since the start, the index of a reader is the number of its bay
+        self.bays = []
+        ## Frame instance of each bay, kept when its reader is unplugged
+        self.frames = []
+        ## signals connected to the slots of the bay of each reader, `(signal, slot)`
+        self.connections = {}
+
+        # the PiFace buttons and LEDs belong to the bay of the first window
+        frame.activateButton.connect(piface.activateButtonListener)
+        frame.deactivateButton.connect(piface.deactivateButtonListener)
+        piface.b3.connect(frame.transaction.click)
+        piface.b4.connect(frame.toggleAdminView)
+
+        ## pool of the readers, one bay per reader
+        self.pool = pool = ReaderPool(self.createReader, parent=self)
+        pool.readerAdded.connect(self.addBay)
+        pool.readerRemoved.connect(self.removeBay)
+
+        # terminate the card watcher threads
+        app.aboutToQuit.connect(pool.stop)
+        app.aboutToQuit.connect(piface.stop)
+        app.aboutToQuit.connect(syncer.stop)
+        app.aboutToQuit.connect(probe.stop)
+
+        pool.start(objects['readers'])
+        if not objects['readers']:
+            frame.displayStatus('No card reader, waiting for one to be plugged.')
+
+    def createReader(self, name, cardrequest):
+        """! @brief Method creating the CardReader of a reader, with its own Action, operations and session.
+        The PiFace is used by the first bay, the other ones have none.
+        @param self the Dispenser instance
+        @param name name of the reader
+        @param cardrequest the card request of the reader
+        @return the CardReader instance
+        """
+        from action import Action
+        from asyncaction import AsyncAction
+        from cardreader import CardReader
+        from session import SessionManager
+        from pifacecontrol import NoPiFace
+        if name not in self.bays:
+            self.bays.append(name)
+        bay = self.bays.index(name)
+        # the LEDs of the PiFace signal the actions of the first bay only
+        action = Action(self.piface if bay == 0 else NoPiFace(), self.journal, self.database, self.cache)
+        asyncAction = AsyncAction(action)
+        session = SessionManager(name='session' if bay == 0 else 'session%d' % (bay + 1))
+        return CardReader(action, asyncAction, cardrequest, self.strategies, session, name)
+
+    def bayFrame(self, name):
+        """! @brief Method returning the Frame of the bay of a reader. The first bay uses the window already displayed,
+        the other ones get their own window, titled with the name of the reader.
+        @param self the Dispenser instance
+        @param name name of the reader
+        """
+        bay = self.bays.index(name)
+        while len(self.frames) <= bay:
+            if not self.frames:
+                self.frames.append(self.frame)
+                continue
+            from ui import Frame
+            frame = Frame()
+            frame.setWindowTitle("NFC Golf Ball Dispenser - %s" % self.bays[len(self.frames)])
+            frame.show()
+            self.frames.append(frame)
+        return self.frames[bay]
+
+    @Slot(str, object)
+    def addBay(self, name, cardReader):
+        """! @brief Slot called when a reader is served. Connect its CardReader to the Frame of its bay.
+        @param self the Dispenser instance
+        @param name name of the reader
+        @param cardReader the CardReader instance of the reader
+        """
+        frame = self.bayFrame(name)
+        asyncAction = cardReader.asyncAction
+        action = cardReader.action
+        connections = [
+            (frame.b1.clicked, cardReader.someBalls),
+            (frame.b2.clicked, cardReader.manyBalls),
+            (frame.transaction.clicked, lambda: asyncAction.getLastTransactions(cardReader.cardUid)),
+            (frame.rechargeRequested, cardReader.recharge),
+            (frame.createAccountRequested, asyncAction.addUser),
+            (frame.addDeviceRequested, lambda username: asyncAction.addDevice(username, cardReader.cardUid, cardReader.ATR)),
+            (action.status, frame.displayStatus),
+            (action.transactionsLoaded, frame.displayTransactions),
+            (action.moreTransactionsLoaded, frame.transactionModel.appendTransactions),
+            (frame.transactionModel.moreRequested, lambda: asyncAction.getMoreTransactions(cardReader.cardUid)),
+            (frame.usageRequested, asyncAction.getUsage),
+            (asyncAction.usageLoaded, frame.displayUsage),
+            (frame.warningTimer.timeout, cardReader.start),
+            (frame.releaseCardTimer.timeout, cardReader.start),
+            (cardReader.updateWaiting, frame.update),
+            (cardReader.cardDetected, frame.displayCard),
+            (cardReader.warning, frame.displayWarning),
+        ]
+        if frame is self.frame:
+            connections += [(self.piface.b1, cardReader.someBalls), (self.piface.b2, cardReader.manyBalls)]
+        for signal, slot in connections:
+            signal.connect(slot)
+        self.connections[name] = connections
+
+    @Slot(str, object)
+    def removeBay(self, name, cardReader):
+        """! @brief Slot called when a reader is unplugged. Disconnect its CardReader, the bay waits for the reader.
+        @param self the Dispenser instance
+        @param name name of the reader
+        @param cardReader the CardReader instance of the reader, stopped
+        """
+        for signal, slot in self.connections.pop(name, []):
+            signal.disconnect(slot)
+        cardReader.asyncAction.stop()
+        frame = self.bayFrame(name)
+        frame.displayUnplugged()
+        frame.displayStatus('Reader unplugged: %s' % name)
 
 def main():
     """! @brief Main of the software"""
+    parser = argparse.ArgumentParser(description='NFC Golf Ball Dispenser.')
+    parser.add_argument('--startup-profile', action='store_true', help='print the duration of each phase of the startup')
+    args, qtArgs = parser.parse_known_args()
+
+    ## duration of each phase of the startup
+    profile = StartupProfile(STARTED)
+    profile.add('import qt', UI_THREAD, STARTED, IMPORTED)
+
+    with profile.phase('create application'):
+        ## Qt Application
+        app = QtGui.QApplication(sys.argv[:1] + qtArgs)
+        app.setOrganizationName('Digiclever')
+        app.setApplicationName('NFC Golf Ball Dispenser')
+    with profile.phase('import ui'):
+        from ui import Frame
+        from metrics import Metrics, MetricsServer, MetricsWriter
+    with profile.phase('build frame'):
+        ## Frame instance
+        frame = Frame()
+        frame.show()
+    with profile.phase('first frame'):
+        # the window is painted before any I/O
+        app.processEvents()
+
+    # objects of the dispenser, created in the background and kept by the application
+    Dispenser(app, frame, profile, args.startup_profile)
+
+    # latency of each operation
+    app.aboutToQuit.connect(Metrics().printReport)
+    # export of the metrics, for the monitoring of the dispenser
+    if METRICS_HTTP_PORT is not None:
+        metricsServer = MetricsServer(METRICS_HTTP_PORT)
+        metricsServer.start()
+        app.aboutToQuit.connect(metricsServer.stop)
+    if METRICS_FILE is not None:
+        metricsWriter = MetricsWriter(METRICS_FILE)
+        metricsWriter.start()
+        app.aboutToQuit.connect(metricsWriter.stop)
 
-    ## Qt Application
-    app = QtGui.QApplication(sys.argv)
-    app.setOrganizationName('Digiclever')
-    app.setApplicationName('NFC Golf Ball Dispenser')
-    ## Frame instance
-    frame = Frame()
-    frame.show()
-	
-    ## PiFaceControl instance
-    piface = PiFaceControl()
-    ## Action instance
-    action = Action(piface)
-    ## CardReader instance
-    cardReader = CardReader(action)
-
-    # connect signals to slots
-    frame.b1.clicked.connect(cardReader.someBalls)
-    frame.b2.clicked.connect(cardReader.manyBalls)
-    frame.transaction.clicked.connect(lambda: action.getLastTransactions(cardReader.cardUid))
-    frame.admin.clicked.connect(frame.toggleAdminView)
-    frame.log.clicked.connect(lambda: frame.displayAdmin(frame.adminUsername.text(), frame.adminPassword.text()))
-    frame.bRecharge.clicked.connect(lambda: cardReader.recharge(frame.moneyBox.value()))
-    frame.bCreateAccount.clicked.connect(lambda: action.addUser(frame.username.text(), frame.name.text(), frame.surname.text()))
-    frame.bAddDevice.clicked.connect(lambda: action.addDevice(frame.username2.text(), cardReader.cardUid, cardReader.ATR))
-
-    action.status.connect(frame.displayStatus)
-    action.transactionsLoaded.connect(frame.displayTransactions)
-
-    frame.connect(frame.warningTimer, SIGNAL("timeout()"), cardReader.start)
-    frame.connect(frame.releaseCardTimer, SIGNAL("timeout()"), cardReader.start)
-
-    cardReader.connect(cardReader.timer, SIGNAL("timeout()"), cardReader.waitForCard)
-    cardReader.updateWaiting.connect(frame.update)
-
-    cardReader.cardDetected.connect(frame.displayCard)
-    cardReader.warning.connect(frame.displayWarning)
-    
-    frame.activateButton.connect(piface.activateButtonListener)
-    frame.deactivateButton.connect(piface.deactivateButtonListener)
-    
-    piface.b1.connect(cardReader.someBalls)
-    piface.b2.connect(cardReader.manyBalls)
-    piface.b3.connect(lambda: action.getLastTransactions(cardReader.cardUid))
-    piface.b4.connect(frame.toggleAdminView)
-
-    cardReader.start()
     sys.exit(app.exec_())
 
 if __name__ == '__main__':	
@@ -0,0 +1,755 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file memorydb.py
+#  Contains the classes MemoryCursor, MemoryCollection and MemoryDataBase.
+
+## @package memorydb
+#  In-process stand-in of the MongoDB database, used by the benchmarks.
+#  It implements the part of the pymongo 2.x API used by the dispenser.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import threading
+from datetime import datetime
+from functools import wraps
+from collections import OrderedDict
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from database import INDEXES
+
+def synchronized(method):
+    """! @brief Decorator serialising the operations of a collection, as the MongoDB server would.
+    @param method the method of MemoryCollection
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.database.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def copyDocument(value):
+    """! @brief Function copying a document. Much faster than copy.deepcopy, the values other than
+    dictionaries and lists (strings, numbers, dates, ObjectId) are immutable and shared.
+    @param value the document or a value of a document
+    """
+    if isinstance(value, dict):
+        return dict((key, copyDocument(item)) for key, item in value.iteritems())
+    if isinstance(value, list):
+        return [copyDocument(item) for item in value]
+    return value
+
+def getValues(document, path):
+    """! @brief Function getting the values of a dotted path in a document. The arrays are traversed.
+    @param document the document
+    @param path the dotted path, e.g. `devices.uid`
+    @return the list of the values found, the elements of an array value are added to the list
+    """
+    values = [document]
+    for part in path.split('.'):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                for item in value:
+                    if isinstance(item, dict) and part in item:
+                        found.append(item[part])
+        values = found
+    result = []
+    for value in values:
+        result.append(value)
+        if isinstance(value, list):
+            result.extend(value)
+    return result
+
+def typeOrder(value):
+    """! @brief Function getting the rank of the type of a value in the comparison order of BSON.
+    MongoDB sorts the values of different types by this rank and compares with `$lt`, `$gte`... only values of the same type.
+    @param value a value of a document
+    """
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, long, float)):
+        return 2
+    if isinstance(value, basestring):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def sortKey(value):
+    """! @brief Function getting the key sorting a value as MongoDB does, by type first.
+    @param value a value of a document
+    """
+    return (typeOrder(value), value)
+
+## BSON type numbers of the operator `$type`
+BSON_TYPES = {1: (float,), 2: (basestring,), 3: (dict,), 4: (list,), 7: (ObjectId,), 8: (bool,), 9: (datetime,), 10: (type(None),),
+    16: (int,), 18: (long,)}
+
+def isOperatorDocument(condition):
+    """! @brief Function telling if a condition is a document of operators, e.g. `{'$gte': 2}`.
+    @param condition the condition of a query
+    """
+    return isinstance(condition, dict) and len(condition) > 0 and all(key.startswith('$') for key in condition)
+
+def matchOperator(values, operator, argument):
+    """! @brief Function evaluating a query operator on the values of a field.
+    @param values the values of the field
+    @param operator the operator, e.g. `$gte`
+    @param argument the argument of the operator
+    """
+    if operator in ('$gte', '$gt', '$lte', '$lt'):
+        # only the values of the same type as the argument are compared
+        values = [value for value in values if typeOrder(value) == typeOrder(argument)]
+    if operator == '$gte':
+        return any(value >= argument for value in values)
+    if operator == '$gt':
+        return any(value > argument for value in values)
+    if operator == '$lte':
+        return any(value <= argument for value in values)
+    if operator == '$lt':
+        return any(value < argument for value in values)
+    if operator == '$type':
+        return any(isinstance(value, BSON_TYPES.get(argument, ())) for value in values)
+    if operator == '$ne':
+        return all(value != argument for value in values)
+    if operator == '$in':
+        return any(value in argument for value in values) or (None in argument and not values)
+    if operator == '$nin':
+        return all(value not in argument for value in values)
+    if operator == '$exists':
+        return bool(values) == bool(argument)
+    if operator == '$elemMatch':
+        return any(isinstance(value, dict) and matches(value, argument) for value in values)
+    raise OperationFailure('unsupported query operator ' + operator)
+
+def matches(document, query):
+    """! @brief Function telling if a document matches a query.
+    @param document the document
+    @param query the query
+    """
+    for key, condition in query.iteritems():
+        if key == '$or':
+            if not any(matches(document, subquery) for subquery in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(document, subquery) for subquery in condition):
+                return False
+        else:
+            values = getValues(document, key)
+            if isOperatorDocument(condition):
+                for operator, argument in condition.iteritems():
+                    if not matchOperator(values, operator, argument):
+                        return False
+            elif condition is None:
+                if values and None not in values:
+                    return False
+            elif condition not in values:
+                return False
+    return True
+
+def positionalIndex(document, arrayPath, query):
+    """! @brief Function finding the element of an array matched by a query, for the positional operator `$`.
+    @param document the document
+    @param arrayPath the path of the array
+    @param query the query which matched the document
+    """
+    array = getValues(document, arrayPath)[0]
+    for i, item in enumerate(array):
+        for key, condition in query.iteritems():
+            if key == arrayPath and isOperatorDocument(condition) and '$elemMatch' in condition:
+                if matches(item, condition['$elemMatch']):
+                    return i
+            elif key.startswith(arrayPath + '.'):
+                if matches(item, {key[len(arrayPath) + 1:]: condition}):
+                    return i
+    raise OperationFailure('the positional operator did not find the match needed from the query')
+
+def resolve(document, path, query, create=True):
+    """! @brief Function resolving a dotted path of an update to its container and last key.
+    @param document the document
+    @param path the dotted path, can contain the positional operator `$`
+    @param query the query which matched the document
+    @param create create the missing sub-documents
+    @return the container and the key, or (None, None)
+    """
+    parts = path.split('.')
+    container = document
+    for i, part in enumerate(parts[:-1]):
+        if part == '$':
+            part = positionalIndex(document, '.'.join(parts[:i]), query)
+        if isinstance(container, list):
+            container = container[int(part)]
+        else:
+            if part not in container:
+                if not create:
+                    return None, None
+                container[part] = {}
+            container = container[part]
+    last = parts[-1]
+    if last == '$':
+        last = positionalIndex(document, '.'.join(parts[:-1]), query)
+    if isinstance(container, list):
+        last = int(last)
+    return container, last
+
+def applyUpdate(document, update, query):
+    """! @brief Function applying an update to a document, in place.
+    @param document the document
+    @param update the update, with operators or a replacement document
+    @param query the query which matched the document
+    """
+    if not any(key.startswith('$') for key in update):
+        identifier = document['_id']
+        document.clear()
+        document.update(copyDocument(update))
+        document['_id'] = identifier
+        return
+    for operator, fields in update.iteritems():
+        for path, value in fields.iteritems():
+            container, key = resolve(document, path, query, operator != '$unset')
+            if operator == '$set':
+                container[key] = copyDocument(value)
+            elif operator == '$unset':
+                if container is not None:
+                    container.pop(key, None)
+            elif operator == '$inc':
+                container[key] = container.get(key, 0) + value if isinstance(container, dict) else container[key] + value
+            elif operator == '$push':
+                array = container.setdefault(key, [])
+                if isOperatorDocument(value) and '$each' in value:
+                    array.extend(copyDocument(value['$each']))
+                    if '$sort' in value:
+                        sortDocuments(array, value['$sort'].items())
+                    if '$slice' in value:
+                        size = value['$slice']
+                        array[:] = array[size:] if size < 0 else array[:size]
+                else:
+                    array.append(copyDocument(value))
+            elif operator == '$addToSet':
+                array = container.setdefault(key, [])
+                if value not in array:
+                    array.append(copyDocument(value))
+            else:
+                raise OperationFailure('unsupported update operator ' + operator)
+
+def project(document, fields):
+    """! @brief Function applying a projection to a document.
+    @param document the document
+    @param fields the projection, a dictionary or a list of field names
+    @return a copy of the document
+    """
+    if fields is None:
+        return copyDocument(document)
+    if isinstance(fields, list):
+        fields = dict((field, 1) for field in fields)
+    included = [key for key, value in fields.iteritems() if value and key != '_id']
+    if included:
+        result = dict((key, copyDocument(document[key])) for key in included if key in document)
+        if fields.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    result = copyDocument(document)
+    for key, value in fields.iteritems():
+        if not value:
+            result.pop(key, None)
+    return result
+
+def sortDocuments(documents, sort):
+    """! @brief Function sorting documents.
+    @param documents list of documents, sorted in place
+    @param sort list of `(key, direction)`
+    """
+    for key, direction in reversed(sort):
+        documents.sort(key=lambda document: sortKey((getValues(document, key) or [None])[0]), reverse=direction < 0)
+
+class MemoryCursor(object):
+    """! @brief
+    Cursor over the result of a query on a MemoryCollection.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, collection, spec, fields):
+        """! @brief Initialize the cursor, the query is executed when the cursor is iterated.
+        @param self the MemoryCursor instance
+        @param collection the MemoryCollection instance
+        @param spec the query
+        @param fields the projection
+        """
+        self.collection = collection
+        self.spec = spec
+        self.fields = fields
+        self.sortKeys = None
+        self.limitCount = 0
+        self.skipCount = 0
+
+    def sort(self, key, direction=1):
+        """! @brief Method to sort the result, as pymongo.
+        @param self the MemoryCursor instance
+        @param key a field name or a list of `(key, direction)`
+        @param direction 1 or -1 if key is a field name
+        """
+        self.sortKeys = key if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def limit(self, count):
+        """! @brief Method to limit the number of documents.
+        @param self the MemoryCursor instance
+        @param count maximum number of documents, 0 for no limit
+        """
+        self.limitCount = count
+        return self
+
+    def skip(self, count):
+        """! @brief Method to skip documents.
+        @param self the MemoryCursor instance
+        @param count number of documents to skip
+        """
+        self.skipCount = count
+        return self
+
+    def documents(self):
+        """! @brief Method to execute the query.
+        @param self the MemoryCursor instance
+        @return the matching documents, not copied
+        """
+        documents = self.collection.match(self.spec)
+        if self.sortKeys:
+            sortDocuments(documents, self.sortKeys)
+        documents = documents[self.skipCount:]
+        if self.limitCount:
+            documents = documents[:self.limitCount]
+        return documents
+
+    def count(self):
+        """! @brief Method to count the matching documents, without skip and limit.
+        @param self the MemoryCursor instance
+        """
+        with self.collection.database.lock:
+            self.collection.roundTrip()
+            return len(self.collection.match(self.spec))
+
+    def explain(self):
+        """! @brief Method to describe the query plan, in the format of MongoDB 2.x.
+        @param self the MemoryCursor instance
+        """
+        index = self.collection.usableIndex(self.spec)
+        return {'cursor': 'BtreeCursor ' + index if index else 'BasicCursor'}
+
+    def __iter__(self):
+        """! @brief Iterate over copies of the documents.
+        @param self the MemoryCursor instance
+        """
+        with self.collection.database.lock:
+            self.collection.roundTrip()
+            documents = [project(document, self.fields) for document in self.documents()]
+        for document in documents:
+            yield document
+
+class MemoryCollection(object):
+    """! @brief
+    Collection kept in memory. The single-field equality lookups use hash indexes,
+    the unique indexes are enforced.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database, name):
+        """! @brief Initialize an empty collection.
+        @param self the MemoryCollection instance
+        @param database the MemoryDataBase instance
+        @param name name of the collection
+        """
+        ## database of the collection
+        self.database = database
+        ## name of the collection
+        self.name = name
+        ## documents by _id, in insertion order
+        self.documents = OrderedDict()
+        ## indexes by name : field, unique, sparse, `value -> set of _id`
+        self.indexes = {}
+
+    def roundTrip(self):
+        """! @brief Method called for each operation which would be a round trip to MongoDB.
+        @param self the MemoryCollection instance
+        """
+        self.database.roundTrips += 1
+
+    @synchronized
+    def ensure_index(self, keys, unique=False, sparse=False, **kwargs):
+        """! @brief Method to create an index. Only the first field of a compound index is indexed.
+        @param self the MemoryCollection instance
+        @param keys list of `(key, direction)` or a field name
+        @param unique True to reject duplicated values
+        @param sparse True to ignore the documents without the field
+        """
+        if not isinstance(keys, list):
+            keys = [(keys, 1)]
+        name = '_'.join('%s_%s' % key for key in keys)
+        if name in self.indexes:
+            return name
+        field = keys[0][0]
+        index = {'field': field, 'unique': unique and len(keys) == 1, 'sparse': sparse, 'entries': {}}
+        for document in self.documents.itervalues():
+            self.addToIndex(index, document)
+        self.indexes[name] = index
+        return name
+
+    create_index = ensure_index
+
+    def indexValues(self, index, document):
+        """! @brief Method to get the values of a document in an index.
+        @param self the MemoryCollection instance
+        @param index the index
+        @param document the document
+        """
+        values = set(value for value in getValues(document, index['field']) if not isinstance(value, (list, dict)))
+        if not values and not index['sparse']:
+            values = set([None])
+        return values
+
+    def addToIndex(self, index, document):
+        """! @brief Method to add a document to an index.
+        @param self the MemoryCollection instance
+        @param index the index
+        @param document the document
+        """
+        for value in self.indexValues(index, document):
+            identifiers = index['entries'].setdefault(value, set())
+            if index['unique'] and identifiers and document['_id'] not in identifiers:
+                raise DuplicateKeyError('E11000 duplicate key error index: %s.%s dup key: { : %r }' % (self.name, index['field'], value))
+            identifiers.add(document['_id'])
+
+    def removeFromIndexes(self, document):
+        """! @brief Method to remove a document from all the indexes.
+        @param self the MemoryCollection instance
+        @param document the document
+        """
+        for index in self.indexes.itervalues():
+            for value in self.indexValues(index, document):
+                identifiers = index['entries'].get(value)
+                if identifiers is not None:
+                    identifiers.discard(document['_id'])
+                    if not identifiers:
+                        del index['entries'][value]
+
+    def addToIndexes(self, document):
+        """! @brief Method to add a document to all the indexes. Nothing is changed if a unique index rejects it.
+        @param self the MemoryCollection instance
+        @param document the document
+        """
+        added = []
+        try:
+            for index in self.indexes.itervalues():
+                self.addToIndex(index, document)
+                added.append(index)
+        except DuplicateKeyError:
+            for index in added:
+                for value in self.indexValues(index, document):
+                    index['entries'].get(value, set()).discard(document['_id'])
+            raise
+
+    def usableIndex(self, spec):
+        """! @brief Method to find an index usable for a query.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @return the name of the index, None if the collection has to be scanned
+        """
+        for name, index in self.indexes.iteritems():
+            if self.candidates(spec, index) is not None:
+                return name
+        return None
+
+    def candidates(self, spec, index):
+        """! @brief Method to get the _id of the documents which can match a query, using an index.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @param index the index
+        @return a set of _id, None if the index can't be used
+        """
+        field = index['field']
+        condition = spec.get(field, spec)
+        if condition is spec:
+            # equality inside an $elemMatch on the parent array
+            parent, sep, child = field.rpartition('.')
+            elemMatch = spec.get(parent)
+            if not sep or not isOperatorDocument(elemMatch) or '$elemMatch' not in elemMatch or child not in elemMatch['$elemMatch']:
+                return None
+            condition = elemMatch['$elemMatch'][child]
+        if isOperatorDocument(condition):
+            if '$in' in condition:
+                identifiers = set()
+                for value in condition['$in']:
+                    identifiers |= index['entries'].get(value, set())
+                return identifiers
+            return None
+        if isinstance(condition, (list, dict)):
+            return None
+        return index['entries'].get(condition, set())
+
+    def match(self, spec):
+        """! @brief Method to get the documents matching a query.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @return the matching documents, not copied
+        """
+        spec = spec or {}
+        for index in self.indexes.itervalues():
+            identifiers = self.candidates(spec, index)
+            if identifiers is not None:
+                documents = [self.documents[identifier] for identifier in identifiers]
+                return [document for document in documents if matches(document, spec)]
+        return [document for document in self.documents.itervalues() if matches(document, spec)]
+
+    def find(self, spec=None, fields=None):
+        """! @brief Method to query the collection.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @param fields the projection
+        @return a MemoryCursor
+        """
+        return MemoryCursor(self, spec, fields)
+
+    def find_one(self, spec=None, fields=None):
+        """! @brief Method to get one document matching a query.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @param fields the projection
+        @return a copy of the document, None if no document matches
+        """
+        for document in self.find(spec, fields).limit(1):
+            return document
+        return None
+
+    @synchronized
+    def insert(self, docOrDocs, continue_on_error=False, **kwargs):
+        """! @brief Method to insert one or several documents.
+        @param self the MemoryCollection instance
+        @param docOrDocs a document or a list of documents
+        @param continue_on_error True to insert the other documents when one is rejected
+        @return the _id or the list of _id
+        """
+        self.roundTrip()
+        documents = docOrDocs if isinstance(docOrDocs, list) else [docOrDocs]
+        error = None
+        for document in documents:
+            if '_id' not in document:
+                document['_id'] = ObjectId()
+            stored = copyDocument(document)
+            try:
+                if stored['_id'] in self.documents:
+                    raise DuplicateKeyError('E11000 duplicate key error index: %s.$_id_ dup key: { : %r }' % (self.name, stored['_id']))
+                self.addToIndexes(stored)
+            except DuplicateKeyError, e:
+                if not continue_on_error:
+                    raise
+                error = e
+                continue
+            self.documents[stored['_id']] = stored
+        if error is not None:
+            raise error
+        if isinstance(docOrDocs, list):
+            return [document['_id'] for document in documents]
+        return docOrDocs['_id']
+
+    def modify(self, document, update, spec):
+        """! @brief Method to update a stored document and its indexes.
+        @param self the MemoryCollection instance
+        @param document the stored document
+        @param update the update
+        @param spec the query which matched the document
+        """
+        before = copyDocument(document)
+        self.removeFromIndexes(document)
+        applyUpdate(document, update, spec)
+        try:
+            self.addToIndexes(document)
+        except DuplicateKeyError:
+            document.clear()
+            document.update(before)
+            self.addToIndexes(document)
+            raise
+
+    @synchronized
+    def update(self, spec, document, upsert=False, multi=False, **kwargs):
+        """! @brief Method to update the documents matching a query.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @param document the update
+        @param upsert True to insert a document if none matches
+        @param multi True to update all the matching documents
+        @return the result of the last error, as pymongo 2.x with an acknowledged write
+        """
+        self.roundTrip()
+        documents = self.match(spec)
+        if not multi:
+            documents = documents[:1]
+        for stored in documents:
+            self.modify(stored, document, spec)
+        if not documents and upsert:
+            self.upsert(spec, document)
+            return {'ok': 1, 'n': 1, 'updatedExisting': False, 'err': None}
+        return {'ok': 1, 'n': len(documents), 'updatedExisting': bool(documents), 'err': None}
+
+    def upsert(self, spec, update):
+        """! @brief Method to insert the document built from a query and an update.
+        @param self the MemoryCollection instance
+        @param spec the query
+        @param update the update
+        @return the new document
+        """
+        document = dict((key, value) for key, value in spec.iteritems() if not key.startswith('$') and '.' not in key and not isOperatorDocument(value))
+        document.setdefault('_id', ObjectId())
+        if document['_id'] in self.documents:
+            # the query has not matched the document of this _id
+            raise DuplicateKeyError('E11000 duplicate key error index: %s.$_id_ dup key: { : %r }' % (self.name, document['_id']))
+        applyUpdate(document, update, spec)
+        self.addToIndexes(document)
+        self.documents[document['_id']] = document
+        return document
+
+    @synchronized
+    def find_and_modify(self, query={}, update=None, upsert=False, sort=None, new=False, fields=None, remove=False, **kwargs):
+        """! @brief Method to update or remove a document and to get it, atomically.
+        @param self the MemoryCollection instance
+        @param query the query
+        @param update the update
+        @param upsert True to insert a document if none matches
+        @param sort list of `(key, direction)` choosing the document
+        @param new True to get the document after the update
+        @param fields the projection
+        @param remove True to remove the document
+        @return a copy of the document, None if no document matches
+        """
+        self.roundTrip()
+        documents = self.match(query)
+        if sort:
+            sortDocuments(documents, sort)
+        if not documents:
+            if upsert and update is not None:
+                document = self.upsert(query, update)
+                return project(document, fields) if new else None
+            return None
+        document = documents[0]
+        if remove:
+            self.removeFromIndexes(document)
+            del self.documents[document['_id']]
+            return project(document, fields)
+        before = project(document, fields)
+        self.modify(document, update, query)
+        return project(document, fields) if new else before
+
+    @synchronized
+    def remove(self, spec=None, **kwargs):
+        """! @brief Method to remove the documents matching a query.
+        @param self the MemoryCollection instance
+        @param spec the query, all the documents if None
+        """
+        self.roundTrip()
+        documents = self.match(spec)
+        for document in documents:
+            self.removeFromIndexes(document)
+            del self.documents[document['_id']]
+        return {'ok': 1, 'n': len(documents), 'err': None}
+
+    @synchronized
+    def count(self):
+        """! @brief Method to count the documents of the collection.
+        @param self the MemoryCollection instance
+        """
+        self.roundTrip()
+        return len(self.documents)
+
+class MemoryDataBase(object):
+    """! @brief
+    In-process stand-in of DataBase, with the collections *user* and *transaction* kept in memory.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self):
+        """! @brief Create the empty collections and their indexes.
+        @param self the MemoryDataBase instance
+        """
+        ## lock serialising the operations, the collections are used by several threads
+        self.lock = threading.RLock()
+        ## number of operations which would have been round trips to MongoDB
+        self.roundTrips = 0
+        ## collections by name
+        self.collections = {}
+        ## variable containing the collection *user*
+        self.user = self['user']
+        ## variable containing the collection *transaction*
+        self.transaction = self['transaction']
+        ## the database is always online
+        self.online = True
+        ## time before which no reconnection is attempted, never delayed
+        self.retryAt = 0
+        self.ensureIndexes()
+
+    def __getitem__(self, name):
+        """! @brief Get a collection, created if needed.
+        @param self the MemoryDataBase instance
+        @param name name of the collection
+        """
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(self, name)
+        return self.collections[name]
+
+    def collection_names(self):
+        """! @brief Method to get the names of the collections.
+        @param self the MemoryDataBase instance
+        """
+        return self.collections.keys()
+
+    def command(self, name, *args, **kwargs):
+        """! @brief Method to run a database command. Only `ping` is supported.
+        @param self the MemoryDataBase instance
+        @param name name of the command
+        """
+        if name != 'ping':
+            raise OperationFailure('unsupported command ' + name)
+        return {'ok': 1.0}
+
+    def connect(self):
+        """! @brief Method to connect, always successful.
+        @param self the MemoryDataBase instance
+        """
+        return True
+
+    def ping(self):
+        """! @brief Method to check the database, always online.
+        @param self the MemoryDataBase instance
+        """
+        return True
+
+    def unreachable(self):
+        """! @brief Method called when the database can't be reached, never the case.
+        @param self the MemoryDataBase instance
+        """
+
+    def ensureIndexes(self):
+        """! @brief Method to create the indexes of DataBase.
+        @param self the MemoryDataBase instance
+        """
+        for name, keys, options in INDEXES:
+            self[name].ensure_index(keys, **options)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file metrics.py
+#  Contains the classes Metrics, MetricsHandler, MetricsServer and MetricsWriter.
+
+## @package metrics
+#  Latency measurements of the operations and of the stages of a session.
+#  The metrics can be exported in the Prometheus text format, by a local endpoint or in a file.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import os
+import bisect
+import threading
+from time import time
+from functools import wraps
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from constants import *
+from singleton import SingletonType
+
+## prefix of the names of the exported metrics
+PREFIX = 'dispenser_'
+
+## type and description of the metrics, by name
+DESCRIPTIONS = {
+    'query_seconds': ('histogram', 'Duration of the operations of Action, database queries included.'),
+    'query_round_trips_total': ('counter', 'Database round trips made by the operations of Action.'),
+    'database_ping_seconds': ('histogram', 'Duration of the pings of the health probe of the database.'),
+    'card_detect_seconds': ('histogram', 'Time to read a card and its account once the card is in front of the reader, by reader.'),
+    'cards_total': ('counter', 'Cards seen by the readers, by reader and result.'),
+    'reader_operations_total': ('counter', 'Transactions and recharges finished, by reader, operation and result.'),
+    'reader_service_seconds': ('histogram', 'Time from the card read to the end of its transaction or recharge, by reader and operation.'),
+    'apdu_seconds': ('histogram', 'Duration of an APDU exchange with the card, by reader and instruction.'),
+    'apdu_errors_total': ('counter', 'APDU answered with error status words, by reader and instruction.'),
+    'card_strategy_seconds': ('histogram', 'Duration of the identification strategies of the cards, by strategy and result.'),
+    'suppressed_total': ('counter', 'Card reads served from memory and duplicate purchases collapsed, by event.'),
+    'ui_slot_seconds': ('histogram', 'Duration of the UI update slots of the Frame, by slot.'),
+}
+
+def labelKey(labels):
+    """! @brief Function converting labels to a key of the statistics.
+    @param labels dictionary of labels, can be None
+    """
+    if not labels:
+        return ()
+    return tuple(sorted(labels.iteritems()))
+
+def formatLabels(key, extra=None):
+    """! @brief Function formatting labels in the Prometheus text format.
+    @param key the labels, as returned by labelKey
+    @param extra additional label `(name, value)`, optional
+    """
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in items) + '}'
+
+def timed(name, metric='ui_slot_seconds', label='slot'):
+    """! @brief Decorator observing the duration of a method in a histogram.
+    When the metrics are disabled, the method is called directly.
+    @param name value of the label
+    @param metric name of the histogram
+    @param label name of the label
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            metrics = Metrics()
+            if not metrics.enabled:
+                return method(*args, **kwargs)
+            start = time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                metrics.observe(metric, time() - start, {label: name})
+        return wrapper
+    return decorator
+
+class Metrics(object):
+    """! @brief
+    Count, latency and database round trips of each operation, histograms and counters of the stages
+    of a session. When disabled, the measures are dropped as soon as they are recorded. This class is a singleton.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    __metaclass__ = SingletonType
+
+    def __init__(self):
+        """! @brief Initialize the empty statistics.
+        @param self the Metrics instance
+        """
+        ## tell if the measures are recorded
+        self.enabled = METRICS_ENABLED
+        ## upper bounds of the buckets of the histograms, in seconds
+        self.buckets = METRICS_BUCKETS
+        ## lock protecting the statistics, operations are recorded from several threads
+        self.lock = threading.Lock()
+        ## statistics of each operation : count, total and max latency (seconds), round trips
+        self.operations = {}
+        ## histograms by `(name, labels)` : count of each bucket (the last one is +Inf), sum and count
+        self.histograms = {}
+        ## counters by `(name, labels)`
+        self.counters = {}
+        ## functions returning the counters of other components, by name
+        self.sources = {}
+
+    def register(self, name, counters):
+        """! @brief Method to add the counters of a component to the report.
+        @param self the Metrics instance
+        @param name name of the component
+        @param counters function returning a dictionary of counters
+        """
+        with self.lock:
+            self.sources[name] = counters
+
+    def record(self, operation, seconds, roundTrips=0):
+        """! @brief Method to record one execution of an operation.
+        @param self the Metrics instance
+        @param operation name of the operation
+        @param seconds duration of the operation
+        @param roundTrips number of round trips to the database made by the operation
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.operations.get(operation)
+            if stats is None:
+                stats = {'count': 0, 'total': 0.0, 'max': 0.0, 'roundTrips': 0}
+                self.operations[operation] = stats
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['roundTrips'] += roundTrips
+        labels = {'operation': operation}
+        self.observe('query_seconds', seconds, labels)
+        self.increment('query_round_trips_total', roundTrips, labels)
+
+    def observe(self, name, seconds, labels=None):
+        """! @brief Method to add a measure to a histogram.
+        @param self the Metrics instance
+        @param name name of the histogram
+        @param seconds the measure
+        @param labels dictionary of labels, optional
+        """
+        if not self.enabled:
+            return
+        key = (name, labelKey(labels))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.histograms[key] = histogram
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def increment(self, name, value=1, labels=None):
+        """! @brief Method to increment a counter.
+        @param self the Metrics instance
+        @param name name of the counter
+        @param value the increment
+        @param labels dictionary of labels, optional
+        """
+        if not self.enabled:
+            return
+        key = (name, labelKey(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self):
+        """! @brief Method to get the statistics as a printable text.
+        @param self the Metrics instance
+        """
+        lines = ['%-22s %8s %10s %10s %12s' % ('operation', 'count', 'avg (ms)', 'max (ms)', 'round trips')]
+        with self.lock:
+            for operation in sorted(self.operations):
+                stats = self.operations[operation]
+                lines.append('%-22s %8d %10.2f %10.2f %12.2f' % (operation, stats['count'],
+                    1000 * stats['total'] / stats['count'], 1000 * stats['max'],
+                    float(stats['roundTrips']) / stats['count']))
+            sources = self.sources.items()
+        for name, counters in sorted(sources):
+            lines.append(name + ' : ' + ', '.join('%s=%s' % item for item in sorted(counters().items())))
+        return '\n'.join(lines)
+
+    def printReport(self):
+        """! @brief Method to print the statistics on the standard output.
+        @param self the Metrics instance
+        """
+        print self.report()
+
+    def exposition(self):
+        """! @brief Method to get the histograms, the counters and the counters of the components in the Prometheus text format.
+        @param self the Metrics instance
+        """
+        with self.lock:
+            histograms = [(key, (list(value[0]), value[1], value[2])) for key, value in self.histograms.iteritems()]
+            counters = self.counters.items()
+            sources = self.sources.items()
+
+        lines = []
+        described = set()
+        def describe(name, kind, description=None):
+            if name not in described:
+                described.add(name)
+                lines.append('# HELP %s%s %s' % (PREFIX, name, description or DESCRIPTIONS.get(name, (kind, name))[1]))
+                lines.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+
+        for (name, labels), (buckets, total, count) in sorted(histograms):
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, value in zip(list(self.buckets) + ['+Inf'], buckets):
+                cumulative += value
+                lines.append('%s%s_bucket%s %d' % (PREFIX, name, formatLabels(labels, ('le', bound)), cumulative))
+            lines.append('%s%s_sum%s %r' % (PREFIX, name, formatLabels(labels), total))
+            lines.append('%s%s_count%s %d' % (PREFIX, name, formatLabels(labels), count))
+        for (name, labels), value in sorted(counters):
+            describe(name, 'counter')
+            lines.append('%s%s%s %s' % (PREFIX, name, formatLabels(labels), value))
+        for source, function in sorted(sources):
+            for counter, value in sorted(function().items()):
+                name = '%s_%s' % (source, counter)
+                describe(name, 'gauge', 'Counter %s of the component %s.' % (counter, source))
+                lines.append('%s%s %s' % (PREFIX, name, value))
+        return '\n'.join(lines) + '\n'
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """! @brief
+    Handler of the requests of the metrics endpoint. Only `GET /metrics` is served.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def do_GET(self):
+        """! @brief Answer a GET request with the metrics.
+        @param self the MetricsHandler instance
+        """
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = Metrics().exposition()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """! @brief Don't log the requests on the standard error.
+        @param self the MetricsHandler instance
+        """
+        pass
+
+class MetricsServer(threading.Thread):
+    """! @brief
+    Thread serving the metrics on a local HTTP endpoint, `http://127.0.0.1:<port>/metrics`.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, port=METRICS_HTTP_PORT):
+        """! @brief Open the port of the endpoint.
+        @param self the MetricsServer instance
+        @param port the port, on the loopback interface only
+        """
+        threading.Thread.__init__(self, name='MetricsServer')
+        self.daemon = True
+        ## the HTTP server
+        self.server = HTTPServer(('127.0.0.1', port), MetricsHandler)
+
+    def run(self):
+        """! @brief Loop of the thread, serve the requests.
+        @param self the MetricsServer instance
+        """
+        self.server.serve_forever()
+
+    def stop(self):
+        """! @brief Method to stop the server and close the port.
+        @param self the MetricsServer instance
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+class MetricsWriter(threading.Thread):
+    """! @brief
+    Thread writing the metrics in a file periodically, e.g. for the textfile collector of the node exporter.
+    The file is replaced atomically.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, path=METRICS_FILE, interval=METRICS_FILE_INTERVAL):
+        """! @brief Initialize the thread.
+        @param self the MetricsWriter instance
+        @param path path of the file
+        @param interval interval between two writings, in seconds
+        """
+        threading.Thread.__init__(self, name='MetricsWriter')
+        self.daemon = True
+        ## path of the file
+        self.path = path
+        ## interval between two writings, in seconds
+        self.interval = interval
+        ## event set to stop the thread
+        self.stopped = threading.Event()
+
+    def write(self):
+        """! @brief Method to write the metrics in the file.
+        @param self the MetricsWriter instance
+        """
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as output:
+            output.write(Metrics().exposition())
+        os.rename(temporary, self.path)
+
+    def run(self):
+        """! @brief Loop of the thread.
+        @param self the MetricsWriter instance
+        """
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except (IOError, OSError), e:
+                print "Could not write the metrics: %s" % e
+
+    def stop(self):
+        """! @brief Method to stop the thread, the metrics are written a last time.
+        @param self the MetricsWriter instance
+        """
+        self.stopped.set()
+        self.join()
+        try:
+            self.write()
+        except (IOError, OSError), e:
+            print "Could not write the metrics: %s" % e
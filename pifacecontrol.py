@@ -10,13 +10,40 @@
 #  @date 22.06.2014
 #  @version 1.0
 
-from time import sleep
 import imp # to check if a module exists
 from PySide.QtCore import *
+from ledanimator import LedAnimator
 
 DELAY = 0.2 #seconds
 LONG_DELAY = 0.7
 
+## LEDs used by the animations
+LEDS = range(2, 8)
+
+## keyframes `(delay, on, off)` of the moving line of LEDs
+VALIDATED_SEQUENCE = [
+    (0, [7], []),
+    (DELAY, [6], []),
+    (DELAY, [5], [7]),
+    (DELAY, [4], [6]),
+    (DELAY, [3], [5]),
+    (DELAY, [2], [4]),
+    (DELAY, [], [3]),
+    (DELAY, [], [2]),
+]
+
+## keyframes `(delay, on, off)` of the blinking LEDs
+DENIED_SEQUENCE = [
+    (0, LEDS, []),
+    (DELAY, [], LEDS),
+    (DELAY, LEDS, []),
+    (DELAY, [], LEDS),
+    (LONG_DELAY, LEDS, []),
+    (DELAY, [], LEDS),
+    (DELAY, LEDS, []),
+    (DELAY, [], LEDS),
+]
+
 class PiFaceControl(QObject):
     """! @brief
     Control of the PiFace Digital module.
@@ -33,154 +60,123 @@ class PiFaceControl(QObject):
     ## Signal from the button 4
     b4 = Signal()
 
-    def __init__(self):
-        """! @brief Initialize the instance if the module is connected.
+    def __init__(self, module=None):
+        """! @brief Initialize the instance if the module is connected. The buttons are watched by a single
+        listener thread, started here and running until stop() is called.
         @param self the PiFaceControl instance
+        @param module the pifacedigitalio module to use instead of the installed one, e.g. fakepifacedigitalio, optional
         """
         QObject.__init__(self)
+        ## tell if the buttons are enabled, the events of the disabled buttons are dropped
+        self.listenerActivated = False
+        ## signals emitted by each input pin
+        self.buttons = {0: self.b1, 1: self.b2, 2: self.b3, 3: self.b4}
         try:
-            imp.find_module('pifacedigitalio')
+            if module is None:
+                imp.find_module('pifacedigitalio')
+                import pifacedigitalio
+                module = pifacedigitalio
             ## tell if the module PiFaceDigital is connected or not
             self.moduleFound = True
-            import pifacedigitalio
             ## exportation of the library in the class
-            self.pifacedigitalio = pifacedigitalio
+            self.pifacedigitalio = module
             ## instance of PiFaceDigital, access to the leds
-            self.pfd = pifacedigitalio.PiFaceDigital()
+            self.pfd = module.PiFaceDigital()
             for i in range(2, 8):
                 self.pfd.leds[i].turn_off()
+            ## animator playing the LED sequences without blocking
+            self.animator = LedAnimator(self.pfd.leds, LEDS, self)
             ## constant of the library for the falling edge detection
-            self.fallingEdge = pifacedigitalio.IODIR_FALLING_EDGE
-            ## tell if the button listener is activated or not
-            self.listenerActivated = False
+            self.fallingEdge = module.IODIR_FALLING_EDGE
+            ## listener of the four buttons, a single thread watching the chip
+            self.listener = module.InputEventListener(chip=self.pfd)
+            for pin in self.buttons:
+                self.listener.register(pin, self.fallingEdge, self.buttonPressed)
+            self.listener.activate()
         except ImportError:
             print 'The module pifacedigitalio is not installed'
             self.moduleFound = False
-            
-    def button1Pressed(self, event):
-        """! @brief Method called when button 1 is pressed.
-        @param self the PiFaceControl instance
-        @param event the event that trigger that method call
-        """
-        self.b1.emit()
-    
-    def button2Pressed(self, event):
-        """! @brief Method called when button 2 is pressed.
-        @param self the PiFaceControl instance
-        @param event the event that trigger that method call
-        """
-        self.b2.emit()
-    
-    def button3Pressed(self, event):
-        """! @brief Method called when button 3 is pressed.
-        @param self the PiFaceControl instance
-        @param event the event that trigger that method call
-        """
-        self.b3.emit()
-		
-    def button4Pressed(self, event):
-        """! @brief Method called when button 4 is pressed.
+
+    def buttonPressed(self, event):
+        """! @brief Method called by the listener thread when a button is pressed.
+        The signal of the button is emitted if the buttons are enabled.
         @param self the PiFaceControl instance
         @param event the event that trigger that method call
         """
-        self.b4.emit()
+        if self.listenerActivated:
+            self.buttons[event.pin_num].emit()
 
     def actionValidated(self):
         """! @brief Method called when an action is validated. It makes a moving line of LEDs.
+        The animation is played in the background, the method returns immediately.
         @param self the PiFaceControl instance
         """
         if self.moduleFound:
-            self.pfd.leds[7].turn_on()
-            sleep(DELAY)
-            self.pfd.leds[6].turn_on()
-            sleep(DELAY)
-            self.pfd.leds[5].turn_on()
-            self.pfd.leds[7].turn_off()
-            sleep(DELAY)
-            self.pfd.leds[4].turn_on()
-            self.pfd.leds[6].turn_off()
-            sleep(DELAY)
-            self.pfd.leds[3].turn_on()
-            self.pfd.leds[5].turn_off()
-            sleep(DELAY)
-            self.pfd.leds[2].turn_on()
-            self.pfd.leds[4].turn_off()
-            sleep(DELAY)
-            self.pfd.leds[3].turn_off()
-            sleep(DELAY)
-            self.pfd.leds[2].turn_off()
-            sleep(DELAY)
-            self.pfd.leds[2].turn_off()
+            self.animator.play(VALIDATED_SEQUENCE)
 
     def actionDenied(self):
         """! @brief Method called when an action is denied. It makes LED blinks.
+        The animation is played in the background, the method returns immediately.
         @param self the PiFaceControl instance
         """
         if self.moduleFound:
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_on()
-            sleep(DELAY)
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_off()
-            sleep(DELAY)
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_on()
-            sleep(DELAY)
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_off()
-
-            sleep(LONG_DELAY)
+            self.animator.play(DENIED_SEQUENCE)
 
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_on()
-            sleep(DELAY)
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_off()
-            sleep(DELAY)
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_on()
-            sleep(DELAY)
-            for i in range(2, 8):
-                self.pfd.leds[i].turn_off()
-                
     @Slot()
     def activateButtonListener(self):
-        """! @brief Slot called to activate the buttons listener.
+        """! @brief Slot called to enable the buttons. Only a flag is changed, the listener keeps running.
         @param self the PiFaceControl instance
         """
-        if self.moduleFound:
-            if self.listenerActivated == False:
-                # create new instances of the listener
-                ## listener fot the button 1
-                self.listener1 = self.pifacedigitalio.InputEventListener(chip=self.pfd)
-                ## listener fot the button 2
-                self.listener2 = self.pifacedigitalio.InputEventListener(chip=self.pfd)
-                ## listener fot the button 3
-                self.listener3 = self.pifacedigitalio.InputEventListener(chip=self.pfd)
-                ## listener fot the button 4
-                self.listener4 = self.pifacedigitalio.InputEventListener(chip=self.pfd) 
-                # registration of the button to the listener
-                self.listener1.register(0, self.fallingEdge, self.button1Pressed)
-                self.listener2.register(1, self.fallingEdge, self.button2Pressed)
-                self.listener3.register(2, self.fallingEdge, self.button3Pressed)
-                self.listener4.register(3, self.fallingEdge, self.button4Pressed)
-                # activation of the listening
-                self.listener1.activate()
-                self.listener2.activate()
-                self.listener3.activate()
-                self.listener4.activate()
-                self.listenerActivated = True
-	
-    @Slot()	
+        self.listenerActivated = True
+
+    @Slot()
     def deactivateButtonListener(self):
-        """! @brief Slot called to activate the buttons listener.
+        """! @brief Slot called to disable the buttons. Only a flag is changed, the listener keeps running.
         @param self the PiFaceControl instance
         """
+        self.listenerActivated = False
+
+    @Slot()
+    def stop(self):
+        """! @brief Slot called when the application quits. Stop the listener thread.
+        @param self the PiFaceControl instance
+        """
+        self.listenerActivated = False
         if self.moduleFound:
-            if self.listenerActivated == True:
-                # deactivation of the listening, kill the threads
-                self.listener1.deactivate()
-                self.listener2.deactivate()
-                self.listener3.deactivate()
-                self.listener4.deactivate()
-                self.listenerActivated = False
+            self.listener.deactivate()
+
+class NoPiFace(QObject):
+    """! @brief
+    PiFace of a dispensing bay without LEDs nor buttons : the PiFace Digital module signals the actions of the first bay only.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def actionValidated(self):
+        """! @brief Method called when an action is validated, nothing is displayed.
+        @param self the NoPiFace instance
+        """
+
+    def actionDenied(self):
+        """! @brief Method called when an action is denied, nothing is displayed.
+        @param self the NoPiFace instance
+        """
+
+    @Slot()
+    def activateButtonListener(self):
+        """! @brief Slot called to enable the buttons, the bay has none.
+        @param self the NoPiFace instance
+        """
+
+    @Slot()
+    def deactivateButtonListener(self):
+        """! @brief Slot called to disable the buttons, the bay has none.
+        @param self the NoPiFace instance
+        """
+
+    @Slot()
+    def stop(self):
+        """! @brief Slot called when the application quits.
+        @param self the NoPiFace instance
+        """
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file queryplans.py
+#  Diagnostic command checking that every query of the dispenser uses an index.
+
+## @package queryplans
+#  Verification of the query plans.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+from datetime import datetime
+
+from constants import *
+from database import DataBase
+from documents import historyQuery, HISTORY_SORT
+
+## sample values used to build the queries
+SAMPLE_DEVICE = 'AA BB CC DD'
+SAMPLE_USER = '00000000-0000-0000-0000-000000000000'
+
+## shapes of the queries made in action.py, journal.py and reconcile.py : (description, collection, filter, sort)
+QUERY_SHAPES = [
+    ('account by device', 'user', {"devices.uid": SAMPLE_DEVICE}, None),
+    ('guarded debit', 'user', {"devices": {"$elemMatch": {"uid": SAMPLE_DEVICE, "status": STA_DEVICE_ACTIVE}}, "balance": {"$gte": 2}}, None),
+    ('guarded recharge', 'user', {"devices": {"$elemMatch": {"uid": SAMPLE_DEVICE, "status": STA_DEVICE_ACTIVE}}}, None),
+    ('account by username', 'user', {"username": 'username'}, None),
+    ('device attach', 'user', {"username": 'username', "devices.uid": {"$ne": SAMPLE_DEVICE}}, None),
+    ('account by uid', 'user', {"uid": SAMPLE_USER}, None),
+    ('last transactions', 'transaction', historyQuery(SAMPLE_USER), HISTORY_SORT),
+    ('older transactions', 'transaction', historyQuery(SAMPLE_USER, (datetime.now(), 'key')), HISTORY_SORT),
+    ('since checkpoint', 'transaction', {"syncedAt": {"$gt": datetime.now()}}, None),
+    ('usage of a period', 'dispenserUsage', {"_id": {"$gte": DISPENSER_ID + ':20260101', "$lte": DISPENSER_ID + ':20261231'}}, None),
+    ('usage of a day', 'dispenserUsage', {"day": datetime(2026, 1, 1)}, None),
+]
+
+def collectionScan(plan):
+    """! @brief Function telling if a query plan scans the whole collection.
+    @param plan the result of `explain()`
+    """
+    if 'queryPlanner' in plan:
+        # MongoDB 3.0 and later : tree of stages
+        stages = [plan['queryPlanner']['winningPlan']]
+        while stages:
+            stage = stages.pop()
+            if stage.get('stage') == 'COLLSCAN':
+                return True
+            if 'inputStage' in stage:
+                stages.append(stage['inputStage'])
+            stages.extend(stage.get('inputStages', []))
+        return False
+    # MongoDB 2.x : BasicCursor for a collection scan, BtreeCursor <index> otherwise
+    return plan.get('cursor', '').startswith('BasicCursor')
+
+def planSummary(plan):
+    """! @brief Function describing the winning plan in one line.
+    @param plan the result of `explain()`
+    """
+    if 'queryPlanner' in plan:
+        stages = []
+        stage = plan['queryPlanner']['winningPlan']
+        while stage is not None:
+            stages.append(stage.get('stage', '?') + ('(' + stage['indexName'] + ')' if 'indexName' in stage else ''))
+            stage = stage.get('inputStage')
+        return ' <- '.join(stages)
+    return plan.get('cursor', '?')
+
+def main():
+    """! @brief Run `explain()` on every query shape. Exit with 1 if a query is not backed by an index."""
+    database = DataBase()
+    if not database.online:
+        print 'The database can\'t be reached.'
+        sys.exit(2)
+
+    failures = 0
+    for description, name, query, sort in QUERY_SHAPES:
+        cursor = database.user.database[name].find(query)
+        if sort is not None:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()
+        scan = collectionScan(plan)
+        if scan:
+            failures += 1
+        print '%-4s %-20s %-14s %s' % ('FAIL' if scan else 'ok', description, name, planSummary(plan))
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file readerpool.py
+#  Contains the classes PoolObserver and ReaderPool.
+
+## @package readerpool
+#  Pool of the PC/SC readers plugged in the Raspberry Pi, one dispensing bay per reader.
+#  Each reader has its own CardReader : its watcher thread, its session and its operations.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+from smartcard.System import readers as listReaders
+from smartcard.CardRequest import CardRequest
+from smartcard.ReaderMonitoring import ReaderMonitor, ReaderObserver
+from PySide.QtCore import *
+
+from constants import *
+from metrics import Metrics
+from cardreader import DCCardType
+
+class PoolObserver(ReaderObserver):
+    """! @brief
+    Observer of the readers plugged and unplugged, called by the monitoring thread of pyscard.
+    The changes are given to the pool with a queued signal.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, pool):
+        """! @brief Link the ReaderPool instance.
+        @param self the PoolObserver instance
+        @param pool the ReaderPool instance
+        """
+        ## link to the ReaderPool instance
+        self.pool = pool
+
+    def update(self, observable, actions):
+        """! @brief Method called by the monitoring thread when readers are plugged or unplugged.
+        @param self the PoolObserver instance
+        @param observable the ReaderMonitor instance
+        @param actions the readers added and the readers removed
+        """
+        added, removed = actions
+        self.pool.readersChanged.emit([str(reader) for reader in added], [str(reader) for reader in removed])
+
+class ReaderPool(QObject):
+    """! @brief
+    Find every PC/SC reader and serve each one with a CardReader, created by a factory given by the dispenser.
+    The readers plugged or unplugged while running are added or removed, the dispenser routes the signals of
+    each CardReader to the view of its bay with readerAdded and readerRemoved.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted when a reader is served (name of the reader, CardReader instance)
+    readerAdded = Signal(str, object)
+    ## Signal emitted when a reader is not served anymore, its CardReader is stopped (name of the reader, CardReader instance)
+    readerRemoved = Signal(str, object)
+    ## Signal emitted by the monitoring thread (names of the readers plugged, names of the readers unplugged)
+    readersChanged = Signal(list, list)
+
+    def __init__(self, createReader, multi=MULTI_READER, parent=None):
+        """! @brief Initialize the pool, without any reader.
+        @param self the ReaderPool instance
+        @param createReader function creating the CardReader of a reader, called with the name of the reader and its card request
+        @param multi serve every reader, only the first one otherwise
+        @param parent the parent QObject, optional
+        """
+        QObject.__init__(self, parent)
+        ## function creating the CardReader of a reader
+        self.createReader = createReader
+        ## serve every reader, only the first one otherwise
+        self.multi = multi
+        ## CardReader instances by name of reader
+        self.readers = {}
+        ## names of the readers served, in the order they were added
+        self.order = []
+        ## number of readers added
+        self.added = 0
+        ## number of readers removed
+        self.removed = 0
+        ## observer of the readers plugged and unplugged
+        self.observer = PoolObserver(self)
+        ## monitor of the PC/SC readers, None until the pool is started
+        self.monitor = None
+        self.readersChanged.connect(self.updateReaders)
+        Metrics().register('readerPool', self.counters)
+
+    def start(self, names=None):
+        """! @brief Method serving the readers plugged and watching the readers plugged or unplugged.
+        @param self the ReaderPool instance
+        @param names names of the readers plugged, listed by pyscard by default
+        """
+        if names is None:
+            names = [str(reader) for reader in listReaders()]
+        self.updateReaders(names, [])
+        # the monitoring thread reports the readers already served too, they are ignored
+        self.monitor = ReaderMonitor()
+        self.monitor.addObserver(self.observer)
+
+    @Slot()
+    def stop(self):
+        """! @brief Slot to stop watching the readers and to stop every CardReader.
+        @param self the ReaderPool instance
+        """
+        if self.monitor is not None:
+            self.monitor.deleteObserver(self.observer)
+            self.monitor = None
+        for name in list(self.order):
+            self.removeReader(name)
+
+    @Slot(list, list)
+    def updateReaders(self, added, removed):
+        """! @brief Slot called on the UI thread when readers are plugged or unplugged.
+        @param self the ReaderPool instance
+        @param added names of the readers plugged
+        @param removed names of the readers unplugged
+        """
+        for name in removed:
+            if name in self.readers:
+                self.removeReader(name)
+        for name in added:
+            if name not in self.readers and (self.multi or not self.readers):
+                self.addReader(name)
+
+    def addReader(self, name):
+        """! @brief Method creating and starting the CardReader of a reader.
+        @param self the ReaderPool instance
+        @param name name of the reader
+        """
+        try:
+            cardrequest = CardRequest(timeout=CARD_REQUEST_TIMEOUT, readers=[name], cardType=DCCardType())
+            cardReader = self.createReader(name, cardrequest)
+        except Exception, e:
+            print "Error: could not serve the reader %s: %s" % (name, e)
+            return
+        self.readers[name] = cardReader
+        self.order.append(name)
+        self.added += 1
+        print "Reader added: %s" % name
+        self.readerAdded.emit(name, cardReader)
+        cardReader.start()
+
+    def removeReader(self, name):
+        """! @brief Method stopping the CardReader of a reader.
+        @param self the ReaderPool instance
+        @param name name of the reader
+        """
+        cardReader = self.readers.pop(name)
+        self.order.remove(name)
+        self.removed += 1
+        cardReader.stop()
+        cardReader.asyncAction.cancelSession()
+        print "Reader removed: %s" % name
+        self.readerRemoved.emit(name, cardReader)
+
+    def counters(self):
+        """! @brief Method to get the counters of the pool.
+        @param self the ReaderPool instance
+        """
+        return {'readers': len(self.readers), 'added': self.added, 'removed': self.removed}
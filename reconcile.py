@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file reconcile.py
+#  Contains the class Reconciler and the command reconciling the balances with the transactions.
+
+## @package reconcile
+#  Reconciliation of the balances. The balance of an account is changed with `$inc`, separately from the insert of
+#  its transaction : a crash between the two writes leaves them out of sync. The transactions are summed by user
+#  with an aggregation and compared with the balances. The sums are kept in the collection *ledger* up to a checkpoint
+#  on the date the transactions were written (*syncedAt*), so that each run aggregates only the transactions written
+#  since the previous one, those made offline long before included.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import argparse
+from datetime import datetime, timedelta
+import pymongo
+
+from constants import *
+from database import DataBase, aggregateRows
+from archive import ROLLUP_COLLECTION
+
+## identifier of the checkpoint in the collection *reconciliation*
+CHECKPOINT_ID = 'checkpoint'
+## date before any transaction, checkpoint of a ledger never built
+EPOCH = datetime(1970, 1, 1)
+
+def sumsByUser(collection, since, until=None):
+    """! @brief Function summing the recharges and the withdrawals of each user, for the transactions written during a period.
+    The transactions are selected with the index on the date of the write, or on the transaction date for the
+    transactions written before the date of the write was kept.
+    @param collection the collection *transaction*
+    @param since only the transactions written after this date
+    @param until only the transactions written until this date (included), all the newer transactions by default
+    @return dictionary `{userId: {'recharges': ..., 'withdrawals': ..., 'count': ...}}`
+    """
+    period = {'$gt': since}
+    if until is not None:
+        period['$lte'] = until
+    pipeline = [
+        {'$match': {'$or': [{'syncedAt': period}, {'syncedAt': {'$exists': False}, 'transactionDate': period}]}},
+        {'$group': {
+            '_id': '$userId',
+            'recharges': {'$sum': {'$cond': [{'$eq': ['$transactionType', RECHARGE]}, '$amount', 0]}},
+            'withdrawals': {'$sum': {'$cond': [{'$eq': ['$transactionType', WITHDRAWAL]}, '$amount', 0]}},
+            'count': {'$sum': 1},
+        }},
+    ]
+    sums = {}
+    for row in aggregateRows(collection, pipeline):
+        sums[row['_id']] = {'recharges': row['recharges'], 'withdrawals': row['withdrawals'], 'count': row['count']}
+    return sums
+
+class Reconciler(object):
+    """! @brief
+    Compare the balance of each account with the sum of its transactions.
+    The transactions written before the settle window are added to the ledger and the checkpoint moves to the end of
+    the window : they are aggregated once. The newer ones are aggregated at each run. An account used or with
+    transactions written within the settle window may still have transactions in the journal of a dispenser : it is
+    reported as unsettled and never fixed.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database=None, settle=RECONCILE_SETTLE_WINDOW):
+        """! @brief Link the database.
+        @param self the Reconciler instance
+        @param database the database, DataBase() by default
+        @param settle settle window, in seconds
+        """
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+        ## MongoDB database containing the collections
+        db = self.database.user.database
+        ## collection keeping the sums of the transactions of each user until the checkpoint
+        self.ledger = db['ledger']
+        ## collection keeping the checkpoint and the summary of each run
+        self.runs = db['reconciliation']
+        ## settle window
+        self.settle = timedelta(seconds=settle)
+
+    def seed(self):
+        """! @brief Method to start the ledger with the rollups of the archived months, their transactions are not in the
+        collection *transaction* anymore.
+        @param self the Reconciler instance
+        """
+        pipeline = [{'$group': {'_id': '$userId', 'recharges': {'$sum': '$recharged'}, 'withdrawals': {'$sum': '$withdrawn'},
+            'count': {'$sum': '$count'}}}]
+        db = self.database.user.database
+        for row in aggregateRows(db[ROLLUP_COLLECTION], pipeline):
+            self.ledger.update({'_id': row['_id']}, {'$set': {'recharges': row['recharges'], 'withdrawals': row['withdrawals'],
+                'count': row['count'], 'until': EPOCH}}, upsert=True)
+
+    def checkpoint(self):
+        """! @brief Method to get the period of the transactions to add to the ledger.
+        @param self the Reconciler instance
+        @return the date of write until which the transactions are in the ledger and the end of the new period.
+        The end of the period of an interrupted run is kept, so that it is not added twice.
+        """
+        document = self.runs.find_one({'_id': CHECKPOINT_ID}) or {}
+        since = document.get('syncedAt', document.get('transactionDate', EPOCH))
+        until = document.get('pending') or max(since, datetime.now() - self.settle)
+        return since, until
+
+    def rebuild(self):
+        """! @brief Method to empty the ledger, the next run aggregates the whole history, archives included.
+        @param self the Reconciler instance
+        """
+        self.ledger.remove({})
+        self.runs.remove({'_id': CHECKPOINT_ID})
+
+    def advance(self, since, until):
+        """! @brief Method to add the transactions of a period to the ledger and to move the checkpoint.
+        The sums of a user are added once for a given end of period, a run interrupted can be run again.
+        @param self the Reconciler instance
+        @param since the checkpoint
+        @param until the new checkpoint
+        @return the number of transactions added
+        """
+        self.runs.update({'_id': CHECKPOINT_ID}, {'$set': {'pending': until}}, upsert=True)
+        count = 0
+        for userId, sums in sumsByUser(self.database.transaction, since, until).iteritems():
+            count += sums['count']
+            try:
+                self.ledger.update({'_id': userId, 'until': {'$ne': until}},
+                    {'$inc': sums, '$set': {'until': until}}, upsert=True)
+            except pymongo.errors.DuplicateKeyError:
+                # already added by an interrupted run
+                pass
+        self.runs.update({'_id': CHECKPOINT_ID}, {'$set': {'syncedAt': until}, '$unset': {'pending': 1, 'transactionDate': 1}})
+        return count
+
+    def compare(self, since):
+        """! @brief Method to compare the balance of each account with the sum of its transactions.
+        @param self the Reconciler instance
+        @param since the checkpoint, the newer transactions are aggregated
+        @return the discrepancies, a dictionary for each account, and the users of the ledger without account
+        """
+        recent = sumsByUser(self.database.transaction, since)
+        ledger = dict((document['_id'], document) for document in self.ledger.find())
+        unsettledSince = datetime.now() - self.settle
+        discrepancies = []
+        for user in self.database.user.find({}, {'uid': 1, 'username': 1, 'balance': 1, 'recentTransactions': 1}):
+            expected = 0
+            written = recent.pop(user['uid'], None)
+            for sums in (ledger.pop(user['uid'], None), written):
+                if sums is not None:
+                    expected += sums['recharges'] - sums['withdrawals']
+            if user['balance'] == expected:
+                continue
+            last = user.get('recentTransactions') or [{}]
+            lastDate = last[-1].get('transactionDate')
+            # used within the window, or with transactions written within it (e.g. offline ones synchronised late)
+            settled = (lastDate is None or lastDate <= unsettledSince) and written is None
+            discrepancies.append({'uid': user['uid'], 'username': user['username'], 'balance': user['balance'],
+                'expected': expected, 'difference': user['balance'] - expected, 'lastTransaction': lastDate,
+                'settled': settled})
+        orphans = set(ledger) | set(recent)
+        return discrepancies, orphans
+
+    def fix(self, discrepancy):
+        """! @brief Method to set the balance of an account to the sum of its transactions.
+        The balance is changed only if it has not changed since it was compared.
+        @param self the Reconciler instance
+        @param discrepancy the discrepancy of the account
+        @return True if the balance has been fixed
+        """
+        result = self.database.user.update({'uid': discrepancy['uid'], 'balance': discrepancy['balance']},
+            {'$inc': {'balance': -discrepancy['difference']}})
+        return bool(result and result.get('n'))
+
+    def run(self, fix=False):
+        """! @brief Method to reconcile the balances.
+        @param self the Reconciler instance
+        @param fix fix the balances of the settled accounts
+        @return the summary of the run, with the discrepancies
+        """
+        if self.runs.find_one({'_id': CHECKPOINT_ID}) is None:
+            # first run or ledger rebuilt
+            self.seed()
+        since, until = self.checkpoint()
+        added = self.advance(since, until) if until > since else 0
+        discrepancies, orphans = self.compare(until)
+        fixed = 0
+        if fix:
+            for discrepancy in discrepancies:
+                discrepancy['fixed'] = discrepancy['settled'] and self.fix(discrepancy)
+                fixed += discrepancy['fixed']
+        summary = {'kind': 'run', 'runDate': datetime.now(), 'since': since, 'until': until, 'transactions': added,
+            'discrepancies': len(discrepancies), 'fixed': fixed, 'orphans': len(orphans)}
+        self.runs.insert(dict(summary, fixes=[d for d in discrepancies if d.get('fixed')]))
+        summary['details'] = discrepancies
+        return summary
+
+def main():
+    """! @brief Command line reconciling the balances. Exit with 1 if a discrepancy is left."""
+    parser = argparse.ArgumentParser(description='Compare the balances of the accounts with the sums of their transactions.')
+    parser.add_argument('--fix', action='store_true', help='set the balances of the settled accounts to the sums of their transactions')
+    parser.add_argument('--settle', type=int, default=RECONCILE_SETTLE_WINDOW, help='settle window, in seconds')
+    parser.add_argument('--full', action='store_true', help='rebuild the ledger from the whole history')
+    args = parser.parse_args()
+
+    database = DataBase()
+    if not database.online:
+        print 'The database can\'t be reached.'
+        sys.exit(2)
+
+    reconciler = Reconciler(database, args.settle)
+    if args.full:
+        reconciler.rebuild()
+    summary = reconciler.run(args.fix)
+
+    print 'transactions from %s to %s : %d added to the ledger' % (summary['since'], summary['until'], summary['transactions'])
+    print '%-36s %-16s %10s %10s %10s  %-9s %s' % ('uid', 'username', 'balance', 'expected', 'difference', 'state', 'last transaction')
+    for d in summary['details']:
+        state = 'fixed' if d.get('fixed') else ('settled' if d['settled'] else 'unsettled')
+        print '%-36s %-16s %10g %10g %+10g  %-9s %s' % (d['uid'], d['username'], d['balance'], d['expected'], d['difference'],
+            state, d['lastTransaction'] or '')
+    print '%d discrepancies, %d fixed, %d users of the ledger without account' % (summary['discrepancies'], summary['fixed'], summary['orphans'])
+    sys.exit(1 if summary['discrepancies'] > summary['fixed'] else 0)
+
+if __name__ == '__main__':
+    main()
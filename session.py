@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file session.py
+#  Contains the class SessionManager.
+
+## @package session
+#  Sessions of the customers in front of the reader.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import threading
+from time import time
+from concurrent.futures import Future
+
+from constants import *
+from metrics import Metrics
+
+class SessionManager(object):
+    """! @brief
+    Session of the card in front of the reader. The same card read again within the session window
+    belongs to the same session : its account is served from memory, without any query.
+    A purchase requested while a purchase of the session is running, or the same purchase requested just after it,
+    is a duplicate (e.g. a PiFace button and a Qt button fired together) and is collapsed into the first one.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, window=SESSION_WINDOW, debounce=PURCHASE_DEBOUNCE, name='session'):
+        """! @brief Initialize the manager, without any session.
+        @param self the SessionManager instance
+        @param window time during which the account of the session is served from memory, in seconds
+        @param debounce time after a purchase during which the same purchase is a duplicate, in seconds
+        @param name name of the counters in the metrics, one per reader
+        """
+        ## time during which the account of the session is served from memory, in seconds
+        self.window = window
+        ## time after a purchase during which the same purchase is a duplicate, in seconds
+        self.debounce = debounce
+        ## lock protecting the session, used by the card watcher thread and the UI thread
+        self.lock = threading.Lock()
+        ## identifier of the device of the session, None if there is no session
+        self.deviceId = None
+        ## account of the session
+        self.account = None
+        ## time when the account has been loaded from the database
+        self.loaded = 0
+        ## future of the last purchase of the session
+        self.purchase = None
+        ## amount of the last purchase of the session
+        self.purchaseAmount = None
+        ## time of the last purchase of the session
+        self.purchaseTime = 0
+        ## number of sessions started
+        self.sessions = 0
+        ## number of reads of the card served from memory
+        self.suppressedReads = 0
+        ## number of purchases collapsed into a previous one
+        self.suppressedPurchases = 0
+        Metrics().register(name, self.counters)
+
+    def cachedAccount(self, deviceId):
+        """! @brief Method to get the account of a card read again within the session window.
+        @param self the SessionManager instance
+        @param deviceId identifier of the device read
+        @return the account of the session, None if the device starts a new session
+        """
+        with self.lock:
+            if deviceId != self.deviceId or self.account is None or time() - self.loaded > self.window:
+                return None
+            self.suppressedReads += 1
+            account = self.account
+        Metrics().increment('suppressed_total', labels={'event': 'read'})
+        return account
+
+    def begin(self, deviceId, account):
+        """! @brief Method to start a session with the account loaded from the database.
+        @param self the SessionManager instance
+        @param deviceId identifier of the device read
+        @param account the account, None if the device is not linked to any account
+        """
+        with self.lock:
+            if deviceId != self.deviceId:
+                self.sessions += 1
+                self.purchase = None
+                self.purchaseAmount = None
+                self.purchaseTime = 0
+            self.deviceId = deviceId
+            # the offline accounts depend on the journal, they are never served from memory
+            self.account = account if account is not None and not account.get('offline') else None
+            self.loaded = time()
+
+    def update(self, account):
+        """! @brief Method to replace the account of the session after a transaction or a recharge.
+        @param self the SessionManager instance
+        @param account the account returned by the operation, None if it has been refused
+        """
+        with self.lock:
+            if account is None or account.get('offline') or self.account is None or account.get('uid') != self.account.get('uid'):
+                # unknown state, the next read will query the database
+                self.account = None
+                return
+            self.account = account
+            self.loaded = time()
+
+    def end(self):
+        """! @brief Method to end the session, e.g. when another card is expected.
+        @param self the SessionManager instance
+        """
+        with self.lock:
+            self.deviceId = None
+            self.account = None
+            self.purchase = None
+            self.purchaseAmount = None
+            self.purchaseTime = 0
+
+    def requestPurchase(self, deviceId, amount, submit):
+        """! @brief Method to make a purchase, unless it duplicates the last purchase of the session.
+        @param self the SessionManager instance
+        @param deviceId identifier of the device of the session
+        @param amount amount of the purchase
+        @param submit function making the purchase, `submit(deviceId, amount)`, returning a future
+        @return the future of the purchase, the one of the previous purchase for a duplicate
+        """
+        with self.lock:
+            if deviceId == self.deviceId and self.purchase is not None:
+                if not self.purchase.done() or (amount == self.purchaseAmount and time() - self.purchaseTime < self.debounce):
+                    self.suppressedPurchases += 1
+                    Metrics().increment('suppressed_total', labels={'event': 'purchase'})
+                    return self.purchase
+            # the session belongs to this device from now on
+            self.deviceId = deviceId
+            self.purchase = Future()
+            self.purchaseAmount = amount
+            self.purchaseTime = time()
+            placeholder = self.purchase
+        # submitted outside of the lock, the result can come back on another thread
+        future = submit(deviceId, amount)
+        with self.lock:
+            if self.purchase is placeholder:
+                self.purchase = future
+        return future
+
+    def counters(self):
+        """! @brief Method to get the counters of the sessions.
+        @param self the SessionManager instance
+        """
+        with self.lock:
+            return {'sessions': self.sessions, 'suppressedReads': self.suppressedReads, 'suppressedPurchases': self.suppressedPurchases}
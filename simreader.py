@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file simreader.py
+#  Contains the classes SimulatedCard, SimulatedConnection, SimulatedCardService and SimulatedCardRequest.
+
+## @package simreader
+#  Simulated PC/SC reader, replaying scripted cards without any hardware.
+#  It has the part of the pyscard API used by CardReader.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import Queue
+from time import time, sleep
+
+from constants import *
+from cardstrategy import toBytes
+
+try:
+    # the exceptions caught by CardReader when pyscard is installed
+    from smartcard.Exceptions import CardRequestTimeoutException, CardRequestException, CardConnectionException, NoCardException
+except ImportError:
+    # without pyscard, CardReader catches these ones
+    class SmartcardException(Exception):
+        """! @brief Error of the reader or of the card, as pyscard.
+        @param message description of the error
+        @param hresult PC/SC error code
+        """
+        def __init__(self, message='', hresult=-1):
+            Exception.__init__(self, message)
+            ## PC/SC error code
+            self.hresult = hresult
+
+    class CardRequestTimeoutException(SmartcardException):
+        """! @brief No card has been presented before the timeout, as pyscard."""
+
+    class CardRequestException(SmartcardException):
+        """! @brief The reader could not wait for a card, as pyscard."""
+
+    class CardConnectionException(SmartcardException):
+        """! @brief The connection with the card failed, as pyscard."""
+
+    class NoCardException(SmartcardException):
+        """! @brief The card has been removed, as pyscard."""
+
+## Mifare smartcard : the SELECT of the Android AID fails, the UID is read with GET_UID
+MIFARE = 0
+## Android smartphone with host card emulation : the UID is the answer to the SELECT of the Android AID
+ANDROID = 1
+## card answering every APDU with error status words
+ERROR = 2
+## card removed before the reader could connect to it
+REMOVED = 3
+
+## ATR of a Mifare 1K seen by an ACR122U
+MIFARE_ATR = '3B 8F 80 01 80 4F 0C A0 00 00 03 06 03 00 01 00 00 00 00 6A'
+## ATR of an Android smartphone seen by an ACR122U
+ANDROID_ATR = '3B 80 80 01 01'
+
+## default time taken by the reader to exchange an APDU, in seconds (about 15 ms with an ACR122U)
+APDU_DELAY = 0.015
+
+class SimulatedCard(object):
+    """! @brief
+    Card replayed by the simulated reader.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, uid, kind=MIFARE, atr=None, sw=(0x6A, 0x82)):
+        """! @brief Describe the card.
+        @param self the SimulatedCard instance
+        @param uid identifier of the card, e.g. `04 A2 3B 12`
+        @param kind MIFARE, ANDROID, ERROR or REMOVED
+        @param atr ATR of the card, depends on the kind by default
+        @param sw status words answered by an ERROR card
+        """
+        ## identifier of the card
+        self.uid = uid
+        ## kind of the card
+        self.kind = kind
+        ## ATR of the card
+        self.atr = atr or (ANDROID_ATR if kind == ANDROID else MIFARE_ATR)
+        ## status words answered by an ERROR card
+        self.sw = sw
+        ## time when the card has been presented to the reader, set by SimulatedCardRequest
+        self.presented = None
+
+    def answer(self, apdu):
+        """! @brief Method to get the answer of the card to an APDU.
+        @param self the SimulatedCard instance
+        @param apdu the APDU sent by the reader
+        @return the response and the status words
+        """
+        if self.kind == ERROR:
+            return [], self.sw[0], self.sw[1]
+        if apdu[:len(CLA_INS_P1_P2)] == CLA_INS_P1_P2:
+            if self.kind == ANDROID:
+                return toBytes(self.uid), 0x90, 0x00
+            # the ACR122U answers nothing, pyscard fails to read the status words
+            raise IndexError('list index out of range')
+        if apdu == GET_UID:
+            return toBytes(self.uid), 0x90, 0x00
+        # instruction not supported
+        return [], 0x6D, 0x00
+
+class SimulatedConnection(object):
+    """! @brief
+    Connection to a simulated card, in the style of smartcard.CardConnection.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, card, delay=APDU_DELAY):
+        """! @brief Link the card.
+        @param self the SimulatedConnection instance
+        @param card the SimulatedCard instance
+        @param delay time taken to exchange an APDU, in seconds
+        """
+        ## link to the SimulatedCard instance
+        self.card = card
+        ## time taken to exchange an APDU, in seconds
+        self.delay = delay
+        ## number of APDU exchanged
+        self.transmitted = 0
+
+    def connect(self, protocol=None, mode=None, disposition=None):
+        """! @brief Method to connect to the card.
+        @param self the SimulatedConnection instance
+        """
+        if self.card.kind == REMOVED:
+            raise NoCardException('card removed', -1)
+
+    def disconnect(self):
+        """! @brief Method to disconnect from the card.
+        @param self the SimulatedConnection instance
+        """
+        pass
+
+    def getATR(self):
+        """! @brief Method to get the ATR of the card.
+        @param self the SimulatedConnection instance
+        """
+        return toBytes(self.card.atr)
+
+    def transmit(self, bytes, protocol=None):
+        """! @brief Method to send an APDU to the card.
+        @param self the SimulatedConnection instance
+        @param bytes the APDU
+        @return the response and the status words
+        """
+        self.transmitted += 1
+        if self.delay:
+            sleep(self.delay)
+        return self.card.answer(bytes)
+
+class SimulatedCardService(object):
+    """! @brief
+    Service of a simulated card, in the style of smartcard.CardService.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, connection):
+        """! @brief Link the connection.
+        @param self the SimulatedCardService instance
+        @param connection the SimulatedConnection instance
+        """
+        ## connection to the card
+        self.connection = connection
+
+class SimulatedCardRequest(object):
+    """! @brief
+    Simulated reader, in the style of smartcard.CardRequest. The cards are presented in order,
+    from a script given at creation or one by one with present(). Can be used from several threads.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, cards=(), timeout=CARD_REQUEST_TIMEOUT, delay=APDU_DELAY):
+        """! @brief Create the reader and present the scripted cards.
+        @param self the SimulatedCardRequest instance
+        @param cards the SimulatedCard instances to present, in order
+        @param timeout time waited for a card by waitforcard, in seconds
+        @param delay time taken to exchange an APDU, in seconds
+        """
+        ## time waited for a card, in seconds
+        self.timeout = timeout
+        ## time taken to exchange an APDU, in seconds
+        self.delay = delay
+        ## cards presented and not read yet
+        self.cards = Queue.Queue()
+        for card in cards:
+            self.present(card)
+
+    def present(self, card):
+        """! @brief Method to present a card to the reader. The time is recorded in the card.
+        @param self the SimulatedCardRequest instance
+        @param card the SimulatedCard instance
+        """
+        card.presented = time()
+        self.cards.put(card)
+
+    def waitforcard(self):
+        """! @brief Method to wait for the next card.
+        @param self the SimulatedCardRequest instance
+        @return the SimulatedCardService of the card
+        """
+        try:
+            card = self.cards.get(timeout=self.timeout)
+        except Queue.Empty:
+            raise CardRequestTimeoutException()
+        return SimulatedCardService(SimulatedConnection(card, self.delay))
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file singleton.py
+#  Contains the class SingletonType.
+
+## @package singleton
+#  Singleton type, without any dependency : it can be imported before the database driver.
+#  @author CASAS Jacky
+#  @date 22.06.2014
+#  @version 1.0
+
+class SingletonType(type):
+    """! @brief
+    Singleton type. 
+    @author CASAS Jacky
+    @date 22.06.14
+    @version 1.0
+    """
+    def __call__(cls, *args, **kwargs):
+        """! @brief Override of the `__call__` method."""
+        try:
+            return cls.__instance
+        except AttributeError:
+            cls.__instance = super(SingletonType, cls).__call__(*args, **kwargs)
+            return cls.__instance
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file transactionmodel.py
+#  Contains the class TransactionModel.
+
+## @package transactionmodel
+#  Model of the transactions displayed in the Frame.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+from array import array
+from time import mktime
+from datetime import datetime
+from PySide.QtCore import *
+
+from constants import *
+
+## titles of the columns
+COLUMNS = ['date', 'amount', 'currency']
+## format of the date of a transaction
+DATE_FORMAT = "%a %e %b %Y, %H:%M:%S"
+## currency of the amounts
+CURRENCY = 'CHF'
+
+class TransactionModel(QAbstractTableModel):
+    """! @brief
+    Transactions of the card in front of the reader, newest first. The transactions are kept in columns of numbers
+    (date, amount and type) and formatted only when a cell is displayed. The older transactions are fetched
+    page by page when the view is scrolled to the bottom : fetchMore emits moreRequested, the page is added by
+    appendTransactions. If a page never comes (database unreachable), nothing more is fetched until the
+    transactions are displayed again.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted to request the next page of the history
+    moreRequested = Signal()
+
+    def __init__(self, parent=None):
+        """! @brief Initialize the empty model.
+        @param self the TransactionModel instance
+        @param parent the parent QObject, optional
+        """
+        QAbstractTableModel.__init__(self, parent)
+        ## identifier of the device of the transactions
+        self.deviceId = None
+        ## dates of the transactions, in seconds since the epoch
+        self.dates = array('d')
+        ## amounts of the transactions
+        self.amounts = array('d')
+        ## types of the transactions, RECHARGE or WITHDRAWAL
+        self.types = array('b')
+        ## tell if the whole history is loaded
+        self.complete = True
+        ## tell if a page has been requested and not received yet
+        self.fetching = False
+
+    def append(self, transactions):
+        """! @brief Method to add transactions at the end of the columns.
+        @param self the TransactionModel instance
+        @param transactions the transactions, as read in the database
+        """
+        for transaction in transactions:
+            date = transaction['transactionDate']
+            self.dates.append(mktime(date.timetuple()) + date.microsecond / 1e6)
+            self.amounts.append(transaction['amount'])
+            self.types.append(transaction['transactionType'])
+
+    @Slot(object, list, bool)
+    def setTransactions(self, deviceId, transactions, complete):
+        """! @brief Slot replacing the transactions by the most recent ones of a device.
+        @param self the TransactionModel instance
+        @param deviceId identifier of the device
+        @param transactions the most recent transactions, newest first
+        @param complete True if there is no older transaction
+        """
+        self.beginResetModel()
+        self.deviceId = deviceId
+        self.dates = array('d')
+        self.amounts = array('d')
+        self.types = array('b')
+        self.append(transactions)
+        self.complete = complete
+        self.fetching = False
+        self.endResetModel()
+
+    @Slot(object, list, bool)
+    def appendTransactions(self, deviceId, transactions, complete):
+        """! @brief Slot adding a page of older transactions.
+        Pages which were not requested by this model are ignored.
+        @param self the TransactionModel instance
+        @param deviceId identifier of the device
+        @param transactions the page of transactions, newest first
+        @param complete True if there is no older transaction
+        """
+        if not self.fetching or deviceId != self.deviceId:
+            return
+        self.fetching = False
+        self.complete = complete
+        if transactions:
+            first = len(self.dates)
+            self.beginInsertRows(QModelIndex(), first, first + len(transactions) - 1)
+            self.append(transactions)
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        """! @brief Method returning the number of transactions loaded.
+        @param self the TransactionModel instance
+        @param parent the parent index, the model is a flat table
+        """
+        return 0 if parent.isValid() else len(self.dates)
+
+    def columnCount(self, parent=QModelIndex()):
+        """! @brief Method returning the number of columns.
+        @param self the TransactionModel instance
+        @param parent the parent index, the model is a flat table
+        """
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """! @brief Method formatting a cell.
+        @param self the TransactionModel instance
+        @param index index of the cell
+        @param role role of the data
+        """
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return datetime.fromtimestamp(self.dates[row]).strftime(DATE_FORMAT)
+            if column == 1:
+                return ('+' if self.types[row] == RECHARGE else '-') + '%g' % self.amounts[row]
+            return CURRENCY
+        if role == Qt.TextAlignmentRole and column == 1:
+            return Qt.AlignVCenter | Qt.AlignRight
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """! @brief Method returning the titles of the columns and the numbers of the rows.
+        @param self the TransactionModel instance
+        @param section number of the column or of the row
+        @param orientation Qt.Horizontal or Qt.Vertical
+        @param role role of the data
+        """
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        """! @brief Method telling the view if older transactions can be requested.
+        @param self the TransactionModel instance
+        @param parent the parent index, the model is a flat table
+        """
+        return not parent.isValid() and self.deviceId is not None and not self.complete and not self.fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        """! @brief Method called by the view to request the next page of the history.
+        @param self the TransactionModel instance
+        @param parent the parent index, the model is a flat table
+        """
+        if self.canFetchMore(parent):
+            self.fetching = True
+            self.moreRequested.emit()
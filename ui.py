@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 ## @file ui.py
-#  Contains the class Frame.
+#  Contains the classes WaitingLabel, PageStack and Frame.
 
 ## @package ui
 #  Graphical User Interface made with PySide.
@@ -16,6 +16,101 @@ from PySide import QtGui
 from PySide.QtGui import *
 from PySide.QtCore import *
 from constants import *
+from metrics import Metrics, timed
+from transactionmodel import TransactionModel
+from uistate import UiState, UiEventCounter, CONNECTING, IDLE, CARD, WARNING, TRANSACTIONS, MAIN, LOGIN, ADMIN, \
+    USER_PAGE, TRANSACTIONS_PAGE, LOGIN_PAGE, ADMIN_PAGE
+
+class WaitingLabel(QtGui.QLabel):
+    """! @brief
+    Label displaying the status of the reader. The dots of the *waiting* animation are painted after the text :
+    changing them repaints the label only, the size of the label and the layout of the window do not change.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, text, parent=None):
+        """! @brief WaitingLabel constructor, without any dot.
+        @param self the WaitingLabel instance
+        @param text text of the label
+        @param parent the parent QWidget, optional
+        """
+        QtGui.QLabel.__init__(self, text, parent)
+        ## number of dots painted after the text
+        self.dots = 0
+
+    def setDots(self, dots):
+        """! @brief Method to change the number of dots, only the label is repainted.
+        @param self the WaitingLabel instance
+        @param dots number of dots
+        """
+        self.dots = dots
+        QtGui.QLabel.update(self)
+
+    def paintEvent(self, event):
+        """! @brief Called to paint the label, the dots are painted after the centered text.
+        @param self the WaitingLabel instance
+        @param event the event
+        """
+        QtGui.QLabel.paintEvent(self, event)
+        if self.dots:
+            painter = QtGui.QPainter(self)
+            rect = self.contentsRect()
+            x = rect.center().x() + self.fontMetrics().width(self.text()) / 2
+            painter.drawText(QRect(x, rect.top(), rect.right() - x, rect.height()), Qt.AlignLeft | Qt.AlignVCenter,
+                ' ' + self.dots * '.')
+            painter.end()
+
+class PageStack(QtGui.QStackedWidget):
+    """! @brief
+    Stack of the pages of the Frame, only the current page is laid out and painted.
+    A page is built by its builder the first time it is displayed.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+    ## Signal emitted with a page when it has been built
+    pageBuilt = Signal(object)
+
+    def __init__(self, parent=None):
+        """! @brief PageStack constructor, without any page built.
+        @param self the PageStack instance
+        @param parent the parent QWidget, optional
+        """
+        QtGui.QStackedWidget.__init__(self, parent)
+        ## functions building each page, by name
+        self.builders = {}
+        ## pages already built, by name
+        self.built = {}
+
+    def addPage(self, name, builder):
+        """! @brief Method to add a page, it is not built yet.
+        @param self the PageStack instance
+        @param name name of the page
+        @param builder function returning the QWidget of the page
+        """
+        self.builders[name] = builder
+
+    def page(self, name):
+        """! @brief Method to get a page, built if needed.
+        @param self the PageStack instance
+        @param name name of the page
+        """
+        page = self.built.get(name)
+        if page is None:
+            page = self.builders[name]()
+            self.built[name] = page
+            self.addWidget(page)
+            self.pageBuilt.emit(page)
+        return page
+
+    def setPage(self, name):
+        """! @brief Method to display a page.
+        @param self the PageStack instance
+        @param name name of the page
+        """
+        self.setCurrentWidget(self.page(name))
 
 class Frame(QtGui.QWidget):
     """! @brief
@@ -28,6 +123,14 @@ class Frame(QtGui.QWidget):
     activateButton = Signal()
     ## Signal used to deactivate PiFace buttons
     deactivateButton = Signal()
+    ## Signal emitted to recharge the account of the card (amount)
+    rechargeRequested = Signal(int)
+    ## Signal emitted to create an account (username, name, surname)
+    createAccountRequested = Signal(str, str, str)
+    ## Signal emitted to link the card to an account (username)
+    addDeviceRequested = Signal(str)
+    ## Signal emitted to display the usage of the dispenser today
+    usageRequested = Signal()
     
     def __init__(self, parent=None):
         """! @brief Frame constructor. 
@@ -45,76 +148,189 @@ class Frame(QtGui.QWidget):
         #self.setMinimumWidth(370)
         self.setMinimumHeight(470)
 
+        ## Pages of the views, each page is built the first time it is displayed
+        self.pages = PageStack(self)
+        self.pages.addPage(USER_PAGE, self.buildUserPage)
+        self.pages.addPage(TRANSACTIONS_PAGE, self.buildTransactionsPage)
+        self.pages.addPage(LOGIN_PAGE, self.buildLoginPage)
+        self.pages.addPage(ADMIN_PAGE, self.buildAdminPage)
+
+        ## Label to display the status (connecting, waiting for a card or card detected)
+        self.l4 = WaitingLabel('connecting', self)
+        self.l4.setStyleSheet('font-size:12pt; qproperty-alignment:AlignCenter; background-color:#E0E0E0; padding:4px; margin:10px 30px;')
+
+        ## Button to withdraw 2 CHF
+        self.b1 = QtGui.QPushButton('2 CHF - %d balls' % BALLS_BY_AMOUNT[2], self)
+        ## Button to withdraw 5 CHF
+        self.b2 = QtGui.QPushButton('5 CHF - %d balls' % BALLS_BY_AMOUNT[5], self)
+        ## Button to show the last 10 transactions
+        self.transaction = QtGui.QPushButton('last transactions')
+        ## Button to access the admin view
+        self.admin = QtGui.QPushButton('admin')
+
+        hLayoutButtons = QtGui.QHBoxLayout()
+        hLayoutButtons.addWidget(self.b1)
+        hLayoutButtons.addWidget(self.b2)
+        hLayoutButtons.addWidget(self.transaction)
+        hLayoutButtons.addWidget(self.admin)
+
+        ## Model of the transactions, the older ones are fetched when the table is scrolled to the bottom
+        self.transactionModel = TransactionModel(self)
+        
+        ## Label to indicate that it is the status
+        self.lStatus = QtGui.QLabel()
+        self.lStatus.setStyleSheet('background-color:#E0E0E0; padding:4px;')
+        self.lStatus.setText('Status : ')
+        self.lStatus.setFixedHeight(24)
+        self.lStatus.setFixedWidth(60)
+        ## Label to display the status of an action
+        self.status = QtGui.QLabel()
+        self.status.setStyleSheet('background-color:#E0E0E0; padding:4px;')
+        self.status.setAlignment(Qt.AlignCenter);
+        self.status.setFixedHeight(24)
+
+        hLayoutStatus = QtGui.QHBoxLayout()
+        hLayoutStatus.addWidget(self.lStatus)
+        hLayoutStatus.addWidget(self.status)
+
+        # link all the layouts to the main vertical layout
+        verticalLayout = QtGui.QVBoxLayout()
+        
+        verticalLayout.addWidget(self.pages)
+        verticalLayout.addWidget(self.l4)
+        verticalLayout.addLayout(hLayoutButtons)
+        verticalLayout.addLayout(hLayoutStatus)
+
+        self.setLayout(verticalLayout)
+ 
+        try:
+            self.setWindowIcon(QtGui.QIcon('icon.png')) 
+        except:pass
+
+        ## Timer used to display a warning during a fixed time
+        self.warningTimer = QTimer(self)
+        self.warningTimer.setSingleShot(True)
+        ## Timer used to release the card after x seconds if the user don't make any action
+        self.releaseCardTimer = QTimer(self)
+        self.releaseCardTimer.setSingleShot(True)
+        ## Step of the *waiting* text
+        self.step = 0
+        ## State of the window, the widgets are changed by the transitions only
+        self.state = UiState(self)
+        self.state.enter(card=CONNECTING, view=MAIN, extra={('l4', 'text'): 'connecting'})
+        if Metrics().enabled and METRICS_UI_EVENTS:
+            ## Counter of the repaints and relayouts of the window
+            self.eventCounter = UiEventCounter(self)
+            self.eventCounter.watch(self)
+            self.pages.pageBuilt.connect(self.eventCounter.watch)
+
+    @timed('buildUserPage')
+    def buildUserPage(self):
+        """! @brief Method building the page of the customers.
+        @param self the Frame instance
+        @return the page
+        """
+        page = QtGui.QWidget()
         ## Label to display a welcome message
-        self.l1 = QtGui.QLabel("Welcome<br />on<br />NFC Golf Ball Dispenser", self)
+        self.l1 = QtGui.QLabel("Welcome<br />on<br />NFC Golf Ball Dispenser", page)
         self.l1.setStyleSheet('font-size:30pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
         ## Label to display the name of the developer
-        self.l2 = QtGui.QLabel('created by Jacky Casas', self)
+        self.l2 = QtGui.QLabel('created by Jacky Casas', page)
         self.l2.setStyleSheet('font-size:10pt; qproperty-alignment:AlignRight; qproperty-wordWrap:true;')
         self.l2.setFixedHeight(16)
         ## Label to display instructions
-        self.l3 = QtGui.QLabel('Just approach your smartphone or smartcard in front of the reader', self)
+        self.l3 = QtGui.QLabel('Just approach your smartphone or smartcard in front of the reader', page)
         self.l3.setStyleSheet('font-size:20pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
-        ## Label to display the status (waiting for a card or card detected)
-        self.l4 = QtGui.QLabel('waiting', self)  
-        self.l4.setStyleSheet('font-size:12pt; qproperty-alignment:AlignCenter; background-color:#E0E0E0; padding:4px; margin:10px 30px;')
+
+        verticalLayout = QtGui.QVBoxLayout(page)
+        verticalLayout.setContentsMargins(0, 0, 0, 0)
+        verticalLayout.addWidget(self.l1)
+        verticalLayout.addWidget(self.l2)
+        verticalLayout.addWidget(self.l3)
+        return page
+
+    @timed('buildTransactionsPage')
+    def buildTransactionsPage(self):
+        """! @brief Method building the page of the last transactions.
+        @param self the Frame instance
+        @return the page
+        """
+        page = QtGui.QWidget()
+        ## Label indicating that it is the last transactions
+        self.lTransaction = QtGui.QLabel("The last<br />transactions")
+        self.lTransaction.setStyleSheet('font-size:15pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
+        ## TableView to display the transactions
+        self.transactionTable = QtGui.QTableView()
+        self.transactionTable.setModel(self.transactionModel)
+        vheader = self.transactionTable.verticalHeader()
+        # fixed rows : the table scrolls, and only the visible rows are formatted
+        vheader.setResizeMode(QtGui.QHeaderView.Fixed) # Stretch, Interactive, Fixed, Custom, ResizeToContents
+        hheader = self.transactionTable.horizontalHeader()
+        hheader.setResizeMode(QtGui.QHeaderView.ResizeToContents)
+        hheader.setStretchLastSection(True)
+        self.transactionTable.setMaximumWidth(430)
+
+        hLayoutTransaction = QtGui.QHBoxLayout(page)
+        hLayoutTransaction.setContentsMargins(0, 0, 0, 0)
+        hLayoutTransaction.addWidget(self.lTransaction)
+        hLayoutTransaction.addWidget(self.transactionTable)
+        return page
+
+    @timed('buildLoginPage')
+    def buildLoginPage(self):
+        """! @brief Method building the page of the login of the administration.
+        @param self the Frame instance
+        @return the page
+        """
+        page = QtGui.QWidget()
         ## Label to display a welcome message in the log view
         self.logl1 = QtGui.QLabel("Welcome on the login of the administration")
         self.logl1.setStyleSheet('font-size:30pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
-        self.logl1.setVisible(False)
-        ## Label to display a welcome message in the admin view
-        self.adminl1 = QtGui.QLabel("Welcome on the admin")
-        self.adminl1.setStyleSheet('font-size:30pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
-        self.adminl1.setVisible(False)
         ## LineEdit to enter the username
         self.adminUsername = QtGui.QLineEdit()
         self.adminUsername.setPlaceholderText('username')
-        self.adminUsername.setVisible(False)
         ## LineEdit to enter the password
         self.adminPassword = QtGui.QLineEdit()
         self.adminPassword.setPlaceholderText('password')
-        self.adminPassword.setVisible(False)
         self.adminPassword.setEchoMode(QtGui.QLineEdit.Password)
-
         ## Button to enter in the admin
         self.log = QtGui.QPushButton('Login')
-        self.log.setVisible(False)
+        self.log.clicked.connect(lambda: self.displayAdmin(self.adminUsername.text(), self.adminPassword.text()))
+
         hLayoutLogin = QtGui.QHBoxLayout()
         hLayoutLogin.addWidget(self.adminUsername)
         hLayoutLogin.addWidget(self.adminPassword)
         hLayoutLogin.addWidget(self.log)
 
-        ## Button to withdraw 2 CHF
-        self.b1 = QtGui.QPushButton('2 CHF - 30 balls', self)
-        self.b1.setEnabled(False)
-        ## Button to withdraw 5 CHF
-        self.b2 = QtGui.QPushButton('5 CHF - 80 balls', self)
-        self.b2.setEnabled(False)
-        ## Button to show the last 10 transactions
-        self.transaction = QtGui.QPushButton('last transactions')
-        self.transaction.setEnabled(False)
-        ## Button to access the admin view
-        self.admin = QtGui.QPushButton('admin')
+        verticalLayout = QtGui.QVBoxLayout(page)
+        verticalLayout.setContentsMargins(0, 0, 0, 0)
+        verticalLayout.addWidget(self.logl1)
+        verticalLayout.addLayout(hLayoutLogin)
+        return page
 
-        hLayoutButtons = QtGui.QHBoxLayout()
-        hLayoutButtons.addWidget(self.b1)
-        hLayoutButtons.addWidget(self.b2)
-        hLayoutButtons.addWidget(self.transaction)
-        hLayoutButtons.addWidget(self.admin)
+    @timed('buildAdminPage')
+    def buildAdminPage(self):
+        """! @brief Method building the page of the administration.
+        The buttons emit the request signals of the Frame.
+        @param self the Frame instance
+        @return the page
+        """
+        page = QtGui.QWidget()
+        ## Label to display a welcome message in the admin view
+        self.adminl1 = QtGui.QLabel("Welcome on the admin")
+        self.adminl1.setStyleSheet('font-size:30pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
 
         ## Label indicating the recharge of an account
         self.lRecharge = QtGui.QLabel('Recharge the account :')
-        self.lRecharge.setVisible(False)
         ## SpinBox to enter the amount we want to recharge
         self.moneyBox = QtGui.QSpinBox()
         self.moneyBox.setRange(0, 1000)
         self.moneyBox.setSingleStep(10)
         self.moneyBox.setSuffix(' CHF')
         self.moneyBox.setValue(20)
-        self.moneyBox.setVisible(False)
         ## Button to recharge an account
-        self.bRecharge = QtGui.QPushButton('Recharge', self)
-        self.bRecharge.setVisible(False)
+        self.bRecharge = QtGui.QPushButton('Recharge', page)
+        self.bRecharge.clicked.connect(lambda: self.rechargeRequested.emit(self.moneyBox.value()))
 
         hLayoutRecharge = QtGui.QHBoxLayout()
         hLayoutRecharge.addWidget(self.lRecharge)
@@ -124,18 +340,15 @@ class Frame(QtGui.QWidget):
         ## LineEdit to write the username to create an account
         self.username = QtGui.QLineEdit()
         self.username.setPlaceholderText('username')
-        self.username.setVisible(False)
         ## LineEdit to write the name to create an account
         self.name = QtGui.QLineEdit()
         self.name.setPlaceholderText('name')
-        self.name.setVisible(False)
         ## LineEdit to write the surname to create an account
         self.surname = QtGui.QLineEdit()
         self.surname.setPlaceholderText('surname')
-        self.surname.setVisible(False)
         ## Button to create an account
         self.bCreateAccount = QtGui.QPushButton('Create account')
-        self.bCreateAccount.setVisible(False)
+        self.bCreateAccount.clicked.connect(lambda: self.createAccountRequested.emit(self.username.text(), self.name.text(), self.surname.text()))
 
         hLayoutAccount = QtGui.QHBoxLayout()
         hLayoutAccount.addWidget(self.username)
@@ -145,125 +358,91 @@ class Frame(QtGui.QWidget):
 
         ## Label indicating that we can add a card to an account
         self.lAddDevice = QtGui.QLabel('Add smartcard to account :')
-        self.lAddDevice.setVisible(False)
         ## LineEdit to write the username of the account
         self.username2 = QtGui.QLineEdit()
         self.username2.setPlaceholderText('username')
-        self.username2.setVisible(False)
         ## Button to add a smartcart to an account
         self.bAddDevice = QtGui.QPushButton('Add smartcard')
-        self.bAddDevice.setVisible(False)
+        self.bAddDevice.clicked.connect(lambda: self.addDeviceRequested.emit(self.username2.text()))
 
         hLayoutAddDevice = QtGui.QHBoxLayout()
         hLayoutAddDevice.addWidget(self.lAddDevice)
         hLayoutAddDevice.addWidget(self.username2)
         hLayoutAddDevice.addWidget(self.bAddDevice)
 
-        ## Label indicating that it is the last 10 transactions
-        self.lTransaction = QtGui.QLabel("The last 10<br />transactions")
-        self.lTransaction.setStyleSheet('font-size:15pt; qproperty-alignment:AlignCenter; qproperty-wordWrap:true;')
-        self.lTransaction.setVisible(False)
-        ## TableWidget to display the 10 last transactions
-        self.transactionTable = QtGui.QTableWidget()
-        self.transactionTable.setVisible(False)
-        self.transactionTable.setColumnCount(3)
-        title = ['date', 'amount', 'currency']
-        vheader = QtGui.QHeaderView(Qt.Orientation.Vertical)
-        vheader.setResizeMode(QtGui.QHeaderView.Stretch) # Stretch, Interactive, Fixed, Custom, ResizeToContents
-        self.transactionTable.setVerticalHeader(vheader)
-        hheader = QtGui.QHeaderView(Qt.Orientation.Horizontal)
-        hheader.setResizeMode(QtGui.QHeaderView.ResizeToContents)
-        hheader.setStretchLastSection(True)
-        self.transactionTable.setHorizontalHeader(hheader)
-        self.transactionTable.setHorizontalHeaderLabels(title)
-        self.transactionTable.setMaximumWidth(430)
+        ## Label displaying the usage of the dispenser today
+        self.lUsage = QtGui.QLabel('Usage today :')
+        ## Button to read the usage again
+        self.bUsage = QtGui.QPushButton('Refresh')
+        self.bUsage.clicked.connect(self.usageRequested.emit)
 
-        hLayoutTransaction = QtGui.QHBoxLayout()
-        hLayoutTransaction.addWidget(self.lTransaction)
-        hLayoutTransaction.addWidget(self.transactionTable)
-        
-        ## Label to indicate that it is the status
-        self.lStatus = QtGui.QLabel()
-        self.lStatus.setStyleSheet('background-color:#E0E0E0; padding:4px;')
-        self.lStatus.setText('Status : ')
-        self.lStatus.setFixedHeight(24)
-        self.lStatus.setFixedWidth(60)
-        ## Label to display the status of an action
-        self.status = QtGui.QLabel()
-        self.status.setStyleSheet('background-color:#E0E0E0; padding:4px;')
-        self.status.setAlignment(Qt.AlignCenter);
-        self.status.setFixedHeight(24)
+        hLayoutUsage = QtGui.QHBoxLayout()
+        hLayoutUsage.addWidget(self.lUsage)
+        hLayoutUsage.addWidget(self.bUsage)
 
-        hLayoutStatus = QtGui.QHBoxLayout()
-        hLayoutStatus.addWidget(self.lStatus)
-        hLayoutStatus.addWidget(self.status)
+        ## Table of the usage of the dispenser during the hours of today
+        self.usageTable = QtGui.QTableWidget(0, 5)
+        self.usageTable.setHorizontalHeaderLabels(['Hour', 'Withdrawals', 'Balls', 'Withdrawn', 'Recharged'])
+        self.usageTable.verticalHeader().setVisible(False)
+        self.usageTable.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
 
-        # link all the layouts to the main vertical layout
-        verticalLayout = QtGui.QVBoxLayout()
-        
-        verticalLayout.addWidget(self.l1)
-        verticalLayout.addWidget(self.logl1)
+        verticalLayout = QtGui.QVBoxLayout(page)
+        verticalLayout.setContentsMargins(0, 0, 0, 0)
         verticalLayout.addWidget(self.adminl1)
-        verticalLayout.addWidget(self.l2)
-        verticalLayout.addLayout(hLayoutLogin)
-        verticalLayout.addWidget(self.l3)
-        verticalLayout.addWidget(self.l4)
-
-        verticalLayout.addLayout(hLayoutTransaction)
         verticalLayout.addLayout(hLayoutRecharge)
         verticalLayout.addLayout(hLayoutAccount)
         verticalLayout.addLayout(hLayoutAddDevice)
-        verticalLayout.addLayout(hLayoutButtons)
-        verticalLayout.addLayout(hLayoutStatus)
+        verticalLayout.addLayout(hLayoutUsage)
+        verticalLayout.addWidget(self.usageTable)
+        return page
 
-        self.setLayout(verticalLayout)
- 
-        try:
-            self.setWindowIcon(QtGui.QIcon('icon.png')) 
-        except:pass
+    @Slot()
+    def displayConnecting(self):
+        """! @brief Slot used to update the *connecting* label while the database, the reader and the PiFace are initialized.
+        @param self the Frame instance
+        """
+        self.step += 1
+        self.step %= 4
+        self.state.enter(card=CONNECTING, extra={('l4', 'text'): 'connecting', ('l4', 'dots'): self.step})
 
-        ## Timer used to display a warning during a fixed time
-        self.warningTimer = QTimer(self)
-        self.warningTimer.setSingleShot(True)
-        ## Timer used to release the card after x seconds if the user don't make any action
-        self.releaseCardTimer = QTimer(self)
-        self.releaseCardTimer.setSingleShot(True)
-        ## Step of the *waiting* text
-        self.step = 0
-        ## Transaction visibility
-        self.transactionIsVisible = False
-        ## Admin visibility
-        self.adminActivated = False
+    @Slot()
+    def displayUnplugged(self):
+        """! @brief Slot called when the reader of the bay is unplugged. The bay waits until it is plugged again.
+        @param self the Frame instance
+        """
+        self.warningTimer.stop()
+        self.releaseCardTimer.stop()
+        if self.state.enter(card=CONNECTING, extra={('l4', 'text'): 'reader unplugged', ('l4', 'dots'): 0}):
+            self.deactivateButton.emit()
 
     @Slot()
+    @timed('update')
     def update(self):
-        """! @brief Slot used to update the *waiting* label.
+        """! @brief Slot used to update the *waiting* label. Only the dots are repainted while waiting,
+        the other widgets are changed when coming back from another state.
         @param self the Frame instance
         """
         self.step += 1
         self.step %= 4
-        self.l4.setText('waiting ' + self.step * '.')
-        self.b1.setEnabled(False)
-        self.b2.setEnabled(False)
-        self.transaction.setEnabled(False)
-
-        if self.transactionIsVisible:
-            self.lTransaction.setVisible(False)
-            self.transactionTable.setVisible(False)
-            self.transactionIsVisible = False
-            
-        self.deactivateButton.emit()
+        if self.state.enter(card=IDLE, extra={('l4', 'text'): 'waiting', ('l4', 'dots'): self.step}):
+            self.deactivateButton.emit()
 
-    @Slot(int)
-    def displayCard(self, balance):
+    @Slot(object)
+    @timed('displayCard')
+    def displayCard(self, account):
         """! @brief Slot called when a card is detected. It displays the balance of the account.
+        When the dispenser is offline, the last known balance is displayed with what can be withdrawn offline.
         @param self the Frame instance
-        @param balance the balance of the account linked to the card
+        @param account the account linked to the card
         """
-        self.l4.setText('Card detected.<br />There is ' + `balance` + ' CHF left on your account.')
-        self.b1.setEnabled(True)
-        self.b2.setEnabled(True)
-        self.transaction.setEnabled(True)
+        if not account.get('offline'):
+            text = 'Card detected.<br />There is ' + `account['balance']` + ' CHF left on your account.'
+        elif account['balance'] is None:
+            text = 'Card detected, the dispenser is offline.<br />You can withdraw up to ' + `account['allowance']` + ' CHF.'
+        else:
+            text = ('Card detected, the dispenser is offline.<br />Last known balance : ' + `account['balance']` +
+                ' CHF, you can withdraw up to ' + `account['allowance']` + ' CHF.')
+        self.state.enter(card=CARD, extra={('l4', 'text'): text})
 
         self.activateButton.emit()
         
@@ -271,31 +450,35 @@ class Frame(QtGui.QWidget):
         self.releaseCardTimer.start(10000)
 
     @Slot(int)
+    @timed('displayWarning')
     def displayWarning(self, warning):
         """! @brief Slot which displays a warning.
         @param self the Frame instance
         @param warning identifier of the warning to be displayed
         """
         if (warning == WARN_NO_ACCOUNT):
-            self.l4.setText('This card is not linked to any account.<br />Please create an account or link it to yours.')
+            text = 'This card is not linked to any account.<br />Please create an account or link it to yours.'
         elif (warning == WARN_ACCOUNT_INACTIVE):
-            self.l4.setText('Your account has been disable.<br />Please contact the administrator for further information.')
+            text = 'Your account has been disable.<br />Please contact the administrator for further information.'
         elif (warning == WARN_ACCOUNT_DELETED):
-            self.l4.setText('Your account has been deleted.<br />You can\'t use your card anymore.')
+            text = 'Your account has been deleted.<br />You can\'t use your card anymore.'
         elif (warning == WARN_DEVICE_LOST):
-            self.l4.setText('This device has been lost.<br />Please send it to the administrator.')
+            text = 'This device has been lost.<br />Please send it to the administrator.'
         elif (warning == WARN_DEVICE_STOLEN):
-            self.l4.setText('Stealing is bad !<br />Please send the device to the administrator.')
+            text = 'Stealing is bad !<br />Please send the device to the administrator.'
         elif (warning == WARN_DEVICE_DELETED):
-            self.l4.setText('This device has been deleted from your account.<br />You can\'t use it anymore')
+            text = 'This device has been deleted from your account.<br />You can\'t use it anymore'
         else:
-            self.l4.setText('An error has occurred')
+            text = 'An error has occurred'
+
+        self.state.enter(card=WARNING, extra={('l4', 'text'): text})
 
         self.deactivateButton.emit()
         
         self.warningTimer.start(5000)
 
     @Slot(str)
+    @timed('displayStatus')
     def displayStatus(self, message):
         """! @brief Slot which displays the status of an action.
         @param self the Frame instance
@@ -303,101 +486,50 @@ class Frame(QtGui.QWidget):
         """
         self.status.setText(message)
 
-    @Slot(str)
-    def displayTransactions(self, trs):
-        """! @brief Slot which displays the status of an action.
+    @Slot(object, list, bool)
+    @timed('displayTransactions')
+    def displayTransactions(self, deviceId, trs, complete):
+        """! @brief Slot which displays or hides the last transactions.
         @param self the Frame instance
-        @param trs array with the last transactions
+        @param deviceId identifier of the device of the transactions
+        @param trs the last transactions, newest first
+        @param complete True if there is no older transaction
         """
-        if self.transactionIsVisible == False:
+        if self.state.card == CARD:
             self.status.setText('click again to hide transactions')
-            self.transactionTable.setRowCount(len(trs))
-
-            for i in range(len(trs)):
-                for j in range(len(trs[0])):
-                    item = QtGui.QTableWidgetItem(trs[i][j])
-                    if j == 1:
-                        item.setTextAlignment(Qt.AlignVCenter | Qt.AlignRight)
-                    self.transactionTable.setItem(i, j, item)
-
-            self.lTransaction.setVisible(True)
-            self.transactionTable.setVisible(True)
-            self.transactionIsVisible = True
-        else:
+            self.transactionModel.setTransactions(deviceId, trs, complete)
+            self.state.enter(card=TRANSACTIONS)
+            if TRANSACTIONS_PAGE in self.pages.built:
+                self.transactionTable.scrollToTop()
+        elif self.state.card == TRANSACTIONS:
             self.status.setText('')
-            self.lTransaction.setVisible(False)
-            self.transactionTable.setVisible(False)
-            self.transactionIsVisible = False
+            self.state.enter(card=CARD)
 
     @Slot()
+    @timed('toggleAdminView')
     def toggleAdminView(self):
         """! @brief Slot which displays of hides the administration view
         @param self the Frame instance
         """
-        if self.adminActivated:
-            self.adminActivated = False
-            self.admin.setText('admin')
+        if self.state.view != MAIN:
             self.displayMainWindow()
         else:
-            self.adminActivated = True
-            self.admin.setText('return')
             self.displayLogin()
 
     def displayMainWindow(self):
         """! @brief Method which displays the elements for the user view.
         @param self the Frame instance
         """
-        self.l1.setVisible(True)
-        self.l2.setVisible(True)
-        self.l3.setVisible(True)
-        self.logl1.setVisible(False)
-        self.adminl1.setVisible(False)
-
-        self.adminUsername.setVisible(False)
-        self.adminPassword.setVisible(False)
-        self.log.setVisible(False)
-
-        self.lRecharge.setVisible(False)
-        self.moneyBox.setVisible(False)
-        self.bRecharge.setVisible(False)
-
-        self.username.setVisible(False)
-        self.name.setVisible(False)
-        self.surname.setVisible(False)
-        self.bCreateAccount.setVisible(False)
-
-        self.lAddDevice.setVisible(False)
-        self.username2.setVisible(False)
-        self.bAddDevice.setVisible(False)
+        self.state.enter(view=MAIN)
 
     def displayLogin(self):
         """! @brief Method which displays the elements for the login view.
         @param self the Frame instance
         """
-        self.l1.setVisible(False)
-        self.l2.setVisible(False)
-        self.l3.setVisible(False)
-        self.logl1.setVisible(True)
-        self.adminl1.setVisible(False)
-
-        self.adminUsername.setVisible(True)
-        self.adminPassword.setVisible(True)
-        self.log.setVisible(True)
-
-        self.lRecharge.setVisible(False)
-        self.bRecharge.setVisible(False)
-        self.moneyBox.setVisible(False)
-
-        self.username.setVisible(False)
-        self.name.setVisible(False)
-        self.surname.setVisible(False)
-        self.bCreateAccount.setVisible(False)
-
-        self.lAddDevice.setVisible(False)
-        self.username2.setVisible(False)
-        self.bAddDevice.setVisible(False)
+        self.state.enter(view=LOGIN)
 
     @Slot()
+    @timed('displayAdmin')
     def displayAdmin(self, username, password):
         """! @brief Slot which displays the elements for the admin.
         @param self the Frame instance
@@ -405,31 +537,28 @@ class Frame(QtGui.QWidget):
         @param password password to access the admin
         """
         if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
-            self.l1.setVisible(False)
-            self.l2.setVisible(False)
-            self.l3.setVisible(False)
-            self.logl1.setVisible(False)
-            self.adminl1.setVisible(True)
-
-            self.adminUsername.setVisible(False)
-            self.adminPassword.setVisible(False)
-            self.log.setVisible(False)
-
-            self.lRecharge.setVisible(True)
-            self.bRecharge.setVisible(True)
-            self.moneyBox.setVisible(True)
-
-            self.username.setVisible(True)
-            self.name.setVisible(True)
-            self.surname.setVisible(True)
-            self.bCreateAccount.setVisible(True)
-
-            self.lAddDevice.setVisible(True)
-            self.username2.setVisible(True)
-            self.bAddDevice.setVisible(True)
-
-            self.status.setVisible(True)
-        
+            self.state.enter(view=ADMIN)
+            self.usageRequested.emit()
+
+    @Slot(object)
+    @timed('displayUsage')
+    def displayUsage(self, usage):
+        """! @brief Slot which displays the usage of the dispenser today in the admin view, only the hours when it was used.
+        @param self the Frame instance
+        @param usage the counters of the day and of its hours, None if they could not be read
+        """
+        if usage is None or ADMIN_PAGE not in self.pages.built:
+            return
+        self.lUsage.setText('Usage today : %d withdrawals, %d balls, %g CHF withdrawn, %d recharges, %g CHF recharged' % (
+            usage['withdrawals'], usage['balls'], usage['withdrawn'], usage['recharges'], usage['recharged']))
+        hours = [(hour, counters) for hour, counters in enumerate(usage['hours']) if counters['withdrawals'] or counters['recharges']]
+        self.usageTable.setRowCount(len(hours))
+        for row, (hour, counters) in enumerate(hours):
+            values = ['%02d:00' % hour, '%d' % counters['withdrawals'], '%d' % counters['balls'],
+                '%g CHF' % counters['withdrawn'], '%g CHF' % counters['recharged']]
+            for column, value in enumerate(values):
+                self.usageTable.setItem(row, column, QtGui.QTableWidgetItem(value))
+
     def centerOnScreen(self):
         """! @brief Method to center the application on the screen.
         @param self the Frame instance
@@ -457,7 +586,7 @@ class Frame(QtGui.QWidget):
         @param e the event
         """
         if e.key() == Qt.Key_Escape:
-            # close the button listener's threads
+            # ignore the buttons, the listener is stopped when the application quits
             self.deactivateButton.emit()
             # close the window
             self.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file uistate.py
+#  Contains the classes UiState and UiEventCounter.
+
+## @package uistate
+#  State of the Frame : what the reader is doing (connecting, idle, card present, warning, transactions shown)
+#  and which view is displayed (user, admin login, admin). Each state is a table of widget properties,
+#  the page displayed included, a transition changes only the properties that differ from the ones already applied.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+from PySide import QtGui
+from PySide.QtCore import *
+
+from metrics import Metrics
+
+## the database, the reader and the PiFace are being initialized
+CONNECTING = 'connecting'
+## waiting for a card
+IDLE = 'idle'
+## a card is in front of the reader, its balance is displayed
+CARD = 'card'
+## a warning about the card is displayed
+WARNING = 'warning'
+## the last transactions of the card are displayed
+TRANSACTIONS = 'transactions'
+
+## view of the customers
+MAIN = 'main'
+## login of the administration
+LOGIN = 'login'
+## view of the administration
+ADMIN = 'admin'
+
+## page of the customers
+USER_PAGE = 'user'
+## page of the last transactions
+TRANSACTIONS_PAGE = 'transactions'
+## page of the login of the administration
+LOGIN_PAGE = 'login'
+## page of the administration
+ADMIN_PAGE = 'admin'
+
+## buttons usable when a card is in front of the reader
+CARD_BUTTONS = ('b1', 'b2', 'transaction')
+
+def properties(name, widgets, value):
+    """! @brief Function building the same property of several widgets.
+    @param name name of the property, its setter is `set` followed by the capitalized name
+    @param widgets names of the widgets in the Frame
+    @param value value of the property
+    @return dictionary `{(widget, property): value}`
+    """
+    return dict(((widget, name), value) for widget in widgets)
+
+def merge(*tables):
+    """! @brief Function merging tables of properties, the last ones win.
+    @param tables dictionaries `{(widget, property): value}`
+    """
+    merged = {}
+    for table in tables:
+        merged.update(table)
+    return merged
+
+## properties of each state of the reader
+CARD_PROPERTIES = {
+    CONNECTING: merge(properties('enabled', CARD_BUTTONS, False), {('pages', 'page'): USER_PAGE}),
+    IDLE: merge(properties('enabled', CARD_BUTTONS, False), {('pages', 'page'): USER_PAGE}),
+    CARD: merge(properties('enabled', CARD_BUTTONS, True), {('pages', 'page'): USER_PAGE, ('l4', 'dots'): 0}),
+    WARNING: merge(properties('enabled', CARD_BUTTONS, False), {('pages', 'page'): USER_PAGE, ('l4', 'dots'): 0}),
+    TRANSACTIONS: merge(properties('enabled', CARD_BUTTONS, True), {('pages', 'page'): TRANSACTIONS_PAGE, ('l4', 'dots'): 0}),
+}
+
+## properties of each view, the pages of the administration are displayed instead of the page of the reader
+VIEW_PROPERTIES = {
+    MAIN: {('admin', 'text'): 'admin'},
+    LOGIN: {('admin', 'text'): 'return', ('pages', 'page'): LOGIN_PAGE},
+    ADMIN: {('admin', 'text'): 'return', ('pages', 'page'): ADMIN_PAGE},
+}
+
+class UiState(object):
+    """! @brief
+    State of a Frame. The properties already applied to the widgets are remembered, entering a state
+    calls the setters of the properties that change only : staying in a state costs nothing.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, frame):
+        """! @brief Initialize the state, nothing applied yet.
+        @param self the UiState instance
+        @param frame the Frame instance
+        """
+        ## link to the Frame instance
+        self.frame = frame
+        ## state of the reader, None before the first transition
+        self.card = None
+        ## view displayed, None before the first transition
+        self.view = None
+        ## properties applied to the widgets, `{(widget, property): value}`
+        self.applied = {}
+        ## number of transitions between states
+        self.transitions = 0
+        ## number of setters called
+        self.changes = 0
+        Metrics().register('uiState', self.counters)
+
+    def enter(self, card=None, view=None, extra=None):
+        """! @brief Method to enter a state.
+        @param self the UiState instance
+        @param card new state of the reader, None to keep the current one
+        @param view new view, None to keep the current one
+        @param extra properties depending on the data displayed (e.g. the balance), `{(widget, property): value}`, optional
+        @return True if the state of the reader or the view has changed
+        """
+        card = card if card is not None else self.card
+        view = view if view is not None else self.view
+        changed = (card, view) != (self.card, self.view)
+        target = merge(CARD_PROPERTIES.get(card, {}), VIEW_PROPERTIES.get(view, {}), extra or {})
+        for key, value in target.iteritems():
+            if key in self.applied and self.applied[key] == value:
+                continue
+            widget, name = key
+            getattr(getattr(self.frame, widget), 'set' + name[0].upper() + name[1:])(value)
+            self.applied[key] = value
+            self.changes += 1
+        if changed:
+            self.card = card
+            self.view = view
+            self.transitions += 1
+        return changed
+
+    def counters(self):
+        """! @brief Method to get the counters of the state.
+        @param self the UiState instance
+        """
+        return {'transitions': self.transitions, 'changes': self.changes}
+
+class UiEventCounter(QObject):
+    """! @brief
+    Event filter counting the repaints and the relayouts of a widget and of its children.
+    The number of events of the last complete minute is kept besides the totals.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, parent=None):
+        """! @brief Initialize the counters and the timer closing each minute.
+        @param self the UiEventCounter instance
+        @param parent the parent QObject, optional
+        """
+        QObject.__init__(self, parent)
+        ## number of paint events
+        self.paints = 0
+        ## number of layout requests
+        self.layouts = 0
+        ## counters at the beginning of the current minute
+        self.minuteStart = (0, 0)
+        ## paint events and layout requests during the last complete minute
+        self.lastMinute = (0, 0)
+        ## timer closing each minute
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.closeMinute)
+        self.timer.start(60000)
+        Metrics().register('uiEvents', self.counters)
+
+    def watch(self, widget):
+        """! @brief Method to count the events of a widget and of its children.
+        @param self the UiEventCounter instance
+        @param widget the QWidget
+        """
+        widget.installEventFilter(self)
+        for child in widget.findChildren(QtGui.QWidget):
+            child.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        """! @brief Method called for each event of the watched widgets. The events are never filtered out.
+        @param self the UiEventCounter instance
+        @param watched the widget receiving the event
+        @param event the event
+        """
+        kind = event.type()
+        if kind == QEvent.Paint:
+            self.paints += 1
+        elif kind == QEvent.LayoutRequest:
+            self.layouts += 1
+        return False
+
+    @Slot()
+    def closeMinute(self):
+        """! @brief Slot called every minute to keep the events of the minute.
+        @param self the UiEventCounter instance
+        """
+        self.lastMinute = (self.paints - self.minuteStart[0], self.layouts - self.minuteStart[1])
+        self.minuteStart = (self.paints, self.layouts)
+
+    def counters(self):
+        """! @brief Method to get the totals and the events of the last complete minute.
+        @param self the UiEventCounter instance
+        """
+        return {'paints': self.paints, 'layouts': self.layouts,
+            'paintsPerMinute': self.lastMinute[0], 'layoutsPerMinute': self.lastMinute[1]}
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## @file usage.py
+#  Contains the class Usage and the command displaying the usage of a dispenser.
+
+## @package usage
+#  Usage of the dispensers. Each transaction written in the database is counted with `$inc` in a summary document per
+#  dispenser and per day of the collection *dispenserUsage* : number of withdrawals, amount withdrawn, balls dispensed,
+#  number of recharges and amount recharged, for the day and for each of its hours. The keys of the transactions counted
+#  are kept in the document with the same update, so that a transaction is counted once. The usage of a period is read in
+#  one document per day, without scanning the transactions.
+#  @author CASAS Jacky
+#  @date 18.10.2026
+#  @version 1.0
+
+import sys
+import argparse
+from datetime import datetime, timedelta
+import pymongo
+
+from constants import *
+from database import DataBase
+from documents import usageIncrement
+
+## name of the collection of the usage
+USAGE_COLLECTION = 'dispenserUsage'
+## counters of a day and of an hour
+USAGE_COUNTERS = ['withdrawals', 'withdrawn', 'balls', 'recharges', 'recharged']
+## projection of the usage without the keys of the transactions counted nor the hours
+DAY_FIELDS = {'counted': 0, 'hours': 0}
+
+def dayStart(date):
+    """! @brief Function getting the beginning of the day of a date.
+    @param date the date
+    """
+    return datetime(date.year, date.month, date.day)
+
+def usageId(dispenserId, day):
+    """! @brief Function getting the identifier of the usage of a dispenser on a day.
+    The identifiers of a dispenser are sorted by day, a period is read with a range on the identifier.
+    @param dispenserId identifier of the dispenser
+    @param day the day
+    """
+    return '%s:%04d%02d%02d' % (dispenserId, day.year, day.month, day.day)
+
+def counters(document):
+    """! @brief Function getting the counters of a day or of an hour, 0 for the counters never incremented.
+    @param document the usage of the day or of the hour, None if the dispenser was not used
+    """
+    document = document or {}
+    return dict((name, document.get(name, 0)) for name in USAGE_COUNTERS)
+
+class Usage(object):
+    """! @brief
+    Counting and reading of the usage of the dispensers. The transactions are counted by the journal syncer when they are
+    written in the database, those made offline included, so the usage lags the taps by the synchronisation interval.
+    Counting is idempotent : a batch retried by the syncer counts only the transactions not counted yet.
+    @author CASAS Jacky
+    @date 18.10.26
+    @version 1.0
+    """
+
+    def __init__(self, database=None):
+        """! @brief Link the database.
+        @param self the Usage instance
+        @param database the database, DataBase() by default
+        """
+        ## link to the database
+        self.database = database if database is not None else DataBase()
+
+    @property
+    def collection(self):
+        """! @brief The database collection *dispenserUsage*.
+        @param self the Usage instance
+        """
+        return self.database.transaction.database[USAGE_COLLECTION]
+
+    def record(self, transactions):
+        """! @brief Method to count transactions in the usage of their dispenser, with one update per dispenser and per day.
+        When some transactions of a day are already counted, e.g. by an interrupted attempt, they are counted one by one.
+        @param self the Usage instance
+        @param transactions the documents of the transactions
+        """
+        buckets = {}
+        for transaction in transactions:
+            buckets.setdefault((transaction['dispenserId'], dayStart(transaction['transactionDate'])), []).append(transaction)
+        for (dispenserId, day), bucket in buckets.iteritems():
+            if not self.count(dispenserId, day, bucket):
+                for transaction in bucket:
+                    self.count(dispenserId, day, [transaction])
+
+    def count(self, dispenserId, day, transactions):
+        """! @brief Method to count transactions of a dispenser and a day, unless one of them is already counted.
+        @param self the Usage instance
+        @param dispenserId identifier of the dispenser
+        @param day the day
+        @param transactions the documents of the transactions
+        @return True if the transactions have been counted, False if one of them was already counted
+        """
+        increment = {}
+        for transaction in transactions:
+            for name, value in usageIncrement(transaction['transactionType'], transaction['amount'],
+                    transaction['transactionDate']).iteritems():
+                increment[name] = increment.get(name, 0) + value
+        keys = [transaction['_id'] for transaction in transactions]
+        try:
+            result = self.collection.update({'_id': usageId(dispenserId, day), 'counted': {'$nin': keys}},
+                {'$inc': increment, '$set': {'dispenserId': dispenserId, 'day': day}, '$push': {'counted': {'$each': keys}}},
+                upsert=True)
+        except pymongo.errors.DuplicateKeyError:
+            # the document exists and already counts one of the transactions
+            return False
+        return bool(result is None or result.get('n'))
+
+    def day(self, date, dispenserId=DISPENSER_ID):
+        """! @brief Method to get the usage of a dispenser on a day, with its hours.
+        @param self the Usage instance
+        @param date a date of the day
+        @param dispenserId identifier of the dispenser
+        @return the counters of the day, with the key 'hours' giving the counters of each of its 24 hours
+        """
+        day = dayStart(date)
+        document = self.collection.find_one({'_id': usageId(dispenserId, day)}, {'counted': 0})
+        hours = (document or {}).get('hours', {})
+        usage = counters(document)
+        usage['day'] = day
+        usage['hours'] = [counters(hours.get('%02d' % hour)) for hour in range(24)]
+        return usage
+
+    def days(self, start, end, dispenserId=DISPENSER_ID):
+        """! @brief Method to get the usage of a dispenser on each day of a period, without the hours.
+        @param self the Usage instance
+        @param start first day of the period
+        @param end last day of the period (included)
+        @param dispenserId identifier of the dispenser
+        @return the counters of each day, oldest first, the days without transaction included
+        """
+        query = {'_id': {'$gte': usageId(dispenserId, start), '$lte': usageId(dispenserId, end)}}
+        documents = dict((document['day'], document) for document in self.collection.find(query, DAY_FIELDS))
+        usage = []
+        day = dayStart(start)
+        while day <= end:
+            usage.append(dict(counters(documents.get(day)), day=day))
+            day += timedelta(days=1)
+        return usage
+
+    def dispensers(self, date):
+        """! @brief Method to get the usage of every dispenser on a day, without the hours.
+        @param self the Usage instance
+        @param date a date of the day
+        @return dictionary `{dispenserId: counters}`, only the dispensers used on the day
+        """
+        return dict((document['dispenserId'], counters(document))
+            for document in self.collection.find({'day': dayStart(date)}, DAY_FIELDS))
+
+def main():
+    """! @brief Command line displaying the usage of a dispenser, per day or per hour."""
+    parser = argparse.ArgumentParser(description='Display the usage of a dispenser, read from the summaries of the transactions.')
+    parser.add_argument('--dispenser', default=DISPENSER_ID, help='identifier of the dispenser, this dispenser by default')
+    parser.add_argument('--days', type=int, default=7, help='number of days displayed, up to today')
+    parser.add_argument('--day', help='display the hours of this day (YYYY-MM-DD) instead')
+    args = parser.parse_args()
+
+    database = DataBase()
+    if not database.online:
+        print 'The database can\'t be reached.'
+        sys.exit(2)
+
+    usage = Usage(database)
+    print '%-10s %11s %10s %8s %9s %10s' % ('', 'withdrawals', 'withdrawn', 'balls', 'recharges', 'recharged')
+    if args.day:
+        day = usage.day(datetime.strptime(args.day, '%Y-%m-%d'), args.dispenser)
+        rows = [('%02d:00' % hour, hourCounters) for hour, hourCounters in enumerate(day['hours'])]
+        rows.append(('total', day))
+    else:
+        today = dayStart(datetime.now())
+        rows = [(day['day'].strftime('%Y-%m-%d'), day) for day in usage.days(today - timedelta(days=args.days - 1), today, args.dispenser)]
+    for label, c in rows:
+        print '%-10s %11d %10g %8d %9d %10g' % (label, c['withdrawals'], c['withdrawn'], c['balls'], c['recharges'], c['recharged'])
+
+if __name__ == '__main__':
+    main()